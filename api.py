@@ -1,10 +1,52 @@
-from flask import Flask, request, jsonify
-import pandas as pd
-from utils.scrapingdog_api import ScrapingDog
-from functools import wraps
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.scrapingdog_api import MAX_PAGES, SEARCH_DEADLINE, get_client
+from utils.fanout import BRANCH_TIMEOUT, check_fanout, check_names, fanout_branches, iter_fanout
+from utils import fastjson, metrics
+from utils.breaker import STATE_CODES
+from utils.errors import UpstreamUnavailable
+from utils.fingerprint import Deduplicator
+from utils.compression import compress_response
+from utils.job_parser import check_fields, check_format, compact_jobs, project_job, project_jobs
+from utils.result_sets import CursorError, CursorExpired, check_limit, check_sort, encode_cursor, get_result_sets, sort_jobs
+from utils.saved_searches import DeltaFilter, get_saved_searches
+from utils.providers import SEARCH_PROVIDERS, Orchestrator, get_search_provider
+from utils.search_queue import MAX_WAIT, QueueFull, get_search_queue, request_tenant as queue_tenant, start_workers, tenant_priority
+from utils.search_service import PLATFORMS, build_chips, filter_jobs_by_platform, search_kwargs
+from utils.sqlite_store import per_process
+import hashlib
 import json
 
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify through orjson when it's installed"""
+
+    def dumps(self, obj, **kwargs):
+        return fastjson.dumps(obj, sort_keys=kwargs.get("sort_keys", self.sort_keys), default=self.default)
+
+    def loads(self, s, **kwargs):
+        return fastjson.loads(s)
+
 app = Flask(__name__)
+if fastjson.orjson is not None:
+    app.json = FastJSONProvider(app)
+
+BATCH_WORKERS = int(os.getenv("SEARCH_BATCH_WORKERS", "8"))
+BATCH_MAX_SEARCHES = int(os.getenv("SEARCH_BATCH_MAX_SEARCHES", "1000"))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "86400"))
+
+# A queued search hands its jobs to pollers in chunks of this many, or sooner after this many seconds
+QUEUE_FLUSH_JOBS = 20
+QUEUE_FLUSH_SECONDS = 1.0
+
+# Local post-filters a search can send under "filters"
+FILTER_KEYS = ("description", "location", "job_type", "posted_within_days")
+
+# Country searched when a request names none
+DEFAULT_COUNTRY = "US"
 
 # ISO 3166 Alpha-2 Country Codes
 COUNTRIES = {
@@ -178,116 +220,808 @@ COUNTRIES = {
     "NR": "Nauru",
     "NU": "Niue",}
 
+def static_json(payload):
+    """(body, etag) for a response that never changes, serialized once"""
+    body = fastjson.dumps_bytes(payload, sort_keys=True)
+    return body, hashlib.sha1(body).hexdigest()
+
+COUNTRIES_JSON = static_json(COUNTRIES)
+PLATFORMS_JSON = static_json(list(PLATFORMS))
+
+
+def set_metrics_country(country):
+    """Label the request's metrics with its country; unknown codes are "other", so clients can't add series"""
+    code = str(country).upper()
+    metrics.set_country(code if code in COUNTRIES or code == DEFAULT_COUNTRY else "other")
+
+def capped(name, value, cap, whole=True):
+    """`value` checked to be a positive (whole) number and clamped to `cap`"""
+    kinds = int if whole else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds) or not value > 0:
+        raise ValueError(f"{name} must be a positive {'whole ' if whole else ''}number")
+    return min(value, cap)
+
+def check_filters(filters):
+    """Raise ValueError unless `filters` is None or an object of FILTER_KEYS"""
+    if filters is None:
+        return
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    unknown = [key for key in filters if key not in FILTER_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(unknown)}. Choose from {', '.join(FILTER_KEYS)}")
+    days = filters.get('posted_within_days')
+    if days is not None and (isinstance(days, bool) or not isinstance(days, (int, float)) or days < 0):
+        raise ValueError("posted_within_days must be a non-negative number")
+
+def apply_filters(jobs, spec):
+    """The platform selection and `filters` applied to a buffered result batch
+
+    With sort "relevance" the jobs come back ranked by BM25 against the
+    search keywords. Both go through the vectorized JobFrame engine.
+    """
+    if not spec["filters"] and spec["sort"] != "relevance":
+        return filter_jobs_by_platform(jobs, spec["platforms"], spec["select_all"])
+    if not jobs:
+        return jobs
+    try:
+        from utils.job_frame import JobFrame
+    except ImportError:
+        raise ValueError("filters and relevance sorting need numpy installed")
+    
+    frame = JobFrame(jobs)
+    platforms = None if spec["select_all"] else spec["platforms"]
+    mask = frame.mask(platforms=platforms, **(spec["filters"] or {}))
+    if spec["sort"] == "relevance":
+        return frame.rank(spec["search"]["keywords"], mask)
+    return frame.select(mask)
+
+def parse_search_request(data):
+    """Map a search request body onto a search spec
 
-def build_chips(date_posted, job_type, experience_level):
-    chips_parts = []
+    The spec holds the iter_jobs arguments under "search" plus the platform
+    selection and fan-out options. Raises ValueError when no keywords were
+    given.
+    """
+    # Required parameters
+    keywords = data.get('keywords', '')
+    location = data.get('location', '')
     
-    # Date posted
-    if date_posted != "Any time":
-        if date_posted == "Past 24 hours":
-            chips_parts.append("date_posted:today")
-        elif date_posted == "Past week":
-            chips_parts.append("date_posted:week")
-        elif date_posted == "Past month":
-            chips_parts.append("date_posted:month")
+    if not keywords:
+        raise ValueError("Please enter at least one keyword to search for")
     
-    # Job type
-    if job_type != "Any":
-        job_type_map = {
-            "Full-time": "FULLTIME",
-            "Part-time": "PARTTIME",
-            "Contract": "CONTRACTOR",
-            "Internship": "INTERN",
-            "Temporary": "TEMPORARY"
-        }
-        chips_parts.append(f"employment_type:{job_type_map[job_type]}")
+    # Optional parameters with defaults
+    platforms = data.get('platforms', list(PLATFORMS))
+    check_names("platforms", platforms)
+    select_all = data.get('select_all', True)
+    count = data.get('count', 10)
+    days_ago = data.get('days_ago', 7)
+    country = data.get('country', DEFAULT_COUNTRY)
+    remote_only = data.get('remote_only', False)
+    search_radius = data.get('search_radius', 10)
+    job_type = data.get('job_type', 'Any')
+    date_posted = data.get('date_posted', 'Any time')
+    experience_level = data.get('experience_level', 'Any')
+    # Never more pages or time per search than the server allows
+    max_pages = capped("max_pages", data.get('max_pages', MAX_PAGES), MAX_PAGES)
+    deadline = capped("deadline", data.get('deadline', SEARCH_DEADLINE), SEARCH_DEADLINE, whole=False)
+    fields = data.get('fields')
+    if fields is not None:
+        check_fields(fields)
+    limit = data.get('limit')
+    if limit is not None:
+        check_limit(limit)
+    sort = data.get('sort')
+    check_sort(sort)
+    response_format = data.get('format', 'json')
+    check_format(response_format)
+    filters = data.get('filters')
+    check_filters(filters)
+    fanout = data.get('fanout', False)
+    locations = data.get('locations')
+    if locations is not None:
+        check_names("locations", locations)
+    check_fanout(platforms if fanout else None, locations)
+    branch_timeout = capped("branch_timeout", data.get('branch_timeout', BRANCH_TIMEOUT), BRANCH_TIMEOUT, whole=False)
     
-    # Experience level
-    if experience_level != "Any":
-        exp_map = {
-            "Internship": "INTERNSHIP",
-            "Entry level": "ENTRY_LEVEL",
-            "Associate": "ASSOCIATE",
-            "Mid-Senior level": "MID_LEVEL",
-            "Director": "DIRECTOR",
-            "Executive": "EXECUTIVE"
-        }
-        chips_parts.append(f"experience_level:{exp_map[experience_level]}")
+    # Build chips parameter
+    with metrics.stage("build_chips"):
+        chips_value = build_chips(date_posted, job_type, experience_level)
     
-    return ",".join(chips_parts) if chips_parts else None
+    return {
+        "search": search_kwargs(
+            keywords,
+            location,
+            count=count,
+            days_ago=days_ago,
+            country=country,
+            remote_only=remote_only,
+            search_radius=search_radius,
+            chips=chips_value,
+            max_pages=max_pages,
+            deadline=deadline,
+        ),
+        "platforms": platforms,
+        "select_all": select_all,
+        "fanout": fanout,
+        "locations": locations,
+        "branch_timeout": branch_timeout,
+        "source": data.get('source', 'upstream'),
+        "job_type": job_type,
+        "fields": fields,
+        "limit": limit,
+        "sort": sort,
+        "format": response_format,
+        "filters": filters,
+    }
 
-def filter_jobs_by_platform(jobs, platforms, select_all):
-    """Filter jobs to only include selected platforms"""
-    if select_all or not platforms:
-        return jobs
-    return [job for job in jobs if any(platform.lower() in job['platform'].lower() for platform in platforms)]
+def local_index():
+    """The local job index of the search provider(s), None when there is none"""
+    return getattr(get_search_provider(), "index", None)
+
+def search_local(spec):
+    """Answer a search spec from the local job index, without calling upstream"""
+    index = local_index()
+    if index is None:
+        raise ValueError("The local job index is disabled (JOB_INDEX_PATH is empty)")
+    
+    search = spec["search"]
+    return index.search(
+        keywords=search["keywords"],
+        location=search["location"],
+        job_type=spec["job_type"],
+        platforms=None if spec["select_all"] else spec["platforms"],
+        limit=search["count"],
+    )
+
+def iter_search(spec, dedupe):
+    """Yield the jobs for a search spec, fanning out per platform/location when asked
+
+    Reposts are dropped by `dedupe` (a Deduplicator) before they count
+    toward the search's `count`.
+    """
+    if spec["source"] == "local":
+        return dedupe.filter(search_local(spec))
+    
+    # ScrapingDog, or an Orchestrator over every provider in SEARCH_PROVIDERS
+    provider = get_search_provider()
+    branches = fanout_branches(spec["search"], spec["platforms"] if spec["fanout"] else None, spec["locations"])
+    if len(branches) > 1:
+        return dedupe.filter(iter_fanout(provider, branches, branch_timeout=spec["branch_timeout"], page_urls=dedupe.page_urls))
+    
+    # Call the provider, following next_page_token until `count` is reached
+    return provider.iter_jobs(**branches[0], dedupe=dedupe)
+
+def iter_search_or_degrade(spec, status):
+    """iter_search, finishing from the local job index when upstream is unavailable
+
+    Sets status["degraded"] to the reason when the fallback kicked in.
+    Reposts of a posting already yielded (across pages, fan-out branches
+    and the fallback) are dropped; status["duplicates"] counts them.
+    """
+    dedupe = Deduplicator()
+    try:
+        yield from iter_search(spec, dedupe)
+    except UpstreamUnavailable as e:
+        status["degraded"] = str(e)
+        if spec["source"] == "local" or local_index() is None:
+            return
+        yield from dedupe.filter(search_local(spec))
+    finally:
+        if dedupe.duplicates:
+            status["duplicates"] = dedupe.duplicates
+
+def search_response(filtered_jobs, status=None, response_format="json"):
+    """Response body for a finished search; with format "compact" the jobs go out as columns"""
+    if not filtered_jobs:
+        return {"message": "No jobs found matching your criteria", "results": [], **(status or {})}
+    
+    if response_format == "compact":
+        return {"count": len(filtered_jobs), "format": "compact", **compact_jobs(filtered_jobs), **(status or {})}
+    return {
+        "count": len(filtered_jobs),
+        "results": filtered_jobs,
+        **(status or {})
+    }
+
+def finish_search(filtered_jobs, spec, status=None):
+    """Response body for a search's filtered jobs: sorted, projected and, with a limit, paged
+
+    When there are more than `limit` jobs the sorted list is stored and the
+    body carries a next_cursor for the following page.
+    """
+    jobs = sort_jobs(filtered_jobs, spec["sort"])
+    limit = spec["limit"]
+    if limit is None:
+        return search_response(project_jobs(jobs, spec["fields"]), status, spec["format"])
+    
+    next_cursor = None
+    if len(jobs) > limit:
+        result_set = get_result_sets().put(jobs, spec["fields"], status, spec["format"])
+        next_cursor = encode_cursor(result_set, limit, limit)
+    body = search_response(project_jobs(jobs[:limit], spec["fields"]), status, spec["format"])
+    body.update(total=len(jobs), next_cursor=next_cursor)
+    return body
+
+def cursor_response(data):
+    """(body, status code) for a {"cursor": ..., "limit"?, "fields"?, "format"?} request"""
+    limit = data.get('limit')
+    try:
+        if limit is not None:
+            check_limit(limit)
+        jobs, total, next_cursor, entry = get_result_sets().page(data['cursor'], limit)
+        fields = data.get('fields', entry["fields"])
+        if fields is not None:
+            check_fields(fields)
+        response_format = data.get('format', entry.get("format") or "json")
+        check_format(response_format)
+    except CursorExpired as e:
+        return {"error": str(e)}, 410
+    except (CursorError, ValueError) as e:
+        return {"error": str(e)}, 400
+    
+    body = search_response(project_jobs(jobs, fields), entry["status"], response_format)
+    body.update(total=total, next_cursor=next_cursor)
+    return body, 200
+
+STREAM_MIMETYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def stream_format(data, accept):
+    """"ndjson", "sse" or None for a buffered JSON response"""
+    stream = data.get('stream', False)
+    if stream in STREAM_MIMETYPES:
+        return stream
+    if stream:
+        return "sse" if "text/event-stream" in (accept or "") else "ndjson"
+    return None
+
+def encode_record(record, fmt, event="job"):
+    """One streamed record: an NDJSON line or an SSE event"""
+    line = fastjson.dumps(record)
+    if fmt == "sse":
+        return f"event: {event}\ndata: {line}\n\n"
+    return line + "\n"
+
+def stream_search(jobs, spec, fmt, status=None, trace=None):
+    """Write each job as soon as it arrives, then a summary record with count and timing"""
+    start = time.perf_counter()
+    first = None
+    count = 0
+    # The generator runs after the view returned, so it re-activates the request's trace
+    with metrics.activate(trace):
+        try:
+            for job in jobs:
+                if not filter_jobs_by_platform([job], spec["platforms"], spec["select_all"]):
+                    continue
+                if first is None:
+                    first = time.perf_counter()
+                count += 1
+                yield encode_record(project_job(job, spec["fields"]), fmt)
+        except Exception as e:
+            metrics.mark_upstream_error()
+            yield encode_record({"error": str(e)}, fmt, "error")
+    if trace is not None:
+        trace.finish(metrics.outcome_for(trace, count, "degraded" in (status or {})))
+    
+    summary = {
+        "count": count,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        "first_result_ms": round((first - start) * 1000, 1) if first is not None else None,
+        **(status or {})
+    }
+    yield encode_record({"summary": summary}, fmt, "summary")
+
+@app.after_request
+def compress(response):
+    return compress_response(response, request.headers.get('Accept-Encoding'))
 
 @app.route('/api/jobs/search', methods=['POST'])
 def search_jobs():
+    trace = metrics.start_trace('/api/jobs/search')
+    with metrics.activate(trace):
+        response, status_code, outcome = run_search_request(trace)
+    
+    # Streaming responses finish their trace when the stream ends
+    if trace is not None and outcome is not None:
+        trace.finish(outcome)
+    return response, status_code
+
+def run_search_request(trace):
+    """Body of the search view; returns (response, status code, metrics outcome)"""
     try:
-        data = request.get_json()
+        with metrics.stage("parse_body"):
+            data = request.get_json()
         
-        # Required parameters
-        keywords = data.get('keywords', '')
-        location = data.get('location', '')
+        # The next page of an earlier search, without running it again
+        if isinstance(data, dict) and data.get('cursor') is not None:
+            body, status_code = cursor_response(data)
+            return jsonify(body), status_code, "ok" if status_code == 200 else "bad_request"
         
-        if not keywords:
-            return jsonify({"error": "Please enter at least one keyword to search for"}), 400
+        # Run it on the background queue and answer with a task id to poll
+        if isinstance(data, dict) and data.get('async'):
+            body, status_code = enqueue_search(data, request_tenant())
+            response = jsonify(body)
+            if status_code == 202:
+                response.headers['Location'] = body["poll"]
+            return response, status_code, "ok" if status_code == 202 else "bad_request"
         
-        # Optional parameters with defaults
-        platforms = data.get('platforms', ["LinkedIn", "Indeed", "Glassdoor", "Monster", "ZipRecruiter"])
-        select_all = data.get('select_all', True)
-        count = data.get('count', 10)
-        days_ago = data.get('days_ago', 7)
-        country = data.get('country', 'US')
-        remote_only = data.get('remote_only', False)
-        search_radius = data.get('search_radius', 10)
-        job_type = data.get('job_type', 'Any')
-        date_posted = data.get('date_posted', 'Any time')
-        experience_level = data.get('experience_level', 'Any')
+        try:
+            spec = parse_search_request(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400, "bad_request"
+        set_metrics_country(spec["search"]["country"])
         
-        # Build chips parameter
-        chips_value = build_chips(date_posted, job_type, experience_level)
+        # Set to {"degraded": reason} if upstream is throttled and results come from the local index
+        status = {}
         
-        # Call the ScrapingDog API
-        api = ScrapingDog()
-        jobs = api.search_jobs(
-            keywords=keywords,
-            location=location,
-            platform=None,
-            count=count,
-            days_ago=days_ago,
-            country=country,
-            lrad=str(search_radius) if (search_radius > 0 and not remote_only) else None,
-            ltype="1" if remote_only else None,
-            chips=chips_value,
+        fmt = stream_format(data, request.headers.get('Accept'))
+        if fmt:
+            body = stream_with_context(stream_search(iter_search_or_degrade(spec, status), spec, fmt, status, trace))
+            response = Response(body, mimetype=STREAM_MIMETYPES[fmt], headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+            return response, 200, None
+        
+        jobs = list(iter_search_or_degrade(spec, status))
+        
+        # Filter jobs based on selected platforms and filters, ranking them for sort "relevance"
+        with metrics.stage("filter"):
+            filtered_jobs = apply_filters(jobs, spec)
+        
+        with metrics.stage("sort"):
+            body = finish_search(filtered_jobs, spec, status)
+        
+        with metrics.stage("serialize"):
+            response = jsonify(body)
+        return response, 200, metrics.outcome_for(trace, filtered_jobs, "degraded" in status)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500, "error"
+
+def run_search_spec(spec):
+    """Buffered response body for one search spec, as the search view would return it"""
+    status = {}
+    jobs = list(iter_search_or_degrade(spec, status))
+    with metrics.stage("filter"):
+        filtered_jobs = apply_filters(jobs, spec)
+    return finish_search(filtered_jobs, spec, status)
+
+def run_queued_search(queue, task_id, worker, body):
+    """SearchWorkers runner: run a queued search, handing over its jobs as they arrive, then store the final body
+
+    Stops early, without a final body, once the task is cancelled.
+    """
+    trace = metrics.start_trace('/api/jobs/search/queued')
+    with metrics.activate(trace):
+        spec = parse_search_request(body)
+        set_metrics_country(spec["search"]["country"])
+        status = {}
+        jobs = []
+        pending = []
+        flushed = time.monotonic()
+        for job in iter_search_or_degrade(spec, status):
+            jobs.append(job)
+            if filter_jobs_by_platform([job], spec["platforms"], spec["select_all"]):
+                pending.append(project_job(job, spec["fields"]))
+            if len(pending) >= QUEUE_FLUSH_JOBS or time.monotonic() - flushed >= QUEUE_FLUSH_SECONDS:
+                if not queue.append(task_id, worker, pending):
+                    return
+                pending = []
+                flushed = time.monotonic()
+        if not queue.append(task_id, worker, pending):
+            return
+        
+        with metrics.stage("filter"):
+            filtered_jobs = apply_filters(jobs, spec)
+        with metrics.stage("sort"):
+            result = finish_search(filtered_jobs, spec, status)
+        queue.finish(task_id, worker, result)
+    if trace is not None:
+        trace.finish(metrics.outcome_for(trace, filtered_jobs, "degraded" in status))
+
+def enqueue_search(data, tenant):
+    """(body, status code) for a search request sent with "async": true
+
+    Queues it and answers straight away with the task id to poll.
+    """
+    try:
+        # The tenant sets the priority; a request can only ask for less
+        priority = tenant_priority(tenant, data.get('priority'))
+        parse_search_request(data)
+        queue = get_search_queue()
+        start_workers(run_queued_search)
+        task_id = queue.submit({key: value for key, value in data.items() if key not in ('async', 'priority')}, tenant, priority)
+    except QueueFull as e:
+        return {"error": str(e)}, 429
+    except KeyError as e:
+        return {"error": f"Unknown option {e}"}, 400
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return {"id": task_id, "state": "queued", "poll": f"/api/jobs/search/{task_id}"}, 202
+
+def request_tenant():
+    """Who a queued search is counted against for fairness and priority"""
+    return queue_tenant(request.remote_addr, request.headers.get('X-Tenant'))
+
+def dedupe_batch(searches):
+    """Parse each search body and group identical specs
+
+    Returns (unique, errors): unique is a list of (spec, [input indexes])
+    and errors maps an input index to the reason it couldn't be parsed.
+    """
+    unique = {}
+    errors = {}
+    for i, data in enumerate(searches):
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("Each search must be a JSON object")
+            spec = parse_search_request(data)
+        except KeyError as e:
+            errors[i] = f"Unknown option {e}"
+            continue
+        except Exception as e:
+            errors[i] = str(e)
+            continue
+        key = json.dumps(spec, sort_keys=True, default=str)
+        if key in unique:
+            unique[key][1].append(i)
+        else:
+            unique[key] = (spec, [i])
+    return list(unique.values()), errors
+
+# The pool every batch runs its searches on, so together they use at most BATCH_WORKERS threads
+get_batch_pool = per_process(lambda: ThreadPoolExecutor(BATCH_WORKERS, thread_name_prefix="search-batch"))
+
+def iter_batch(unique):
+    """Run each unique spec on the shared batch pool; yield (indexes, result) as they finish"""
+    def run(spec):
+        try:
+            return run_search_spec(spec)
+        except Exception as e:
+            return {"error": str(e)}
+
+    pool = get_batch_pool()
+    futures = {pool.submit(contextvars.copy_context().run, run, spec): indexes for spec, indexes in unique}
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # A client that hangs up mid-stream doesn't leave its queued searches behind
+        for future in futures:
+            future.cancel()
+
+def stream_batch(unique, errors, fmt, trace=None):
+    """Write one record per input search as soon as its spec finishes, then a summary"""
+    start = time.perf_counter()
+    failed = 0
+    with metrics.activate(trace):
+        for i, error in errors.items():
+            failed += 1
+            yield encode_record({"index": i, "error": error}, fmt, "error")
+        for indexes, result in iter_batch(unique):
+            for i in indexes:
+                failed += "error" in result
+                yield encode_record({"index": i, **result}, fmt, "error" if "error" in result else "result")
+    if trace is not None:
+        trace.finish("ok" if not failed else "error")
+    
+    summary = {
+        "searches": len(errors) + sum(len(indexes) for _, indexes in unique),
+        "unique": len(unique),
+        "failed": failed,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    yield encode_record({"summary": summary}, fmt, "summary")
+
+@app.route('/api/jobs/search/batch', methods=['POST'])
+def search_jobs_batch():
+    trace = metrics.start_trace('/api/jobs/search/batch')
+    with metrics.activate(trace):
+        response, status_code, outcome = run_batch_request(trace)
+    if trace is not None and outcome is not None:
+        trace.finish(outcome)
+    return response, status_code
+
+def run_batch_request(trace):
+    """Body of the batch view; returns (response, status code, metrics outcome)"""
+    try:
+        with metrics.stage("parse_body"):
+            data = request.get_json()
+        
+        searches = data.get('searches') if isinstance(data, dict) else None
+        if not isinstance(searches, list) or not searches:
+            return jsonify({"error": "Send a non-empty list of searches under \"searches\""}), 400, "bad_request"
+        if len(searches) > BATCH_MAX_SEARCHES:
+            return jsonify({"error": f"At most {BATCH_MAX_SEARCHES} searches per batch"}), 400, "bad_request"
+        
+        unique, errors = dedupe_batch(searches)
+        
+        fmt = stream_format(data, request.headers.get('Accept'))
+        if fmt:
+            body = stream_with_context(stream_batch(unique, errors, fmt, trace))
+            response = Response(body, mimetype=STREAM_MIMETYPES[fmt], headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+            return response, 200, None
+        
+        results = [None] * len(searches)
+        for i, error in errors.items():
+            results[i] = {"error": error}
+        for indexes, result in iter_batch(unique):
+            for i in indexes:
+                results[i] = result
+        
+        failed = sum("error" in result for result in results)
+        with metrics.stage("serialize"):
+            response = jsonify({"count": len(searches), "unique": len(unique), "failed": failed, "results": results})
+        return response, 200, "ok" if not failed else "error"
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500, "error"
+
+@app.route('/api/jobs/search/<task_id>', methods=['GET', 'DELETE'])
+def queued_search(task_id):
+    """A background search's state, the jobs found since ?after=N and its final body once done
+
+    ?wait=S long-polls up to S seconds (at most SEARCH_QUEUE_MAX_WAIT) for
+    new jobs or the end of the search. DELETE cancels it.
+    """
+    try:
+        queue = get_search_queue()
+        start_workers(run_queued_search)
+        after = int(request.args.get('after', 0))
+        wait = float(request.args.get('wait', 0))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if request.method == 'DELETE':
+        if not queue.cancel(task_id):
+            return jsonify({"error": "No such queued or running search"}), 404
+        return "", 204
+    task = queue.wait(task_id, max(after, 0), min(max(wait, 0.0), MAX_WAIT))
+    if task is None:
+        return jsonify({"error": "No such search, or its results expired"}), 404
+    return jsonify(task), 200
+
+@app.route('/api/jobs/export', methods=['GET', 'POST'])
+def export_jobs():
+    """Stream jobs as ?format=csv, jsonl or parquet, in constant memory however many there are
+
+    GET exports the local job index (?source=index, narrowed by keywords,
+    location, job_type and comma-separated platforms) or the jobs a
+    background search found (?search=<id>). POST runs a search body, or a
+    {"searches": [...]} batch, and exports the jobs as they arrive.
+    ?fields= picks the columns, comma-separated.
+    """
+    from utils.export import EXPORT_FORMATS, check_export_format, export_chunks
+    
+    try:
+        export_format = request.args.get('format', 'csv')
+        check_export_format(export_format)
+        fields = [name.strip() for name in request.args['fields'].split(',')] if request.args.get('fields') else None
+        if fields is not None:
+            check_fields(fields)
+        jobs = export_source()
+    except KeyError as e:
+        return jsonify({"error": f"Unknown option {e}"}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(export_chunks(jobs, export_format, fields)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=jobs.{extension}", "X-Accel-Buffering": "no"},
+    )
+
+def export_source():
+    """The jobs an export request asks for, as a lazy iterator; raises ValueError or LookupError"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError("Send a search, or {\"searches\": [...]}, as a JSON object")
+        if 'searches' in data:
+            return iter_batch_jobs(data['searches'])
+        spec = parse_search_request(data)
+        status = {}
+        return (job for job in iter_search_or_degrade(spec, status) if filter_jobs_by_platform([job], spec["platforms"], spec["select_all"]))
+    
+    task_id = request.args.get('search')
+    if task_id:
+        queue = get_search_queue()
+        if queue.state(task_id) is None:
+            raise LookupError("No such search, or its results expired")
+        return queue.iter_jobs(task_id)
+    
+    if request.args.get('source') == 'index':
+        index = local_index()
+        if index is None:
+            raise ValueError("The local job index is disabled (JOB_INDEX_PATH is empty)")
+        platforms = [name.strip() for name in request.args.get('platforms', '').split(',') if name.strip()]
+        return index.iter_jobs(
+            keywords=request.args.get('keywords'),
+            location=request.args.get('location'),
+            job_type=request.args.get('job_type'),
+            platforms=platforms or None,
         )
+    raise ValueError("Export ?source=index, ?search=<id> of a background search, or POST a search to run")
+
+def iter_batch_jobs(searches):
+    """Every job of a batch of searches, each search's as soon as it finishes; failed searches add none"""
+    if not isinstance(searches, list) or not searches:
+        raise ValueError("Send a non-empty list of searches under \"searches\"")
+    if len(searches) > BATCH_MAX_SEARCHES:
+        raise ValueError(f"At most {BATCH_MAX_SEARCHES} searches per batch")
+    unique, errors = dedupe_batch(searches)
+    if errors:
+        i, error = next(iter(errors.items()))
+        raise ValueError(f"Search {i}: {error}")
+    # Whole result lists: no paging, projection or compact format
+    for spec, _ in unique:
+        spec.update(limit=None, fields=None, format="json")
+    
+    def jobs():
+        for _, result in iter_batch(unique):
+            yield from result.get("results", [])
+    return jobs()
+
+@app.route('/api/jobs/saved', methods=['POST'])
+def create_saved_search():
+    data = request.get_json(silent=True)
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("Send the search to save as a JSON object")
+        parse_search_request(data)
+        store = get_saved_searches()
+    except KeyError as e:
+        return jsonify({"error": f"Unknown option {e}"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(store.get(store.create(data))), 201
+
+@app.route('/api/jobs/saved/<search_id>', methods=['GET', 'DELETE'])
+def saved_search(search_id):
+    try:
+        store = get_saved_searches()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if request.method == 'DELETE':
+        if not store.delete(search_id):
+            return jsonify({"error": "No such saved search"}), 404
+        return "", 204
+    saved = store.get(search_id)
+    if saved is None:
+        return jsonify({"error": "No such saved search"}), 404
+    return jsonify(saved), 200
+
+@app.route('/api/jobs/saved/<search_id>/delta', methods=['GET'])
+def saved_search_delta(search_id):
+    trace = metrics.start_trace('/api/jobs/saved/delta')
+    with metrics.activate(trace):
+        response, status_code, outcome = run_delta_request(search_id, trace)
+    if trace is not None:
+        trace.finish(outcome)
+    return response, status_code
+
+def run_delta_request(search_id, trace):
+    """Body of the delta view: the saved search's results minus those earlier polls returned
+
+    Pages are fetched one at a time and paging stops at a run of postings
+    returned before. Returns (response, status code, metrics outcome).
+    """
+    try:
+        store = get_saved_searches()
+        saved = store.get(search_id)
+        if saved is None:
+            return jsonify({"error": "No such saved search"}), 404, "bad_request"
         
-        # Filter jobs based on selected platforms
-        filtered_jobs = filter_jobs_by_platform(jobs, platforms, select_all)
+        spec = parse_search_request(saved["search"])
+        set_metrics_country(spec["search"]["country"])
+        # Only request a page once the one before it turned out to hold new postings
+        spec["search"]["prefetch"] = False
         
-        if not filtered_jobs:
-            return jsonify({"message": "No jobs found matching your criteria", "results": []}), 200
+        status = {}
+        delta = DeltaFilter(store, search_id)
+        jobs = list(delta.filter(iter_search_or_degrade(spec, status)))
+        with metrics.stage("filter"):
+            new_jobs = apply_filters(jobs, spec)
         
-        # Prepare response
-        response = {
-            "count": len(filtered_jobs),
-            "results": filtered_jobs
-        }
+        with metrics.stage("sort"):
+            body = finish_search(new_jobs, spec, status)
+        delta.commit()
+        body.update(id=search_id, since=saved["last_polled"], examined=delta.examined, stopped_early=delta.stopped_early)
         
-        return jsonify(response), 200
+        with metrics.stage("serialize"):
+            response = jsonify(body)
+        return response, 200, metrics.outcome_for(trace, new_jobs, "degraded" in status)
     
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400, "bad_request"
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), 500, "error"
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def get_stats():
+    provider = get_search_provider()
+    return jsonify({
+        **client_stats(),
+        "queue": queue_stats(),
+        "providers": provider.stats() if isinstance(provider, Orchestrator) else None,
+    }), 200
+
+def client_stats():
+    """ScrapingDog client state for /api/jobs/stats, all None when ScrapingDog isn't a search provider"""
+    try:
+        client = get_client() if "scrapingdog" in SEARCH_PROVIDERS else None
+    except ValueError:
+        client = None
+    if client is None:
+        return dict.fromkeys(("cache", "singleflight", "governor", "refresher", "breaker", "hedging"))
+    return {
+        "cache": client.cache.stats() if client.cache is not None else None,
+        "singleflight": client.flight.stats(),
+        "governor": client.governor.stats() if client.governor is not None else None,
+        "refresher": client.refresher.stats() if client.refresher is not None else None,
+        "breaker": client.breaker.stats() if client.breaker is not None else None,
+        "hedging": client.hedger.stats() if client.hedger is not None else None,
+    }
+
+def queue_stats():
+    """Background search queue counts by state, None when the queue is disabled"""
+    try:
+        return get_search_queue().stats()
+    except ValueError:
+        return None
+
+def client_samples():
+    """Cache, coalescing and governor state for /metrics"""
+    try:
+        client = get_client()
+    except ValueError:
+        return []
+    lines = []
+    if client.cache is not None:
+        cache = client.cache.stats()
+        lines += metrics.sample_lines("jobsearch_cache_hits_total", "Search cache hits", cache["hits"], "counter")
+        lines += metrics.sample_lines("jobsearch_cache_stale_hits_total", "Expired cache entries served while refreshing", cache["stale_hits"], "counter")
+        lines += metrics.sample_lines("jobsearch_cache_misses_total", "Search cache misses", cache["misses"], "counter")
+    flight = client.flight.stats()
+    lines += metrics.sample_lines("jobsearch_coalesced_total", "Searches that shared an in-flight upstream call", flight["coalesced"], "counter")
+    if client.governor is not None:
+        governor = client.governor.stats()
+        lines += metrics.sample_lines("jobsearch_governor_queue_depth", "Calls waiting for an upstream slot", governor["queue_depth"])
+        lines += metrics.sample_lines("jobsearch_governor_in_flight", "Upstream calls in flight", governor["in_flight"])
+        lines += metrics.sample_lines("jobsearch_governor_remaining_budget", "Upstream credits left today", governor["remaining_budget"])
+    if client.breaker is not None:
+        breaker = client.breaker.stats()
+        lines += metrics.sample_lines("jobsearch_breaker_state", "Upstream circuit: 0 closed, 1 half-open, 2 open", STATE_CODES[breaker["state"]])
+        lines += metrics.sample_lines("jobsearch_breaker_opened_total", "Times the upstream circuit opened", breaker["opened"], "counter")
+        lines += metrics.sample_lines("jobsearch_breaker_rejected_total", "Upstream calls refused by the open circuit", breaker["rejected"], "counter")
+    if client.hedger is not None:
+        hedging = client.hedger.stats()
+        lines += metrics.sample_lines("jobsearch_hedged_requests_total", "Duplicate upstream calls fired past the hedge delay", hedging["fired"], "counter")
+        lines += metrics.sample_lines("jobsearch_hedge_wins_total", "Hedged calls that answered first", hedging["won"], "counter")
+    return lines
+
+metrics.register_collector(client_samples)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/api/jobs/countries', methods=['GET'])
 def get_countries():
-    return jsonify(COUNTRIES), 200
+    return static_response(COUNTRIES_JSON)
 
 @app.route('/api/jobs/platforms', methods=['GET'])
 def get_platforms():
-    platforms = ["LinkedIn", "Indeed", "Glassdoor", "Monster", "ZipRecruiter"]
-    return jsonify(platforms), 200
+    return static_response(PLATFORMS_JSON)
+
+def static_response(static):
+    """A pre-serialized body with an ETag and Cache-Control; 304 when the client's copy matches"""
+    body, etag = static
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = STATIC_MAX_AGE
+    return response.make_conditional(request)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
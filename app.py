@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
-from utils.scrapingdog_api import ScrapingDog
+from utils.cache import CACHE_TTL
+from utils.providers import get_search_provider
+from utils.search_service import PLATFORMS, build_chips, fetch_jobs, filter_jobs_by_platform, normalized_search, search_kwargs
 
 # Configure page
 st.set_page_config(page_title="Job Search API", page_icon="🔍", layout="wide")
@@ -27,7 +29,7 @@ st.write("Find job listings with powerful search filters.")
 # Sidebar for filters
 with st.sidebar:
     st.subheader("Basic Filters")
-    platform_options = ["LinkedIn", "Indeed", "Glassdoor", "Monster", "ZipRecruiter"]
+    platform_options = list(PLATFORMS)
     
     # Platform selection
     col1, col2 = st.columns([1, 4])
@@ -93,119 +95,98 @@ with st.form("job_search_form"):
     
     submitted = st.form_submit_button("Search Jobs")
 
-# Function to build chips parameter
-def build_chips():
-    chips_parts = []
-    
-    # Date posted
-    if date_posted != "Any time":
-        if date_posted == "Past 24 hours":
-            chips_parts.append("date_posted:today")
-        elif date_posted == "Past week":
-            chips_parts.append("date_posted:week")
-        elif date_posted == "Past month":
-            chips_parts.append("date_posted:month")
+@st.cache_resource
+def search_client():
+    """The process-wide search provider: ScrapingDog with its connection pool and page cache, or an Orchestrator"""
+    return get_search_provider()
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=64, show_spinner=False)
+def cached_search(search_key):
+    """All jobs for a normalized search; every platform, so changing the platform selection needs no new call"""
+    return fetch_jobs(dict(search_key), search_client())
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=64, show_spinner=False)
+def results_table(search_key, platforms, select_all):
+    """The display table for a search's jobs on the selected platforms"""
+    filtered_jobs = filter_jobs_by_platform(cached_search(search_key), list(platforms), select_all)
+    if not filtered_jobs:
+        return None
     
-    # Job type
-    if job_type != "Any":
-        job_type_map = {
-            "Full-time": "FULLTIME",
-            "Part-time": "PARTTIME",
-            "Contract": "CONTRACTOR",
-            "Internship": "INTERN",
-            "Temporary": "TEMPORARY"
-        }
-        chips_parts.append(f"employment_type:{job_type_map[job_type]}")
+    # Convert to DataFrame
+    df = pd.DataFrame(filtered_jobs)
     
-    # Experience level
-    if experience_level != "Any":
-        exp_map = {
-            "Internship": "INTERNSHIP",
-            "Entry level": "ENTRY_LEVEL",
-            "Associate": "ASSOCIATE",
-            "Mid-Senior level": "MID_LEVEL",
-            "Director": "DIRECTOR",
-            "Executive": "EXECUTIVE"
-        }
-        chips_parts.append(f"experience_level:{exp_map[experience_level]}")
+    # Reorder and select columns
+    df = df[['title', 'company', 'location', 'date_posted', 'job_type', 'platform', 'apply_url']]
     
-    return ",".join(chips_parts) if chips_parts else None
+    # Rename columns for better display
+    df.columns = ['Job Title', 'Company', 'Location', 'Posted', 'Job Type', 'Platform', 'Apply']
+    return df
 
-def filter_jobs_by_platform(jobs, platforms, select_all):
-    """Filter jobs to only include selected platforms"""
-    if select_all or not platforms:
-        return jobs
-    return [job for job in jobs if any(platform.lower() in job['platform'].lower() for platform in platforms)]
+@st.cache_data(ttl=CACHE_TTL, max_entries=16, show_spinner=False)
+def results_csv(search_key, platforms, select_all):
+    """CSV bytes of a results table, built only once a download is asked for"""
+    return results_table(search_key, platforms, select_all).to_csv(index=False).encode('utf-8')
 
-# Display results
+# Run the search on submit; later reruns (e.g. a new platform selection) reuse its cached results
 if submitted and (keywords or location):
     if not keywords:
         st.warning("Please enter at least one keyword to search for")
     else:
+        st.session_state["search_key"] = normalized_search(search_kwargs(
+            keywords,
+            location,
+            count=count,
+            days_ago=days_ago,
+            country=country,
+            remote_only=remote_only,
+            search_radius=search_radius,
+            chips=build_chips(date_posted, job_type, experience_level),
+        ))
+        st.session_state["csv_requested"] = False
+elif submitted:
+    st.warning("Please enter at least one keyword to search for")
+
+# Display results
+search_key = st.session_state.get("search_key")
+if search_key is not None:
+    platforms = tuple(selected_platforms)
+    try:
         with st.spinner("Searching for jobs..."):
-            api = ScrapingDog()
-            
-            # Build chips parameter
-            chips_value = build_chips()
+            df = results_table(search_key, platforms, select_all)
+    except Exception as e:
+        st.error(f"Search failed: {e}")
+        df = None
+    else:
+        if df is not None:
+            st.success(f"Found {len(df)} jobs matching your criteria")
             
-            jobs = api.search_jobs(
-                keywords=keywords,
-                location=location,
-                platform=None,
-                count=count,
-                days_ago=days_ago,
-                country=country,
-                lrad=str(search_radius) if (search_radius > 0 and not remote_only) else None,
-                ltype="1" if remote_only else None,
-                chips=chips_value,
-                # next_page_token would be used for pagination in future
-                # uds would be used for very specific Google filters
+            # Display the DataFrame
+            st.dataframe(
+                df,
+                column_config={
+                    "Apply": st.column_config.LinkColumn("Apply"),
+                    "Posted": st.column_config.TextColumn("Posted", width="small"),
+                    "Job Type": st.column_config.TextColumn("Job Type", width="small"),
+                    "Platform": st.column_config.TextColumn("Platform", width="small")
+                },
+                hide_index=True,
+                use_container_width=True,
+                height=600
             )
             
-            # Filter jobs based on selected platforms
-            filtered_jobs = filter_jobs_by_platform(jobs, selected_platforms, select_all)
-            
-            if filtered_jobs:
-                st.success(f"Found {len(filtered_jobs)} jobs matching your criteria")
-                
-                # Convert to DataFrame
-                df = pd.DataFrame(filtered_jobs)
-                
-                # Reorder and select columns
-                df = df[['title', 'company', 'location', 'date_posted', 'job_type', 'platform', 'apply_url']]
-                
-                # Rename columns for better display
-                df.columns = ['Job Title', 'Company', 'Location', 'Posted', 'Job Type', 'Platform', 'Apply Link']
-                
-                # Add clickable links
-                df['Apply'] = df['Apply Link'].apply(lambda x: f'{x}')
-                
-                # Display the DataFrame
-                st.dataframe(
-                    df[['Job Title', 'Company', 'Location', 'Posted', 'Job Type', 'Platform', 'Apply']],
-                    column_config={
-                        "Apply": st.column_config.LinkColumn("Apply"),
-                        "Posted": st.column_config.TextColumn("Posted", width="small"),
-                        "Job Type": st.column_config.TextColumn("Job Type", width="small"),
-                        "Platform": st.column_config.TextColumn("Platform", width="small")
-                    },
-                    hide_index=True,
-                    use_container_width=True,
-                    height=600
-                )
-                
-                # Download button
-                csv = df.to_csv(index=False).encode('utf-8')
+            # Download button; the CSV is only built once it's asked for
+            if st.session_state.get("csv_requested"):
                 st.download_button(
                     label="Download Results as CSV",
-                    data=csv,
+                    data=results_csv(search_key, platforms, select_all),
                     file_name='job_search_results.csv',
                     mime='text/csv'
                 )
-            else:
-                st.warning("No jobs found matching your criteria. Try different filters.")
-elif submitted:
-    st.warning("Please enter at least one keyword to search for")
+            elif st.button("Prepare CSV download"):
+                st.session_state["csv_requested"] = True
+                st.rerun()
+        else:
+            st.warning("No jobs found matching your criteria. Try different filters.")
 
 # Add some info about the app
 st.markdown("---")
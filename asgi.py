@@ -0,0 +1,254 @@
+"""ASGI entry point: async /api/jobs/search, everything else served by the Flask app
+
+Run with an ASGI server, e.g.  uvicorn asgi:app --port 5000
+"""
+import asyncio
+import threading
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+
+from api import (
+    STREAM_MIMETYPES,
+    app as flask_app,
+    apply_filters,
+    encode_record,
+    cursor_response,
+    enqueue_search,
+    finish_search,
+    project_job,
+    filter_jobs_by_platform,
+    iter_search,
+    local_index,
+    parse_search_request,
+    search_local,
+    set_metrics_country,
+    stream_format,
+)
+from utils import fastjson, metrics
+from utils.async_scrapingdog import close_async_client, get_async_client
+from utils.compression import encode_body
+from utils.errors import UpstreamUnavailable
+from utils.fanout import aiter_fanout, fanout_branches
+from utils.fingerprint import Deduplicator
+from utils.providers import get_search_provider
+from utils.search_queue import request_tenant
+from utils.scrapingdog_api import ScrapingDog
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_json(send, body, status=200, accept_encoding=None, extra_headers=()):
+    payload, encoding = encode_body(fastjson.dumps_bytes(body, sort_keys=True), accept_encoding)
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode()), (b"vary", b"Accept-Encoding")]
+    if encoding is not None:
+        headers.append((b"content-encoding", encoding.encode()))
+    headers.extend(extra_headers)
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def aiter_thread(iterate):
+    """Yield the items of the sync iterable `iterate()` as a worker thread produces them
+
+    Exceptions it raises are raised here. Once the consumer stops, the
+    worker stops at its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def put(item, error=None):
+        if not stop.is_set():
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+
+    def run():
+        try:
+            for item in iterate():
+                if stop.is_set():
+                    return
+                put(item)
+        except Exception as e:
+            put(done, e)
+        else:
+            put(done)
+
+    worker = asyncio.ensure_future(asyncio.to_thread(run))
+    try:
+        while True:
+            item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        worker.cancel()
+
+
+async def aiter_search(spec, dedupe):
+    """Async api.iter_search"""
+    if spec["source"] == "local":
+        for job in dedupe.filter(await asyncio.to_thread(search_local, spec)):
+            yield job
+        return
+
+    if not isinstance(get_search_provider(), ScrapingDog):
+        # Other providers and the Orchestrator are synchronous: iterate on a thread, jobs streamed back as they come
+        async for job in aiter_thread(lambda: iter_search(spec, dedupe)):
+            yield job
+        return
+
+    branches = fanout_branches(spec["search"], spec["platforms"] if spec["fanout"] else None, spec["locations"])
+    if len(branches) > 1:
+        async for job in aiter_fanout(get_async_client(), branches, spec["branch_timeout"], page_urls=dedupe.page_urls):
+            if dedupe.check(job)[1] is None:
+                yield job
+        return
+    async for job in get_async_client().iter_jobs(**branches[0], dedupe=dedupe):
+        yield job
+
+
+async def aiter_search_or_degrade(spec, status):
+    """Async api.iter_search_or_degrade"""
+    dedupe = Deduplicator()
+    try:
+        async for job in aiter_search(spec, dedupe):
+            yield job
+    except UpstreamUnavailable as e:
+        status["degraded"] = str(e)
+        if spec["source"] == "local" or local_index() is None:
+            return
+        for job in dedupe.filter(await asyncio.to_thread(search_local, spec)):
+            yield job
+    finally:
+        if dedupe.duplicates:
+            status["duplicates"] = dedupe.duplicates
+
+
+async def send_stream(send, spec, fmt, status):
+    """Async api.stream_search: one chunk per job, then the summary record; returns the count"""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", STREAM_MIMETYPES[fmt].encode()), (b"cache-control", b"no-cache")],
+    })
+    start = time.perf_counter()
+    first = None
+    count = 0
+    try:
+        async for job in aiter_search_or_degrade(spec, status):
+            if not filter_jobs_by_platform([job], spec["platforms"], spec["select_all"]):
+                continue
+            if first is None:
+                first = time.perf_counter()
+            count += 1
+            await send({"type": "http.response.body", "body": encode_record(project_job(job, spec["fields"]), fmt).encode("utf-8"), "more_body": True})
+    except Exception as e:
+        metrics.mark_upstream_error()
+        await send({"type": "http.response.body", "body": encode_record({"error": str(e)}, fmt, "error").encode("utf-8"), "more_body": True})
+
+    summary = {
+        "count": count,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        "first_result_ms": round((first - start) * 1000, 1) if first is not None else None,
+        **status,
+    }
+    await send({"type": "http.response.body", "body": encode_record({"summary": summary}, fmt, "summary").encode("utf-8")})
+    return count
+
+
+def header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def search_jobs(scope, receive, send):
+    trace = metrics.start_trace("/api/jobs/search")
+    with metrics.activate(trace):
+        outcome = await run_search_request(scope, receive, send, trace)
+    if trace is not None:
+        trace.finish(outcome)
+
+
+async def run_search_request(scope, receive, send, trace):
+    """Async api.run_search_request; sends the response and returns the metrics outcome"""
+    try:
+        with metrics.stage("parse_body"):
+            data = fastjson.loads(await read_body(receive) or b"null")
+
+        if isinstance(data, dict) and data.get("cursor") is not None:
+            body, status_code = await asyncio.to_thread(cursor_response, data)
+            await send_json(send, body, status_code, header(scope, b"accept-encoding"))
+            return "ok" if status_code == 200 else "bad_request"
+
+        # Polled at GET /api/jobs/search/<id>, which the Flask app serves
+        if isinstance(data, dict) and data.get("async"):
+            tenant = request_tenant((scope.get("client") or (None,))[0], header(scope, b"x-tenant"))
+            body, status_code = await asyncio.to_thread(enqueue_search, data, tenant)
+            location = [(b"location", body["poll"].encode())] if status_code == 202 else []
+            await send_json(send, body, status_code, extra_headers=location)
+            return "ok" if status_code == 202 else "bad_request"
+
+        try:
+            spec = parse_search_request(data)
+        except ValueError as e:
+            await send_json(send, {"error": str(e)}, 400)
+            return "bad_request"
+        set_metrics_country(spec["search"]["country"])
+
+        status = {}
+        fmt = stream_format(data, header(scope, b"accept"))
+        if fmt:
+            count = await send_stream(send, spec, fmt, status)
+            return metrics.outcome_for(trace, count, "degraded" in status)
+
+        # The event loop keeps serving other requests while this one waits on upstream
+        jobs = [job async for job in aiter_search_or_degrade(spec, status)]
+
+        # Filter jobs based on selected platforms and filters, ranking them for sort "relevance"
+        with metrics.stage("filter"):
+            filtered_jobs = await asyncio.to_thread(apply_filters, jobs, spec)
+
+        with metrics.stage("sort"):
+            body = await asyncio.to_thread(finish_search, filtered_jobs, spec, status)
+
+        with metrics.stage("serialize"):
+            await send_json(send, body, accept_encoding=header(scope, b"accept-encoding"))
+        return metrics.outcome_for(trace, filtered_jobs, "degraded" in status)
+
+    except Exception as e:
+        await send_json(send, {"error": str(e)}, 500)
+        return "error"
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_async_client()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/api/jobs/search":
+        return await search_jobs(scope, receive, send)
+    await wsgi_app(scope, receive, send)
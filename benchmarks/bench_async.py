@@ -0,0 +1,92 @@
+"""Throughput of the sync Flask search view versus the async ASGI one
+
+Both endpoints are driven in-process against the local stub upstream with
+an artificial upstream latency. Every request uses distinct keywords so the
+cache and request coalescing stay out of the picture.
+
+Run from the repo root:  python -m benchmarks.bench_async [requests] [sync_workers] [latency_s]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_upstream import start_stub
+
+
+def payload(i):
+    return {"keywords": f"engineer {i}", "location": "New York", "count": 10}
+
+
+def run_sync(flask_app, requests_total, workers):
+    client = flask_app.test_client()
+
+    def call(i):
+        return client.post("/api/jobs/search", json=payload(i)).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        statuses = list(pool.map(call, range(requests_total)))
+    return time.perf_counter() - start, statuses
+
+
+async def call_asgi(asgi_app, i):
+    body = json.dumps(payload(i)).encode("utf-8")
+    scope = {"type": "http", "method": "POST", "path": "/api/jobs/search", "headers": []}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    return sent[0]["status"]
+
+
+async def run_async(asgi_app, requests_total):
+    from utils.async_scrapingdog import close_async_client
+
+    start = time.perf_counter()
+    statuses = await asyncio.gather(*(call_asgi(asgi_app, i) for i in range(requests_total)))
+    elapsed = time.perf_counter() - start
+    await close_async_client()
+    return elapsed, statuses
+
+
+def main(requests_total=400, workers=8, latency=0.2):
+    server, url = start_stub(latency=latency)
+    os.environ.update({
+        "SCRAPINGDOG_URL": url,
+        "SCRAPINGDOG_API_KEY": "bench",
+        "SEARCH_CACHE_BACKEND": "none",
+        "JOB_INDEX_PATH": "",
+        # Lift the upstream governor, so this measures the servers and not its throttle
+        "UPSTREAM_RATE": "1000000",
+        "UPSTREAM_BURST": "1000000",
+        "UPSTREAM_MAX_IN_FLIGHT": "100000",
+        "UPSTREAM_GOVERNOR_PATH": "",
+    })
+
+    from api import app as flask_app
+    from asgi import app as asgi_app
+
+    sync_elapsed, sync_statuses = run_sync(flask_app, requests_total, workers)
+    async_elapsed, async_statuses = asyncio.run(run_async(asgi_app, requests_total))
+
+    print(f"{requests_total} searches, upstream latency {latency * 1000:.0f} ms")
+    print(f"sync  ({workers} worker threads): {requests_total / sync_elapsed:8.1f} req/s  ({sync_statuses.count(200)} ok)")
+    print(f"async (one event loop):      {requests_total / async_elapsed:8.1f} req/s  ({async_statuses.count(200)} ok)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        int(args[0]) if len(args) > 0 else 400,
+        int(args[1]) if len(args) > 1 else 8,
+        float(args[2]) if len(args) > 2 else 0.2,
+    )
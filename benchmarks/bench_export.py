@@ -0,0 +1,74 @@
+"""Rows/sec and peak RSS exporting 1M jobs as CSV, JSONL and Parquet
+
+Jobs come from a generator (bench_wire's realistic jobs, cycled with a
+varied title), so the source holds no more than the writers do. Output
+goes to a sink that only counts bytes, as a socket would take it. Each
+run is a fresh subprocess, so its peak RSS is its own; "idle" is a
+process that only imports the same modules.
+
+The old export, a DataFrame of every job written with to_csv, is run
+on BASELINE_ROWS jobs only: its memory grows with the row count and 1M
+rows of full descriptions don't fit in a few GB.
+
+Run from the repo root:  python -m benchmarks.bench_export [rows]
+"""
+import json
+import resource
+import subprocess
+import sys
+import time
+from itertools import islice
+
+BASELINE_ROWS = 100_000
+POOL = 1000
+
+
+def iter_jobs(rows):
+    from benchmarks.bench_wire import make_jobs
+
+    pool = make_jobs(POOL)
+    for i in range(rows):
+        job = dict(pool[i % POOL])
+        job["title"] = f"{job['title']} ({i})"
+        yield job
+
+
+def run_one(mode, rows):
+    """Export in this process; returns rows, seconds, output bytes and peak RSS (MB)"""
+    import pandas as pd
+    from utils.export import export_chunks
+
+    jobs = iter_jobs(rows)
+    if mode == "idle":
+        next(islice(jobs, 1, None), None)
+        written, seconds = 0, 0.0
+    elif mode == "pandas_to_csv":
+        start = time.perf_counter()
+        df = pd.DataFrame(list(jobs))
+        written = len(df.to_csv(index=False).encode("utf-8"))
+        seconds = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        written = sum(len(chunk) for chunk in export_chunks(jobs, mode))
+        seconds = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"mode": mode, "rows": rows, "seconds": seconds, "bytes": written, "peak_mb": peak_mb}
+
+
+def main(rows=1_000_000):
+    runs = [("idle", rows), ("csv", rows), ("jsonl", rows), ("parquet", rows), ("pandas_to_csv", min(rows, BASELINE_ROWS))]
+    print(f"{'export':<15} {'rows':>10} {'rows/s':>10} {'output MB':>10} {'peak RSS MB':>12}")
+    for mode, count in runs:
+        result = json.loads(subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_export", "--one", mode, str(count)],
+            check=True, capture_output=True, text=True,
+        ).stdout)
+        rate = f"{result['rows'] / result['seconds']:,.0f}" if result["seconds"] else "-"
+        print(f"{mode:<15} {result['rows']:>10,} {rate:>10} {result['bytes'] / 1e6:>10.1f} {result['peak_mb']:>12.0f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--one":
+        print(json.dumps(run_one(sys.argv[2], int(sys.argv[3]))))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
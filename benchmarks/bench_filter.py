@@ -0,0 +1,102 @@
+"""Post-filtering and ranking time for merged result batches of 1k to 20k jobs
+
+Compares, per batch size:
+  - the old platform filter (nested any() with .lower() per job x platform)
+  - the same filters and BM25 ranking written as per-row Python loops
+  - JobFrame: NumPy masks for posted-within, platform, location and
+    description keywords, then BM25 over the kept rows (frame build included)
+
+Run from the repo root:  python -m benchmarks.bench_filter [rounds]
+"""
+import math
+import re
+import statistics
+import sys
+import time
+
+from benchmarks.bench_wire import make_jobs
+from utils.job_frame import BM25_B, BM25_K1, TITLE_WEIGHT, JobFrame, terms
+
+SIZES = (1000, 5000, 20000)
+PLATFORMS = ["LinkedIn", "Indeed", "Glassdoor"]
+FILTERS = {"description": "python", "location": "new york", "posted_within_days": 10}
+KEYWORDS = "python data engineer"
+
+
+def legacy_platform_filter(jobs, platforms):
+    """filter_jobs_by_platform as it was"""
+    return [job for job in jobs if any(platform.lower() in job['platform'].lower() for platform in platforms)]
+
+
+def python_bm25(docs, words):
+    tokenized = [re.findall(r"\w+", doc.lower()) for doc in docs]
+    n = len(tokenized)
+    # Lengths in characters, as JobFrame measures them
+    avgdl = max(sum(map(len, docs)) / max(n, 1), 1.0)
+    idf = {}
+    for word in words:
+        df = sum(1 for doc in tokenized if word in doc)
+        idf[word] = math.log1p((n - df + 0.5) / (df + 0.5))
+    scores = []
+    for text, doc in zip(docs, tokenized):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(text) / avgdl)
+        score = 0.0
+        for word in words:
+            tf = doc.count(word)
+            score += idf[word] * tf * (BM25_K1 + 1) / (tf + norm)
+        scores.append(score)
+    return scores
+
+
+def python_filter_rank(jobs, now):
+    """The JobFrame pipeline as per-row Python loops"""
+    wanted = [platform.lower() for platform in PLATFORMS]
+    words = terms(FILTERS["description"])
+    since = now - FILTERS["posted_within_days"] * 86400
+    kept = [
+        job for job in jobs
+        if any(platform in (job["platform"] or "").lower() for platform in wanted)
+        and all(word in (job["description"] or "").lower() for word in words)
+        and FILTERS["location"] in (job["location"] or "").lower()
+        and job["posted_ts"] is not None and job["posted_ts"] >= since
+    ]
+    keywords = terms(KEYWORDS)
+    description = python_bm25([job["description"] or "" for job in kept], keywords)
+    title = python_bm25([job["title"] or "" for job in kept], keywords)
+    order = sorted(range(len(kept)), key=lambda i: -(description[i] + TITLE_WEIGHT * title[i]))
+    return [kept[i] for i in order]
+
+
+def frame_filter_rank(jobs):
+    frame = JobFrame(jobs)
+    return frame.rank(KEYWORDS, frame.mask(platforms=PLATFORMS, **FILTERS))
+
+
+def best_ms(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(rounds=5):
+    jobs = make_jobs(max(SIZES))
+    now = time.time()
+    for size in SIZES:
+        batch = jobs[:size]
+        # Same jobs kept, in the same order, both ways
+        assert [id(job) for job in python_filter_rank(batch, now)] == [id(job) for job in frame_filter_rank(batch)]
+
+        legacy = best_ms(lambda: legacy_platform_filter(batch, PLATFORMS), rounds)
+        frame_platform = best_ms(lambda: JobFrame(batch).contains_any("platform", PLATFORMS), rounds)
+        python = best_ms(lambda: python_filter_rank(batch, now), rounds)
+        frame = best_ms(lambda: frame_filter_rank(batch), rounds)
+        print(f"{size:>6,} jobs")
+        print(f"  platform filter     list comprehension {legacy:8.2f} ms   JobFrame {frame_platform:8.2f} ms")
+        print(f"  filters + BM25 rank Python loops       {python:8.2f} ms   JobFrame {frame:8.2f} ms  ({python / frame:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,111 @@
+"""Fingerprinting and near-duplicate collapsing over a stream of 100,000 jobs
+
+Builds a synthetic stream where a share of the jobs are reposts of earlier
+ones: the same posting under another `via`, with "Sr." for "Senior", a
+"- Remote" suffix, an "Inc." on the company or tracking params on the apply
+URL. Reports the time per job of dedupe_key, job_fingerprint and the
+streaming Deduplicator, how many planted reposts it caught and how many
+distinct postings it wrongly merged.
+
+Run from the repo root:  python -m benchmarks.bench_fingerprint [jobs]
+"""
+import random
+import sys
+import time
+
+from utils.fingerprint import Deduplicator, dedupe_key, job_fingerprint
+
+ROLES = [
+    "Data Scientist", "Data Engineer", "Data Analyst", "Machine Learning Engineer", "Software Engineer",
+    "Backend Developer", "Frontend Developer", "Product Manager", "DevOps Engineer", "QA Engineer",
+    "Business Analyst", "Solutions Architect", "Site Reliability Engineer", "Security Engineer",
+]
+LEVELS = ["Senior", "Junior", "Lead", "Staff", "Principal", ""]
+CITIES = ["New York, NY", "Austin, TX", "Seattle, WA", "Chicago, IL", "Denver, CO", "Boston, MA", "Remote"]
+PLATFORMS = ["LinkedIn", "Indeed", "Glassdoor", "ZipRecruiter", "Monster", "Company website"]
+TEAMS = [f"{area} {unit}" for area in (
+    "Payments", "Search", "Growth", "Platform", "Risk", "Ads", "Cloud", "Mobile", "Identity", "Analytics",
+    "Billing", "Maps", "Health", "Retail", "Logistics", "Trust", "Infrastructure", "Media", "Fraud", "Pricing",
+) for unit in ("Team", "Group", "Org", "Squad", "Lab")]
+
+
+def make_posting(rng, i):
+    level = rng.choice(LEVELS)
+    title = f"{level} {rng.choice(ROLES)}, {rng.choice(TEAMS)}".strip()
+    company = f"Company {i % 20000}"
+    return {
+        "posting": i,
+        "title": title,
+        "company": company,
+        "location": rng.choice(CITIES),
+        "apply_url": f"https://jobs.example.com/{i}/apply",
+        "platform": rng.choice(PLATFORMS),
+    }
+
+
+def repost(rng, job):
+    job = dict(job, platform=rng.choice(PLATFORMS))
+    variant = rng.randrange(4)
+    if variant == 0:
+        job["title"] = job["title"].replace("Senior", "Sr.") + " - Remote"
+    elif variant == 1:
+        job["company"] += ", Inc."
+        job["apply_url"] = f"https://board.example.net/view/{rng.randrange(10 ** 9)}"
+    elif variant == 2:
+        job["apply_url"] += f"?utm_source={job['platform'].lower()}&utm_medium=jobs&gclid={rng.randrange(10 ** 9)}"
+        job["title"] = f"{job['title']} ({rng.choice(['Urgent', 'Hiring now'])})"
+    else:
+        job["location"] += ", United States"
+    return job
+
+
+def make_stream(count, repost_share=0.3, seed=7):
+    """(jobs, number of planted reposts); a job's "posting" is the index of its original"""
+    rng = random.Random(seed)
+    jobs = []
+    reposts = 0
+    for i in range(count):
+        if jobs and rng.random() < repost_share:
+            jobs.append(repost(rng, rng.choice(jobs)))
+            reposts += 1
+        else:
+            jobs.append(make_posting(rng, i))
+    return jobs, reposts
+
+
+def per_job_us(fn, jobs):
+    start = time.perf_counter()
+    fn(jobs)
+    return (time.perf_counter() - start) * 1e6 / len(jobs)
+
+
+def main(count=100000):
+    jobs, reposts = make_stream(count)
+    print(f"{count:,} jobs, {reposts:,} planted reposts")
+
+    for name, fn in [
+        ("dedupe_key", lambda jobs: [dedupe_key(job) for job in jobs]),
+        ("job_fingerprint", lambda jobs: [job_fingerprint(job) for job in jobs]),
+    ]:
+        print(f"{name:<18} {per_job_us(fn, jobs):6.2f} us/job")
+
+    dedupe = Deduplicator()
+    start = time.perf_counter()
+    verdicts = [dedupe.check(job) for job in jobs]
+    elapsed = time.perf_counter() - start
+    print(f"{'Deduplicator':<18} {elapsed * 1e6 / count:6.2f} us/job   ({count / elapsed:,.0f} jobs/s)")
+
+    posting_of = {}
+    caught = wrong = 0
+    for job, (job_id, duplicate_of) in zip(jobs, verdicts):
+        if duplicate_of is None:
+            posting_of[job_id] = job["posting"]
+        elif posting_of[duplicate_of] == job["posting"]:
+            caught += 1
+        else:
+            wrong += 1
+    print(f"caught {caught:,} of {reposts:,} reposts ({caught / max(reposts, 1):.1%}), {wrong:,} distinct postings merged")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,52 @@
+"""Per-request cost of stage timing: the search view with metrics on versus off
+
+Run from the repo root:  python -m benchmarks.bench_metrics [requests]
+"""
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.stub_upstream import start_stub
+
+
+def timed(client, metrics, requests_total):
+    """Alternate metrics on and off per request so drift hits both equally"""
+    samples = {True: [], False: []}
+    for i in range(requests_total * 2):
+        enabled = i % 2 == 0
+        metrics.set_enabled(enabled)
+        payload = {"keywords": f"engineer {i}", "location": "New York", "count": 10}
+        start = time.perf_counter()
+        client.post("/api/jobs/search", json=payload)
+        samples[enabled].append((time.perf_counter() - start) * 1000)
+    return samples[True], samples[False]
+
+
+def main(requests_total=1000):
+    server, url = start_stub()
+    os.environ.update({
+        "SCRAPINGDOG_URL": url,
+        "SCRAPINGDOG_API_KEY": "bench",
+        "SEARCH_CACHE_BACKEND": "none",
+        "JOB_INDEX_PATH": "",
+        "UPSTREAM_RATE": "1000000",
+        "UPSTREAM_BURST": "1000000",
+    })
+
+    from api import app
+    from utils import metrics
+
+    client = app.test_client()
+    timed(client, metrics, 50)  # warm up the connection pool
+    on, off = timed(client, metrics, requests_total)
+
+    print(f"{requests_total} searches against {url}")
+    print(f"metrics off  mean {statistics.mean(off):7.3f} ms   p50 {statistics.median(off):7.3f} ms")
+    print(f"metrics on   mean {statistics.mean(on):7.3f} ms   p50 {statistics.median(on):7.3f} ms")
+    print(f"overhead per request: {(statistics.median(on) - statistics.median(off)) * 1000:.1f} us (p50)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,107 @@
+"""Decode + parse + serialize time per 1,000 jobs on the fixture payloads
+
+Compares the old per-job dict-walking loop with stdlib json against the
+schema-driven parser with fastjson (orjson when installed), with and
+without field projection.
+
+Run from the repo root:  python -m benchmarks.bench_parser [rounds]
+"""
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from utils import fastjson
+from utils.job_parser import parse_jobs
+
+FIXTURES = Path(__file__).parent / "fixtures"
+PROJECTION = ["title", "company", "location", "apply_url", "date_posted", "platform"]
+
+
+def legacy_parse_jobs(data):
+    """The extraction loop as it was in ScrapingDog.search_jobs"""
+    jobs = []
+    for job in data["jobs_results"]:
+        title = job.get("title", "Unknown Title")
+        company = job.get("company_name", "Unknown Company")
+        location_name = job.get("location", "Unknown Location")
+        description = job.get("description") or job.get("snippet", "No available description")
+        job_type = "Not Specified"
+        if "detected_extensions" in job:
+            ext = job["detected_extensions"]
+            job_type = ext.get("schedule_type") or ext.get("employment_type", job_type)
+        apply_url = None
+        if "apply_link" in job and "link" in job["apply_link"]:
+            apply_url = job["apply_link"]["link"]
+        elif "apply_options" in job and job["apply_options"]:
+            apply_url = job["apply_options"][0].get("link")
+        elif "job_id" in job and "related_links" in data:
+            for link in data.get("related_links", []):
+                if "apply" in link.get("text", "").lower():
+                    apply_url = link.get("link")
+                    break
+        if not apply_url and "job_id" in job:
+            apply_url = f"https://www.google.com/search?q={job['job_id']}"
+        date_posted = "Recent"
+        if "detected_extensions" in job and "posted_at" in job["detected_extensions"]:
+            date_posted = job["detected_extensions"]["posted_at"]
+        jobs.append({
+            "title": title,
+            "company": company,
+            "location": location_name,
+            "description": description,
+            "url": apply_url,
+            "apply_url": apply_url,
+            "date_posted": date_posted,
+            "platform": job.get("via", "unknown"),
+            "job_type": job_type,
+            "is_real_job": True,
+        })
+    return jobs
+
+
+def legacy(payloads):
+    jobs = []
+    for payload in payloads:
+        jobs.extend(legacy_parse_jobs(json.loads(payload)))
+    return json.dumps({"count": len(jobs), "results": jobs}, sort_keys=True), len(jobs)
+
+
+def schema(payloads, fields=None):
+    jobs = []
+    for payload in payloads:
+        jobs.extend(parse_jobs(fastjson.loads(payload), fields))
+    return fastjson.dumps({"count": len(jobs), "results": jobs}, sort_keys=True), len(jobs)
+
+
+def per_thousand(fn, payloads, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        _, count = fn(payloads)
+        samples.append((time.perf_counter() - start) * 1000 * 1000 / count)
+    return statistics.median(samples)
+
+
+def main(rounds=50):
+    pages = [path.read_bytes() for path in sorted(FIXTURES.glob("*.json"))]
+    # Enough pages for ~1,000 jobs per round
+    jobs_per_round = sum(len(json.loads(page)["jobs_results"]) for page in pages)
+    payloads = pages * max(1, 1000 // jobs_per_round)
+
+    parsed = [{name: value for name, value in job.items() if name != "posted_ts"} for job in parse_jobs(fastjson.loads(pages[0]))]
+    assert legacy_parse_jobs(json.loads(pages[0])) == parsed
+
+    print(f"{len(payloads)} pages per round, {rounds} rounds, orjson {'on' if fastjson.orjson else 'off'}")
+    results = [
+        ("dict loop + json", per_thousand(legacy, payloads, rounds)),
+        ("schema parser", per_thousand(schema, payloads, rounds)),
+        ("schema + projection", per_thousand(lambda p: schema(p, PROJECTION), payloads, rounds)),
+    ]
+    for name, ms in results:
+        print(f"{name:<22} {ms:7.3f} ms per 1,000 jobs   ({results[0][1] / ms:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,69 @@
+"""Search latency over several providers when one of them is slow or failing
+
+Each scenario runs ROUNDS searches through an Orchestrator of
+FakeProviders: two that answer in FAST seconds, plus a third that is
+healthy, slow (SLOW seconds, past the provider timeout) or failing.
+"sequential" is the same providers asked one after another, waiting
+for each, as a single-provider client looping over them would.
+
+Run from the repo root:  python -m benchmarks.bench_providers [rounds]
+"""
+import statistics
+import sys
+import time
+
+from utils.errors import UpstreamUnavailable
+from utils.providers import FakeProvider, Orchestrator
+
+FAST = 0.05
+SLOW = 2.0
+TIMEOUT = 0.5
+FAILOVER_AFTER = 0.2
+SEARCH = {"keywords": "python developer", "location": "New York", "count": 20}
+
+
+def providers(third):
+    third = {
+        "healthy": FakeProvider("c", delay=FAST, seed=2),
+        "slow": FakeProvider("c", delay=SLOW, seed=2),
+        "failing": FakeProvider("c", fail=True, seed=2),
+    }[third]
+    # The odd provider first, so failover has to get past it
+    return [third, FakeProvider("a", delay=FAST), FakeProvider("b", delay=FAST, seed=1)]
+
+
+def sequential(members):
+    jobs = []
+    for provider in members:
+        try:
+            jobs.extend(provider.iter_jobs(**SEARCH))
+        except UpstreamUnavailable:
+            pass
+    return jobs
+
+
+def run(search, rounds):
+    """Median and worst seconds, and jobs found, over `rounds` searches"""
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        found = len(search())
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), max(times), found
+
+
+def main(rounds=10):
+    print(f"{'third provider':<16} {'strategy':<12} {'median ms':>10} {'worst ms':>10} {'jobs':>6}")
+    for third in ("healthy", "slow", "failing"):
+        members = providers(third)
+        strategies = {"sequential": lambda: sequential(members)}
+        for mode in ("merge", "failover"):
+            orchestrator = Orchestrator(members, mode=mode, timeout=TIMEOUT, failover_after=FAILOVER_AFTER)
+            strategies[mode] = lambda orchestrator=orchestrator: list(orchestrator.iter_jobs(**SEARCH))
+        for name, search in strategies.items():
+            median, worst, found = run(search, rounds)
+            print(f"{third:<16} {name:<12} {median * 1000:>10.0f} {worst * 1000:>10.0f} {found:>6}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,48 @@
+"""Per-call latency of a bare requests.get versus the pooled keep-alive session
+
+Run from the repo root:  python -m benchmarks.bench_session [calls]
+"""
+import statistics
+import sys
+import time
+
+import requests
+
+from benchmarks.stub_upstream import start_stub
+from utils.scrapingdog_api import ScrapingDog, create_session
+
+
+def timed(fn, calls):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<22} mean {statistics.mean(samples):7.3f} ms   p50 {statistics.median(samples):7.3f} ms   p95 {p95:7.3f} ms")
+
+
+def main(calls=500):
+    server, url = start_stub()
+
+    # Baseline: the module-level requests.get, a new connection for every call
+    bare_client = ScrapingDog(api_key="bench", session=requests, url=url)
+    bare = timed(lambda: bare_client.search_jobs("data scientist", "new york", count=10), calls)
+
+    client = ScrapingDog(api_key="bench", session=create_session(), url=url)
+    pooled = timed(lambda: client.search_jobs("data scientist", "new york", count=10), calls)
+
+    print(f"{calls} calls against {url}")
+    report("requests.get", bare)
+    report("pooled session", pooled)
+    print(f"saved per call: {statistics.mean(bare) - statistics.mean(pooled):.3f} ms (plain TCP; TLS handshakes widen the gap)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
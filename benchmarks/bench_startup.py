@@ -0,0 +1,85 @@
+"""Cold start of an API worker: import time and time to the first responses
+
+Each run is a fresh interpreter, like a newly scaled-up worker. Also prints
+the slowest imports from `python -X importtime -c "import api"`.
+
+Run from the repo root:  python -m benchmarks.bench_startup [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.stub_upstream import start_stub
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import api
+imported = time.perf_counter()
+client = api.app.test_client()
+client.get("/api/jobs/countries")
+static = time.perf_counter()
+client.post("/api/jobs/search", json={"keywords": "data scientist", "location": "New York"})
+searched = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_static_ms": (static - imported) * 1000,
+    "first_search_ms": (searched - static) * 1000,
+}))
+"""
+
+
+def child_env(url):
+    return dict(
+        os.environ,
+        SCRAPINGDOG_URL=url,
+        SCRAPINGDOG_API_KEY="bench",
+        SEARCH_CACHE_BACKEND="none",
+        JOB_INDEX_PATH="",
+        SEARCH_REFRESH_TOP_N="0",
+    )
+
+
+def slowest_imports(env, top=10):
+    """(cumulative ms, module) for the top-level imports under `import api`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api"], env=env, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Direct imports of api (and api itself) are indented by at most two spaces
+        if cumulative.strip().isdigit() and len(name) - len(name.lstrip()) <= 3:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(runs=5):
+    server, url = start_stub()
+    env = child_env(url)
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        sample["process_ms"] = (time.perf_counter() - start) * 1000
+        samples.append(sample)
+
+    print(f"{runs} cold starts (median)")
+    for name in ("import_ms", "first_static_ms", "first_search_ms", "process_ms"):
+        print(f"  {name:<18} {statistics.median(sample[name] for sample in samples):8.1f} ms")
+
+    print("slowest imports under `import api` (cumulative):")
+    for ms, name in slowest_imports(env):
+        print(f"  {ms:8.1f} ms  {name}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
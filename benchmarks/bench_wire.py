@@ -0,0 +1,104 @@
+"""Bytes on the wire for a 50-job search response in each format and encoding
+
+The jobs are the fixture page's, repeated with a varied, realistic-length
+description each (real ones run to a few KB): boilerplate sentences mixed
+with free text drawn from a few thousand words, so the descriptions
+compress about as well as real English rather than as repeats. Prints
+body size and encode time for the default JSON, `"format": "compact"` and
+a `fields` projection, each uncompressed, gzip and (when the brotli
+package is installed) brotli.
+
+Run from the repo root:  python -m benchmarks.bench_wire [jobs]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+from api import search_response
+from utils import compression, fastjson
+from utils.job_parser import expand_jobs, parse_jobs, project_jobs
+
+FIXTURE = Path(__file__).parent / "fixtures" / "google_jobs_page.json"
+PROJECTION = ["title", "company", "location", "apply_url", "date_posted", "platform"]
+
+SENTENCES = [
+    "You will design, build and operate {thing} used by {n} customers.",
+    "We are looking for someone with {n}+ years of experience in {skill}.",
+    "Experience with {skill} and {skill2} is a strong plus.",
+    "You will partner with product, design and {team} to ship {thing}.",
+    "Our {team} team owns {thing} end to end, from ingestion to reporting.",
+    "We offer competitive salary, equity, {perk} and {perk2}.",
+    "Strong written and verbal communication skills are required.",
+    "You are comfortable working in a fast-paced, ambiguous environment.",
+    "The role reports to the head of {team} and is based in our {city} office.",
+    "Familiarity with {skill} in production is required; {skill2} is nice to have.",
+    "You will mentor junior engineers and review {team} designs.",
+    "We value diversity and are an equal opportunity employer.",
+]
+WORDS = {
+    "thing": ["data pipelines", "ML models", "payment APIs", "search ranking", "internal dashboards", "mobile apps"],
+    "skill": ["Python", "SQL", "Spark", "Kubernetes", "TensorFlow", "Go", "React", "Airflow"],
+    "team": ["analytics", "platform", "growth", "infrastructure", "security", "marketing"],
+    "perk": ["health insurance", "a 401(k) match", "flexible hours", "a learning budget", "parental leave"],
+    "city": ["New York", "Austin", "Seattle", "Chicago", "Denver"],
+}
+
+
+def vocabulary(rng, size=3000):
+    syllables = [a + b for a in "bcdfghklmnprstvw" for b in ("a", "e", "i", "o", "u", "an", "er", "in", "on", "al")]
+    return [
+        "".join(rng.choice(syllables) for _ in range(rng.choice((1, 2, 2, 3, 3, 4))))
+        for _ in range(size)
+    ]
+
+
+def description(rng, vocab):
+    def fill(sentence):
+        values = {key: rng.choice(options) for key, options in WORDS.items()}
+        values.update(skill2=rng.choice(WORDS["skill"]), perk2=rng.choice(WORDS["perk"]), n=rng.randint(2, 900))
+        return sentence.format(**values)
+
+    def free_text():
+        words = rng.choices(vocab, k=rng.randint(8, 20))
+        return " ".join(words).capitalize() + "."
+
+    return " ".join(fill(rng.choice(SENTENCES)) if rng.random() < 0.3 else free_text() for _ in range(rng.randint(15, 30)))
+
+
+def make_jobs(count, seed=3):
+    rng = random.Random(seed)
+    vocab = vocabulary(rng)
+    base = parse_jobs(fastjson.loads(FIXTURE.read_bytes()))
+    return [dict(base[i % len(base)], description=description(rng, vocab)) for i in range(count)]
+
+
+def main(count=50, rounds=20):
+    jobs = make_jobs(count)
+    bodies = [
+        ("json", search_response(jobs)),
+        ("compact", search_response(jobs, response_format="compact")),
+        ("fields", search_response(project_jobs(jobs, PROJECTION))),
+        ("fields + compact", search_response(project_jobs(jobs, PROJECTION), response_format="compact")),
+    ]
+    compact = bodies[1][1]
+    assert expand_jobs(compact, compact["count"]) == jobs
+
+    encodings = [None, "gzip"] + (["br"] if compression.brotli is not None else [])
+    print(f"{count} jobs, brotli {'on' if compression.brotli is not None else 'not installed'}")
+    baseline = None
+    for name, body in bodies:
+        for encoding in encodings:
+            start = time.perf_counter()
+            for _ in range(rounds):
+                payload = fastjson.dumps_bytes(body, sort_keys=True)
+                if encoding is not None:
+                    payload = compression.compress(payload, encoding)
+            ms = (time.perf_counter() - start) * 1000 / rounds
+            baseline = baseline or len(payload)
+            label = f"{name} + {encoding}" if encoding else name
+            print(f"{label:<24} {len(payload):>9,} bytes  {len(payload) / baseline:6.1%}  {ms:6.2f} ms to encode")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,180 @@
+"""Offline ScrapingDog google_jobs server that replays recorded responses
+
+Responses come from a directory of recordings (benchmarks/fixtures by
+default). A request whose params match a recording gets it verbatim;
+anything else gets one of the recordings picked by its query, with
+synthetic next_page_token pagination so multi-page searches work. Latency,
+jitter, 5xx and 429 rates are configurable and drawn from a seeded RNG, so
+runs are reproducible.
+
+Serve recordings:   python -m benchmarks.fake_scrapingdog --latency 0.1 --error-rate 0.02 --rate-429 0.05
+Record new ones:    python -m benchmarks.fake_scrapingdog --record benchmarks/fixtures
+                    (proxies to the real API with SCRAPINGDOG_API_KEY and saves each 200 response)
+
+Then point the API at it with SCRAPINGDOG_URL=http://127.0.0.1:<port>/google_jobs.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+import zlib
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from benchmarks.stub_upstream import StubUpstream, start_stub
+
+FIXTURES = Path(__file__).parent / "fixtures"
+PAGE_TOKEN_PREFIX = "fake-page-"
+
+
+def recording_key(params):
+    """Stable name for a request: its params minus the api_key"""
+    params = {key: value for key, value in params.items() if key != "api_key"}
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def paged_job(job, page):
+    """`job` as a different posting on page `page`: its own title, company, job_id and apply links"""
+    job = dict(
+        job,
+        title=f"{job.get('title')} ({page + 1})",
+        company_name=f"{job.get('company_name')} {page + 1}",
+        job_id=f"{job.get('job_id')}-{page}",
+    )
+    if job.get("apply_link"):
+        job["apply_link"] = dict(job["apply_link"], link=paged_url(job["apply_link"].get("link"), page))
+    if job.get("apply_options"):
+        job["apply_options"] = [dict(option, link=paged_url(option.get("link"), page)) for option in job["apply_options"]]
+    return job
+
+
+def paged_url(url, page):
+    if not url:
+        return url
+    return f"{url}{'&' if '?' in url else '?'}posting={page}"
+
+
+class FakeScrapingDog(StubUpstream):
+    def __init__(self, recordings=FIXTURES, latency=0.0, jitter=0.0, error_rate=0.0, rate_429=0.0, pages=1, seed=0):
+        super().__init__(latency)
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.pages = pages
+        self.random = random.Random(seed)
+        self.recordings = {}
+        self.fallbacks = []
+        for path in sorted(Path(recordings).glob("*.json")):
+            body = path.read_bytes()
+            self.recordings[path.stem] = body
+            self.fallbacks.append(json.loads(body))
+        self._paged = {}
+        self.statuses = {}
+
+    def _paged_body(self, query, page):
+        """A fallback recording as page `page` of `self.pages`"""
+        choice = zlib.crc32(query.encode("utf-8")) % len(self.fallbacks)
+        key = (choice, page)
+        if key not in self._paged:
+            data = dict(self.fallbacks[choice])
+            data.pop("scrapingdog_pagination", None)
+            data.pop("pagination", None)
+            if page:
+                # Distinct postings per page, so deduplication doesn't collapse them
+                data["jobs_results"] = [paged_job(job, page) for job in data["jobs_results"]]
+            if page + 1 < self.pages:
+                data["scrapingdog_pagination"] = {"next_page_token": f"{PAGE_TOKEN_PREFIX}{page + 1}"}
+            self._paged[key] = json.dumps(data).encode("utf-8")
+        return self._paged[key]
+
+    def _count(self, status):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    async def respond(self, target):
+        params = dict(parse_qsl(urlsplit(target).query))
+        draw = self.random.random()
+        delay = self.latency * (1 + self.jitter * (2 * self.random.random() - 1))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if draw < self.rate_429:
+            status, body = 429, b'{"error": "Too many requests"}'
+        elif draw < self.rate_429 + self.error_rate:
+            status, body = 500, b'{"error": "Internal server error"}'
+        elif recording_key(params) in self.recordings:
+            status, body = 200, self.recordings[recording_key(params)]
+        else:
+            token = params.get("next_page_token", "")
+            page = int(token[len(PAGE_TOKEN_PREFIX):]) if token.startswith(PAGE_TOKEN_PREFIX) else 0
+            status, body = 200, self._paged_body(params.get("query", ""), page)
+        self._count(status)
+        return status, body
+
+
+class RecordingUpstream(StubUpstream):
+    """Forward to the real API and save every 200 response under its recording_key"""
+
+    def __init__(self, directory, url, api_key):
+        super().__init__()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.url = url
+        self.api_key = api_key
+
+    def fetch(self, params):
+        url = f"{self.url}?{urlencode({**params, 'api_key': self.api_key})}"
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    async def respond(self, target):
+        params = dict(parse_qsl(urlsplit(target).query))
+        status, body = await asyncio.to_thread(self.fetch, params)
+        if status == 200:
+            path = self.directory / f"{recording_key(params)}.json"
+            path.write_bytes(body)
+            print(f"recorded {params.get('query')!r} -> {path}")
+        return status, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ScrapingDog google_jobs server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recordings", default=str(FIXTURES), help="directory of recorded responses to replay")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency varies by +/- this fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of responses that are 500s")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of responses that are 429s")
+    parser.add_argument("--pages", type=int, default=1, help="pages per query for unrecorded searches")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", metavar="DIR", help="proxy to the real API and save responses into DIR")
+    parser.add_argument("--upstream", default="https://api.scrapingdog.com/google_jobs")
+    args = parser.parse_args()
+
+    if args.record:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        upstream = RecordingUpstream(args.record, args.upstream, os.getenv("SCRAPINGDOG_API_KEY"))
+    else:
+        upstream = FakeScrapingDog(
+            args.recordings, args.latency, args.jitter, args.error_rate, args.rate_429, args.pages, args.seed
+        )
+    server, url = start_stub(port=args.port, upstream=upstream)
+    print(f"Serving on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
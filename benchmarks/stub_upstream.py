@@ -0,0 +1,88 @@
+"""Local stand-in for the ScrapingDog google_jobs endpoint used by the benchmarks
+
+An asyncio HTTP/1.1 server on a background thread, so hundreds of
+concurrent keep-alive connections can sit in the artificial latency without
+a thread each.
+"""
+import asyncio
+import json
+import threading
+
+
+def make_job(i):
+    return {
+        "title": f"Data Scientist {i}",
+        "company_name": f"Company {i % 7}",
+        "location": "New York, NY",
+        "via": ["LinkedIn", "Indeed", "Glassdoor", "Monster", "ZipRecruiter"][i % 5],
+        "description": "Build models and ship them to production. " * 20,
+        "detected_extensions": {"posted_at": f"{i % 10 + 1} days ago", "schedule_type": "Full-time"},
+        "apply_options": [{"title": "Apply", "link": f"https://example.com/jobs/{i}"}],
+        "job_id": f"job-{i}",
+    }
+
+
+def make_page(size=10):
+    return {"jobs_results": [make_job(i) for i in range(size)]}
+
+
+class StubUpstream:
+    def __init__(self, latency=0.0, body=None):
+        self.latency = latency
+        self.body = body if body is not None else json.dumps(make_page()).encode("utf-8")
+        self.requests = 0
+
+    async def respond(self, target):
+        """Return (status, body) for a request target; override for other behaviour"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return 200, self.body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                target = head.split(b" ", 2)[1].decode("latin-1")
+                self.requests += 1
+                status, body = await self.respond(target)
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class StubServer:
+    def __init__(self, upstream, loop, server, thread):
+        self.upstream = upstream
+        self.loop = loop
+        self.server = server
+        self.thread = thread
+
+    async def _close(self):
+        self.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def shutdown(self):
+        asyncio.run_coroutine_threadsafe(self._close(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.loop.close()
+
+
+def start_stub(latency=0.0, port=0, upstream=None):
+    """Start the stub server on a background thread and return (server, url)"""
+    upstream = upstream or StubUpstream(latency)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(upstream.handle, "127.0.0.1", port, backlog=1024))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    port = server.sockets[0].getsockname()[1]
+    return StubServer(upstream, loop, server, thread), f"http://127.0.0.1:{port}/google_jobs"
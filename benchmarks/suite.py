@@ -0,0 +1,181 @@
+"""End-to-end benchmark suite against the offline fake ScrapingDog server
+
+Drives api.py (Flask, in-process, N client threads) and asgi.py (one event
+loop) under concurrency and reports p50/p95/p99 latency, throughput and
+peak RSS for each scenario: cold and warm cache, sync and async, multi-page
+searches, platform fan-out and a faulty upstream. Needs no network or API
+key, and the fake upstream is seeded, so runs are comparable in CI.
+
+Run from the repo root:  python -m benchmarks.suite [--requests 200] [--concurrency 16] [--latency 0.05] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_scrapingdog import FakeScrapingDog
+from benchmarks.stub_upstream import start_stub
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))]
+
+
+def payload(prefix, i, **extra):
+    return {"keywords": f"{prefix} engineer {i}", "location": "New York", "count": 10, **extra}
+
+
+def run_sync(client, payloads, concurrency):
+    def call(body):
+        start = time.perf_counter()
+        response = client.post("/api/jobs/search", json=body)
+        response.get_data()
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(call, payloads))
+    return time.perf_counter() - start, results
+
+
+async def run_async(asgi_app, payloads, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+
+    async def call(body):
+        raw = json.dumps(body).encode("utf-8")
+        scope = {"type": "http", "method": "POST", "path": "/api/jobs/search", "headers": []}
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": raw, "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        async with limit:
+            start = time.perf_counter()
+            await asgi_app(scope, receive, send)
+            return time.perf_counter() - start, sent[0]["status"]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(call(body) for body in payloads))
+    return time.perf_counter() - start, results
+
+
+def summarize(name, elapsed, results, upstream, upstream_before):
+    latencies = [seconds * 1000 for seconds, _ in results]
+    ok = sum(1 for _, status in results if status == 200)
+    return {
+        "scenario": name,
+        "requests": len(results),
+        "ok": ok,
+        "upstream_calls": upstream.requests - upstream_before,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "throughput_rps": round(len(results) / elapsed, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_table(rows):
+    header = f"{'scenario':<24}{'ok':>10}{'upstream':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['scenario']:<24}{row['ok']:>5}/{row['requests']:<4}{row['upstream_calls']:>10}"
+            f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+            f"{row['throughput_rps']:>10.1f}{row['peak_rss_mb'] if row['peak_rss_mb'] is not None else '-':>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end search benchmarks against the fake upstream")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    upstream = FakeScrapingDog(latency=args.latency, jitter=args.jitter, pages=5, seed=args.seed)
+    server, url = start_stub(upstream=upstream)
+    os.environ.update({
+        "SCRAPINGDOG_URL": url,
+        "SCRAPINGDOG_API_KEY": "bench",
+        "SCRAPINGDOG_BACKOFF_FACTOR": "0.05",
+        "SEARCH_CACHE_BACKEND": "memory",
+        "SEARCH_CACHE_MAX_ENTRIES": "100000",
+        "JOB_INDEX_PATH": "",
+        "UPSTREAM_RATE": "1000000",
+        "UPSTREAM_BURST": "1000000",
+        "UPSTREAM_MAX_IN_FLIGHT": "100000",
+        "UPSTREAM_GOVERNOR_PATH": "",
+        "SEARCH_PREFETCH_WORKERS": str(max(8, args.concurrency)),
+    })
+
+    from api import app as flask_app
+    from asgi import app as asgi_app
+    from utils.async_scrapingdog import close_async_client
+
+    client = flask_app.test_client()
+    n, c = args.requests, args.concurrency
+    rows = []
+
+    def sync_scenario(name, payloads):
+        before = upstream.requests
+        elapsed, results = run_sync(client, payloads, c)
+        rows.append(summarize(name, elapsed, results, upstream, before))
+
+    async def async_scenarios():
+        for name, payloads in (
+            ("async cold cache", [payload("async", i) for i in range(n)]),
+            ("async warm cache", [payload("async", i) for i in range(n)]),
+        ):
+            before = upstream.requests
+            elapsed, results = await run_async(asgi_app, payloads, c)
+            rows.append(summarize(name, elapsed, results, upstream, before))
+        await close_async_client()
+
+    sync_scenario("sync cold cache", [payload("sync", i) for i in range(n)])
+    sync_scenario("sync warm cache", [payload("sync", i) for i in range(n)])
+    asyncio.run(async_scenarios())
+    sync_scenario("sync 5 pages", [payload("pages", i, count=50) for i in range(n)])
+    sync_scenario("sync platform fan-out", [payload("fanout", i, fanout=True, select_all=False) for i in range(n)])
+
+    upstream.error_rate, upstream.rate_429 = 0.05, 0.05
+    sync_scenario("sync 5% 500 + 5% 429", [payload("faults", i) for i in range(n)])
+
+    print(f"{n} requests per scenario, concurrency {c}, upstream latency {args.latency * 1000:.0f} ms +/-{args.jitter:.0%}")
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": rows}, f, indent=2)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Standalone worker for the background search queue
+
+Run as many as needed next to the API (which can then use
+SEARCH_QUEUE_WORKERS=0):  python search_worker.py [threads]
+
+Cursors of the searches it runs are stored in its result set store, so
+it needs a SEARCH_CACHE_BACKEND the API reads too (disk or redis).
+"""
+import sys
+
+from api import run_queued_search
+from utils.result_sets import check_shared
+from utils.search_queue import QUEUE_WORKERS, SearchWorkers, get_search_queue
+
+if __name__ == '__main__':
+    try:
+        check_shared()
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(QUEUE_WORKERS, 1)
+    pool = SearchWorkers(get_search_queue(), run_queued_search, workers).start()
+    print(f"Running {workers} search workers on {get_search_queue().path}")
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        pool.stop()
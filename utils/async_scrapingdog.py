@@ -0,0 +1,343 @@
+import asyncio
+import os
+import time
+
+import aiohttp
+
+from utils import fastjson, metrics
+from utils.cache import search_key
+from utils.errors import UpstreamUnavailable
+from utils.fingerprint import Deduplicator
+from utils.job_parser import related_apply_url
+from utils.scrapingdog_api import (
+    CONNECT_TIMEOUT,
+    MAX_PAGES,
+    MAX_RETRIES,
+    READ_TIMEOUT,
+    RETRY_STATUSES,
+    SCRAPINGDOG_URL,
+    SEARCH_DEADLINE,
+    build_params,
+    get_client,
+    get_next_page_token,
+    parse_jobs,
+    retry_delay,
+    select_jobs,
+    upstream_ok,
+)
+from utils.refresher import cached_page
+from utils.singleflight import AsyncSingleFlight
+
+# One event loop can hold many more idle upstream calls than a thread pool
+ASYNC_POOL_SIZE = int(os.getenv("SCRAPINGDOG_ASYNC_POOL_SIZE", "200"))
+
+
+def create_async_http_client(pool_size=ASYNC_POOL_SIZE):
+    """Build a pooled keep-alive aiohttp session; call from inside the event loop"""
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=pool_size),
+        timeout=aiohttp.ClientTimeout(connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+    )
+
+
+_async_client = None
+
+
+def get_async_client():
+    """Return the event loop's AsyncScrapingDog, sharing the sync client's cache, index, governor and breaker"""
+    global _async_client
+    if _async_client is None:
+        client = get_client()
+        _async_client = AsyncScrapingDog(
+            cache=client.cache, index=client.index, governor=client.governor,
+            breaker=client.breaker, hedger=client.hedger,
+        )
+        _async_client.refresher = get_client().refresher
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+class AsyncScrapingDog:
+    def __init__(self, api_key=None, http=None, url=None, cache=None, index=None, governor=None,
+                 max_retries=MAX_RETRIES, breaker=None, hedger=None):
+        self.api_key = api_key or os.getenv("SCRAPINGDOG_API_KEY")
+        if not self.api_key:
+            raise ValueError("SCRAPINGDOG_API_KEY not found in environment variables")
+
+        self.url = url or SCRAPINGDOG_URL
+        self.http = http
+        self.cache = cache
+        self.index = index
+        self.governor = governor
+        self.max_retries = max_retries
+        self.breaker = breaker
+        self.hedger = hedger
+        self.flight = AsyncSingleFlight()
+        self.refresher = None
+
+    async def aclose(self):
+        if self.http is not None:
+            await self.http.close()
+
+    async def search_jobs(
+        self,
+        keywords,
+        location,
+        platform=None,
+        count=5,
+        days_ago=5,
+        country="us",
+        language="en_us",
+        next_page_token=None,
+        chips=None,
+        lrad=None,
+        ltype=None,
+        uds=None
+    ):
+        try:
+            params = build_params(
+                keywords, location, days_ago=days_ago, country=country, language=language,
+                next_page_token=next_page_token, chips=chips, lrad=lrad, ltype=ltype, uds=uds,
+            )
+            page = await self.fetch_page(params)
+            if page is None:
+                return []
+            return select_jobs(page["jobs"], count, platform)
+
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            print(f"ScrapingDog API error: {e}")
+            return []
+
+    async def iter_jobs(
+        self,
+        keywords,
+        location,
+        platform=None,
+        count=5,
+        max_pages=MAX_PAGES,
+        deadline=SEARCH_DEADLINE,
+        days_ago=5,
+        country="us",
+        language="en_us",
+        next_page_token=None,
+        chips=None,
+        lrad=None,
+        ltype=None,
+        uds=None,
+        dedupe=None
+    ):
+        """Async ScrapingDog.iter_jobs: the next page downloads while this one is consumed"""
+        dedupe = dedupe if dedupe is not None else Deduplicator()
+        loop = asyncio.get_running_loop()
+        end = loop.time() + deadline
+
+        def request_page(token):
+            params = build_params(
+                keywords, location, days_ago=days_ago, country=country, language=language,
+                next_page_token=token, chips=chips, lrad=lrad, ltype=ltype, uds=uds,
+            )
+            return asyncio.ensure_future(self.fetch_page(params))
+
+        task = request_page(next_page_token)
+        pages = 1
+        yielded = 0
+        while task is not None:
+            done, _ = await asyncio.wait({task}, timeout=max(end - loop.time(), 0))
+            if not done:
+                if pages == 1:
+                    metrics.mark_upstream_error()
+                print(f"Search deadline of {deadline}s reached after {pages - 1} page(s)")
+                return
+            try:
+                page = task.result()
+            except UpstreamUnavailable:
+                raise
+            except Exception as e:
+                metrics.mark_upstream_error()
+                print(f"ScrapingDog API error: {e}")
+                return
+            if page is None:
+                return
+
+            task = None
+            token = page.get("next_page_token")
+            if token and pages < max_pages and yielded + len(page["jobs"]) < count:
+                task = request_page(token)
+                pages += 1
+
+            dedupe.mark_page_url(page.get("page_url"))
+            for job in select_jobs(page["jobs"], len(page["jobs"]), platform):
+                if dedupe.check(job)[1] is not None:
+                    continue
+                yield job
+                yielded += 1
+                if yielded >= count:
+                    return
+
+            # Platform filtering and reposts can leave us short when the next page wasn't prefetched
+            if task is None and token and pages < max_pages:
+                task = request_page(token)
+                pages += 1
+
+    async def fetch_page(self, params):
+        """Async ScrapingDog.fetch_page: cached, coalesced, parsed the same way"""
+        key = search_key(params)
+        if self.refresher is not None and "next_page_token" not in params:
+            self.refresher.track(params)
+        if self.cache is not None:
+            # Stale entries are refreshed on the sync client's worker threads
+            page = await self._cache_call(cached_page, self.cache, self.refresher, key, params)
+            if page is None and self.breaker is not None and not self.breaker.available():
+                page = await self._cache_call(self.cache.get, key, lambda: True)
+            if page is not None:
+                return page
+
+        return await self.flight.do(key, self._fetch_and_store, key, params)
+
+    async def _fetch_and_store(self, key, params):
+        page = await self._fetch_page(params)
+        if page is not None and self.cache is not None:
+            await self._cache_call(self.cache.set, key, page)
+        if page is not None and self.index is not None:
+            await asyncio.to_thread(self.index_jobs, page["jobs"])
+        return page
+
+    async def _cache_call(self, fn, *args):
+        """Call into the cache, on a worker thread unless its backend is in memory"""
+        if self.cache.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def index_jobs(self, jobs):
+        try:
+            self.index.upsert_many(jobs)
+        except Exception as e:
+            print(f"Job index error: {e}")
+
+    async def _get(self, params):
+        if self.http is None:
+            self.http = create_async_http_client()
+        params = {k: str(v) for k, v in params.items()}
+        params["api_key"] = self.api_key
+        async with self.http.get(self.url, params=params) as response:
+            return response.status, await response.read(), response.headers.get("Retry-After", "")
+
+    async def _call(self, params, lease, probe=False):
+        """Async ScrapingDog._call"""
+        start = time.perf_counter()
+        try:
+            if self.hedger is not None and not probe:
+                result = await self._hedged_send(params, lease)
+            else:
+                result = await self._send(params, lease)
+        except asyncio.CancelledError:
+            # The caller gave up, which says nothing about the upstream
+            if self.breaker is not None:
+                self.breaker.cancel(probe)
+            raise
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record(probe, False, time.perf_counter() - start)
+            raise
+        if self.breaker is not None:
+            self.breaker.record(probe, upstream_ok(result[0]), time.perf_counter() - start)
+        return result
+
+    async def _send(self, params, lease=None):
+        start = time.perf_counter()
+        try:
+            result = await self._get(params)
+        finally:
+            if lease is not None:
+                await self.governor.release_async(lease)
+        if self.hedger is not None and result[0] == 200:
+            self.hedger.observe(time.perf_counter() - start)
+        return result
+
+    async def _hedged_send(self, params, lease):
+        """Async ScrapingDog._hedged_send; the losing call is cancelled"""
+        delay = self.hedger.delay()
+        if delay is None:
+            return await self._send(params, lease)
+        first = asyncio.ensure_future(self._send(params, lease))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        try:
+            hedge_lease = await self.governor.acquire_async(timeout=0) if self.governor is not None else None
+        except UpstreamUnavailable:
+            self.hedger.count(skipped=1)
+            return await first
+        second = asyncio.ensure_future(self._send(params, hedge_lease))
+        self.hedger.count(fired=1)
+
+        result = error = None
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    if result[0] == 200:
+                        if task is second:
+                            self.hedger.count(won=1)
+                        return result
+        finally:
+            for task in pending:
+                task.cancel()
+        if result is None:
+            raise error
+        return result
+
+    async def _fetch_page(self, params):
+        # Same retry policy as the sync client: one governor lease per attempt
+        for attempt in range(self.max_retries + 1):
+            with metrics.stage("queue"):
+                probe = self.breaker.allow() if self.breaker is not None else False
+                try:
+                    lease = await self.governor.acquire_async() if self.governor is not None else None
+                except BaseException:
+                    if self.breaker is not None:
+                        self.breaker.cancel(probe)
+                    raise
+            with metrics.stage("upstream"):
+                status, body, retry_after = await self._call(params, lease, probe)
+
+            metrics.record_upstream_response(status, len(body))
+            if status not in RETRY_STATUSES or attempt == self.max_retries:
+                break
+            await asyncio.sleep(retry_delay(retry_after, attempt))
+
+        if status != 200:
+            metrics.mark_upstream_error()
+            print(f"ScrapingDog API error: HTTP {status}")
+            return None
+
+        with metrics.stage("decode"):
+            data = fastjson.loads(body)
+
+        if "error" in data:
+            metrics.mark_upstream_error()
+            print(f"ScrapingDog API error: {data['error']}")
+            return None
+
+        if "jobs_results" not in data:
+            print("No job results found in response.")
+            return {"jobs": [], "next_page_token": None}
+
+        with metrics.stage("extract"):
+            jobs = parse_jobs(data)
+        return {"jobs": jobs, "next_page_token": get_next_page_token(data), "page_url": related_apply_url(data)}
@@ -0,0 +1,214 @@
+"""Circuit breaker and request hedging around upstream calls
+
+The breaker watches the outcome and latency of recent upstream calls. When
+too many fail or run slow it opens, and searches go straight to cached and
+indexed results instead of queueing behind a struggling upstream. After
+UPSTREAM_BREAKER_OPEN_SECONDS it lets a probe through (half-open); the
+probe's outcome closes or re-opens it.
+
+The hedger fires a duplicate of a call that has taken longer than the
+recent p95 and takes whichever answers first.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+from utils.errors import UpstreamUnavailable
+
+load_dotenv()
+
+UPSTREAM_BREAKER = os.getenv("UPSTREAM_BREAKER", "1") == "1"
+# Calls within this many seconds count towards the rates below
+BREAKER_WINDOW = float(os.getenv("UPSTREAM_BREAKER_WINDOW", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("UPSTREAM_BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("UPSTREAM_BREAKER_ERROR_RATE", "0.5"))
+# A call taking longer than this many seconds is slow
+BREAKER_SLOW_CALL = float(os.getenv("UPSTREAM_BREAKER_SLOW_CALL", "10"))
+BREAKER_SLOW_RATE = float(os.getenv("UPSTREAM_BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("UPSTREAM_BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("UPSTREAM_BREAKER_HALF_OPEN_PROBES", "1"))
+
+# Hedging spends a second call's credits, so it's off unless asked for
+UPSTREAM_HEDGE = os.getenv("UPSTREAM_HEDGE", "0") == "1"
+HEDGE_QUANTILE = float(os.getenv("UPSTREAM_HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_DELAY = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.1"))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_SAMPLES = 200
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """The breaker is open after too many failed or slow upstream calls"""
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a sliding window of call outcomes
+
+    Use it as
+        probe = breaker.allow()              # raises CircuitOpen
+        ... call upstream ...
+        breaker.record(probe, ok, seconds)   # or breaker.cancel(probe) if no call was made
+    """
+
+    def __init__(
+        self,
+        window=BREAKER_WINDOW,
+        min_calls=BREAKER_MIN_CALLS,
+        error_rate=BREAKER_ERROR_RATE,
+        slow_call=BREAKER_SLOW_CALL,
+        slow_rate=BREAKER_SLOW_RATE,
+        open_seconds=BREAKER_OPEN_SECONDS,
+        half_open_probes=BREAKER_HALF_OPEN_PROBES,
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.opened_at = None
+        self.reason = None
+        self.opened = 0
+        self.rejected = 0
+        self.probes = 0
+        self._calls = deque()
+        self._probing = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _open(self, now, reason):
+        self.state = OPEN
+        self.opened_at = now
+        self.reason = reason
+        self.opened += 1
+        self._calls.clear()
+
+    def available(self):
+        """False while open and not yet due for a probe; takes no probe slot"""
+        with self._lock:
+            return self.state != OPEN or time.monotonic() >= self.opened_at + self.open_seconds
+
+    def allow(self):
+        """Admit a call; returns True when it's a half-open probe, raises CircuitOpen otherwise"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() >= self.opened_at + self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return False
+            if self.state == HALF_OPEN and self._probing < self.half_open_probes:
+                self._probing += 1
+                self.probes += 1
+                return True
+            self.rejected += 1
+        raise CircuitOpen(f"Upstream circuit is open ({self.reason})")
+
+    def cancel(self, probe):
+        """Give back an admitted call that never went upstream"""
+        if probe:
+            with self._lock:
+                self._probing -= 1
+
+    def record(self, probe, ok, seconds):
+        now = time.monotonic()
+        slow = seconds >= self.slow_call
+        with self._lock:
+            if probe:
+                self._probing -= 1
+                if ok and not slow:
+                    self.state = CLOSED
+                    self.reason = None
+                    self._calls.clear()
+                elif self.state == HALF_OPEN:
+                    self._open(now, "probe failed" if not ok else "probe slow")
+                return
+            if self.state != CLOSED:
+                return
+
+            self._calls.append((now, not ok, slow))
+            self._prune(now)
+            calls = len(self._calls)
+            if calls < self.min_calls:
+                return
+            errors = sum(1 for _, failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, _, was_slow in self._calls if was_slow)
+            if errors / calls >= self.error_rate:
+                self._open(now, f"{errors}/{calls} calls failed")
+            elif slow_calls / calls >= self.slow_rate:
+                self._open(now, f"{slow_calls}/{calls} calls over {self.slow_call}s")
+
+    def stats(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = len(self._calls)
+            return {
+                "state": self.state,
+                "reason": self.reason,
+                "window_calls": calls,
+                "window_errors": sum(1 for _, failed, _ in self._calls if failed),
+                "window_slow": sum(1 for _, _, slow in self._calls if slow),
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "probes": self.probes,
+            }
+
+
+class Hedger:
+    """Delay before a hedged duplicate call: the recent `quantile` of successful call latency"""
+
+    def __init__(self, quantile=HEDGE_QUANTILE, min_delay=HEDGE_MIN_DELAY, min_samples=HEDGE_MIN_SAMPLES):
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.fired = 0
+        self.won = 0
+        self.skipped = 0
+        self._samples = deque(maxlen=HEDGE_SAMPLES)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def delay(self):
+        """Seconds to wait before hedging, None until enough calls have been seen"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return max(self.min_delay, ordered[min(len(ordered) - 1, math.ceil(self.quantile * len(ordered)) - 1)])
+
+    def count(self, fired=0, won=0, skipped=0):
+        with self._lock:
+            self.fired += fired
+            self.won += won
+            self.skipped += skipped
+
+    def stats(self):
+        delay = self.delay()
+        with self._lock:
+            return {
+                "delay": round(delay, 3) if delay is not None else None,
+                "fired": self.fired,
+                "won": self.won,
+                "skipped_no_slot": self.skipped,
+            }
+
+
+def create_breaker():
+    """The upstream circuit breaker, or None with UPSTREAM_BREAKER=0"""
+    return CircuitBreaker() if UPSTREAM_BREAKER else None
+
+
+def create_hedger():
+    """A hedger when UPSTREAM_HEDGE=1, else None"""
+    return Hedger() if UPSTREAM_HEDGE else None
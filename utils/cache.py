@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from utils import fastjson
+from utils.sqlite_store import LocalConnection
+
+load_dotenv()
+
+# Defaults, overridable from the environment
+CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", "memory")
+CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+# How long past its TTL an entry may still be served while it is refreshed in the background
+CACHE_STALE = float(os.getenv("SEARCH_CACHE_STALE", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "search_cache.sqlite3")
+CACHE_REDIS_URL = os.getenv("SEARCH_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Params whose value is case-insensitive upstream
+CASE_INSENSITIVE_PARAMS = ("query", "country", "language")
+
+
+def search_key(params):
+    """Stable cache key for a set of upstream search params"""
+    normalized = {}
+    for name, value in params.items():
+        if value is None or name == "api_key":
+            continue
+        value = " ".join(str(value).split())
+        if name in CASE_INSENSITIVE_PARAMS:
+            value = value.lower()
+        normalized[name] = value
+    raw = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU store bounded by entry count and total bytes"""
+
+    # Whether calls wait on I/O, so the async client moves them off the event loop
+    blocking = False
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, blob = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return blob
+
+    def set(self, key, blob, ttl):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if len(blob) > self.max_bytes:
+                return
+            self._entries[key] = (time.time() + ttl, blob)
+            self.size += len(blob)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        _, blob = self._entries.pop(key)
+        self.size -= len(blob)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskBackend:
+    """SQLite-backed LRU store shared by every worker process on the host"""
+
+    blocking = True
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._db = LocalConnection(path)
+        conn = self._db.get()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires_at REAL, accessed_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+
+    def get(self, key):
+        conn = self._db.get()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, blob, ttl):
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + ttl, now),
+            )
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            count, total = conn.execute("SELECT COUNT(*), TOTAL(size) FROM entries").fetchone()
+            # Evict least recently used rows until both bounds hold
+            rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall() \
+                if count > self.max_entries or total > self.max_bytes else []
+            for old_key, size in rows:
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                count -= 1
+                total -= size
+
+    def delete(self, key):
+        self._db.get().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        self._db.get().execute("DELETE FROM entries")
+
+    def __len__(self):
+        return self._db.get().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class RedisBackend:
+    """Redis (or any Redis-compatible server) store shared by every worker
+
+    Entry-count and byte bounds are left to the server's maxmemory /
+    allkeys-lru policy. Entries aren't counted either, since that takes a
+    SCAN of the whole keyspace.
+    """
+
+    blocking = True
+
+    def __init__(self, url=CACHE_REDIS_URL, prefix="jobsearch:cache:"):
+        import redis
+
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, blob, ttl):
+        self.client.set(self.prefix + key, blob, px=max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class SearchCache:
+    """TTL cache of parsed search pages with hit/miss counters
+
+    Entries are kept for `stale` seconds past their TTL so get() can still
+    hand them out while they are refreshed.
+    """
+
+    def __init__(self, backend=None, ttl=CACHE_TTL, stale=CACHE_STALE):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.stale = stale
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _load(self, key):
+        """(value, age in seconds) or (None, None)"""
+        try:
+            blob = self.backend.get(key)
+        except Exception as e:
+            print(f"Search cache error: {e}")
+            return None, None
+        if blob is None:
+            return None, None
+        entry = fastjson.loads(blob)
+        if not isinstance(entry, dict) or "fetched_at" not in entry:
+            return None, None
+        return entry["value"], time.time() - entry["fetched_at"]
+
+    def get(self, key, revalidate=None):
+        """The value for `key`, or None
+
+        An expired entry still inside the stale window is returned only if
+        `revalidate()` is given and returns True, e.g. once a background
+        refresh for it has been queued.
+        """
+        value, age = self._load(key)
+        stale = value is not None and age >= self.ttl
+        if stale and not (revalidate is not None and revalidate()):
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            elif stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+        return value
+
+    def age(self, key):
+        """Seconds since `key` was stored, or None if it isn't cached; not counted as a lookup"""
+        return self._load(key)[1]
+
+    def set(self, key, value, ttl=None):
+        blob = fastjson.dumps_bytes({"fetched_at": time.time(), "value": value})
+        try:
+            self.backend.set(key, blob, (self.ttl if ttl is None else ttl) + self.stale)
+        except Exception as e:
+            print(f"Search cache error: {e}")
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, stale_hits, misses = self.hits, self.stale_hits, self.misses
+        total = hits + stale_hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend) if hasattr(self.backend, "__len__") else None,
+            "hits": hits,
+            "stale_hits": stale_hits,
+            "misses": misses,
+            "hit_rate": round((hits + stale_hits) / total, 4) if total else 0.0,
+        }
+
+
+def create_cache(backend=CACHE_BACKEND, ttl=CACHE_TTL, stale=CACHE_STALE):
+    """Build the search cache selected by SEARCH_CACHE_BACKEND (memory, disk, redis or none)"""
+    if backend == "none":
+        return None
+    if backend == "disk":
+        return SearchCache(DiskBackend(), ttl, stale)
+    if backend == "redis":
+        return SearchCache(RedisBackend(), ttl, stale)
+    if backend == "memory":
+        return SearchCache(MemoryBackend(), ttl, stale)
+    raise ValueError(f"Unknown SEARCH_CACHE_BACKEND: {backend}")
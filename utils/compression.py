@@ -0,0 +1,92 @@
+"""Content-Encoding negotiation for API responses: brotli when installed and accepted, else gzip"""
+import gzip
+import os
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+# Bodies smaller than this go out as they are, compressing them isn't worth the CPU
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def accepted_encodings(accept_encoding):
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    """"br", "gzip" or None for the client's Accept-Encoding, brotli first on equal q"""
+    accepted = accepted_encodings(accept_encoding)
+    choices = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = None
+    for coding in choices:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (coding, q)
+    return best[0] if best else None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encode_body(body, accept_encoding, min_bytes=COMPRESS_MIN_BYTES):
+    """(body, encoding or None): `body` compressed when it's big enough and the client accepts it"""
+    if len(body) < min_bytes:
+        return body, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    return compress(body, encoding), encoding
+
+
+def compress_response(response, accept_encoding):
+    """Compress a buffered Flask/Werkzeug response in place when the client accepts it
+
+    Streaming, already-encoded and non-text responses are left alone. A
+    compressed response's ETag becomes weak, since its bytes differ from
+    the identity representation's.
+    """
+    response.vary.add("Accept-Encoding")
+    if (
+        response.is_streamed
+        or response.direct_passthrough
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        or not (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+    ):
+        return response
+    body, encoding = encode_body(response.get_data(), accept_encoding)
+    if encoding is None:
+        return response
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,2 @@
+class UpstreamUnavailable(Exception):
+    """The upstream can't be called right now; callers should fall back to local data"""
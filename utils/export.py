@@ -0,0 +1,150 @@
+"""Streaming CSV, JSONL and Parquet writers for exporting any number of jobs
+
+Each writer takes an iterable of job dicts and yields the encoded file
+in chunks: CSV and JSONL every EXPORT_CHUNK_ROWS rows, Parquet one row
+group of EXPORT_ROW_GROUP_ROWS rows at a time. Only the current chunk is
+held in memory, so memory stays flat however many rows go through.
+Parquet needs pyarrow.
+"""
+import os
+import re
+from itertools import islice
+from dotenv import load_dotenv
+
+from utils import fastjson
+from utils.job_parser import JOB_FIELDS, project_job
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+load_dotenv()
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+EXPORT_ROW_GROUP_ROWS = int(os.getenv("EXPORT_ROW_GROUP_ROWS", "10000"))
+
+# Characters that make csv.writer (QUOTE_MINIMAL) quote a field
+CSV_QUOTED = re.compile(r'[",\r\n]')
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def check_export_format(export_format):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if export_format == "parquet" and pa is None:
+        raise ValueError("Parquet export needs pyarrow installed")
+
+
+def chunks(jobs, size):
+    """Lists of up to `size` jobs"""
+    jobs = iter(jobs)
+    while True:
+        chunk = list(islice(jobs, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def csv_field(value):
+    """A value as csv.writer writes it with QUOTE_MINIMAL"""
+    if value is None:
+        return ""
+    value = value if type(value) is str else str(value)
+    if CSV_QUOTED.search(value) is None:
+        return value
+    return '"' + value.replace('"', '""') + '"'
+
+
+def csv_row(values):
+    # csv.writer quotes a lone empty field so the row isn't blank
+    return (",".join(map(csv_field, values)) or '""') + "\r\n"
+
+
+def csv_chunks(jobs, fields=JOB_FIELDS, chunk_rows=EXPORT_CHUNK_ROWS):
+    """UTF-8 CSV with a header row, byte for byte what csv.writer would write
+
+    Fields are quoted with str methods rather than csv.writer, which goes
+    through every character of the long descriptions one by one and is
+    about 5x slower on them.
+    """
+    yield csv_row(fields).encode("utf-8")
+    for chunk in chunks(jobs, chunk_rows):
+        yield "".join([csv_row([job.get(name) for name in fields]) for job in chunk]).encode("utf-8")
+
+
+def jsonl_chunks(jobs, fields=JOB_FIELDS, chunk_rows=EXPORT_CHUNK_ROWS):
+    """One JSON object per line"""
+    for chunk in chunks(jobs, chunk_rows):
+        yield b"".join(fastjson.dumps_bytes(project_job(job, fields)) + b"\n" for job in chunk)
+
+
+def arrow_type(name):
+    if name == "is_real_job":
+        return pa.bool_()
+    if name == "posted_ts":
+        return pa.float64()
+    return pa.string()
+
+
+class _Drain:
+    """Write-only file object for ParquetWriter; drain() takes what has been written so far"""
+
+    def __init__(self):
+        self.closed = False
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_chunks(jobs, fields=JOB_FIELDS, row_group_rows=EXPORT_ROW_GROUP_ROWS):
+    """A Parquet file, one row group per `row_group_rows` jobs, zstd-compressed"""
+    schema = pa.schema([(name, arrow_type(name)) for name in fields])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for chunk in chunks(jobs, row_group_rows):
+            columns = [pa.array([job.get(name) for job in chunk], type=field.type) for name, field in zip(fields, schema)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema), row_group_size=len(chunk))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+WRITERS = {"csv": csv_chunks, "jsonl": jsonl_chunks, "parquet": parquet_chunks}
+
+
+def export_chunks(jobs, export_format, fields=None):
+    """`jobs` encoded as `export_format`, in chunks; `fields` picks and orders the columns (all by default)"""
+    check_export_format(export_format)
+    return WRITERS[export_format](jobs, tuple(fields or JOB_FIELDS))
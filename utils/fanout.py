@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+
+from utils.errors import UpstreamUnavailable
+from utils.fingerprint import Deduplicator, dedupe_key
+
+FANOUT_WORKERS = int(os.getenv("SEARCH_FANOUT_WORKERS", "8"))
+BRANCH_TIMEOUT = float(os.getenv("SEARCH_BRANCH_TIMEOUT", "10"))
+# Each branch is a separate paid upstream search
+FANOUT_MAX_BRANCHES = int(os.getenv("SEARCH_FANOUT_MAX_BRANCHES", "10"))
+
+
+def check_names(name, values):
+    """Raise ValueError unless `values` is a list of non-empty strings"""
+    if not isinstance(values, list) or not all(isinstance(value, str) and value.strip() for value in values):
+        raise ValueError(f"{name} must be a list of non-empty strings")
+
+
+def check_fanout(platforms, locations):
+    """Raise ValueError when fanning out over `platforms` x `locations` makes more than FANOUT_MAX_BRANCHES branches"""
+    branches = len(platforms or [None]) * len(locations or [None])
+    if branches > FANOUT_MAX_BRANCHES:
+        raise ValueError(f"At most {FANOUT_MAX_BRANCHES} fan-out branches (platforms x locations) per search, got {branches}")
+
+
+def fanout_branches(search_kwargs, platforms=None, locations=None):
+    """Split one iter_jobs search into one branch per platform and/or location"""
+    branches = []
+    for location in locations or [search_kwargs["location"]]:
+        for platform in platforms or [search_kwargs.get("platform")]:
+            branch = dict(search_kwargs, location=location, platform=platform)
+            if platform:
+                # Steer the Google Jobs query towards postings on that board
+                branch["keywords"] = f"{search_kwargs['keywords']} {platform}"
+            branches.append(branch)
+    return branches
+
+
+def merge_jobs(job_lists):
+    """Yield jobs from each list in turn, skipping postings already seen"""
+    seen = set()
+    for jobs in job_lists:
+        for job in jobs:
+            key = dedupe_key(job)
+            if key not in seen:
+                seen.add(key)
+                yield job
+
+
+def iter_fanout(client, branches, branch_timeout=BRANCH_TIMEOUT, max_workers=FANOUT_WORKERS, page_urls=None):
+    """Run the branches concurrently and yield merged, deduplicated jobs
+
+    Each branch is an iter_jobs call bounded by its own `branch_timeout`
+    deadline, so a slow branch returns what it has instead of stalling the
+    rest; a branch that still hasn't returned by then is dropped. Jobs are
+    yielded as each branch completes. UpstreamUnavailable is raised only if
+    no branch succeeded. Branches add the page-level apply links they find
+    to `page_urls` (see Deduplicator).
+    """
+    def run(branch):
+        deadline = min(branch.get("deadline", branch_timeout), branch_timeout)
+        return list(client.iter_jobs(**dict(branch, deadline=deadline, dedupe=Deduplicator(page_urls=page_urls))))
+
+    def results(futures):
+        unavailable = []
+        succeeded = 0
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                try:
+                    yield future.result()
+                    succeeded += 1
+                except UpstreamUnavailable as e:
+                    unavailable.append(e)
+        except FutureTimeout:
+            late = sum(not future.done() for future in futures)
+            print(f"Dropped {late} fan-out branch(es) still running after {timeout}s")
+        if unavailable and not succeeded:
+            raise unavailable[0]
+
+    workers = min(max_workers, len(branches)) or 1
+    # Branches past `workers` queue for a free thread, so each wave of them gets its own branch_timeout
+    timeout = branch_timeout * -(-len(branches) // workers)
+    pool = ThreadPoolExecutor(workers, thread_name_prefix="search-fanout")
+    try:
+        futures = [pool.submit(contextvars.copy_context().run, run, branch) for branch in branches]
+        yield from merge_jobs(results(futures))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def aiter_fanout(client, branches, branch_timeout=BRANCH_TIMEOUT, max_workers=FANOUT_WORKERS, page_urls=None):
+    """iter_fanout for AsyncScrapingDog, with branches as tasks on the event loop"""
+    limit = asyncio.Semaphore(max_workers)
+
+    async def run(branch):
+        async with limit:
+            deadline = min(branch.get("deadline", branch_timeout), branch_timeout)
+            dedupe = Deduplicator(page_urls=page_urls)
+            return [job async for job in client.iter_jobs(**dict(branch, deadline=deadline, dedupe=dedupe))]
+
+    seen = set()
+    unavailable = []
+    succeeded = 0
+    timeout = branch_timeout * -(-len(branches) // max(min(max_workers, len(branches)), 1))
+    tasks = [asyncio.ensure_future(run(branch)) for branch in branches]
+    try:
+        for done in asyncio.as_completed(tasks, timeout=timeout):
+            try:
+                jobs = await done
+            except UpstreamUnavailable as e:
+                unavailable.append(e)
+                continue
+            except asyncio.TimeoutError:
+                late = sum(not task.done() for task in tasks)
+                print(f"Dropped {late} fan-out branch(es) still running after {timeout}s")
+                break
+            succeeded += 1
+            for job in jobs:
+                key = dedupe_key(job)
+                if key not in seen:
+                    seen.add(key)
+                    yield job
+    finally:
+        for task in tasks:
+            task.cancel()
+    if unavailable and not succeeded:
+        raise unavailable[0]
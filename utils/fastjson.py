@@ -0,0 +1,26 @@
+"""JSON encode/decode through orjson when it's installed, the stdlib json module otherwise"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """Decode str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj, sort_keys=False, default=None):
+    """Compact UTF-8 JSON"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, default=default, option=option)
+    return json.dumps(obj, sort_keys=sort_keys, default=default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps(obj, sort_keys=False, default=None):
+    return dumps_bytes(obj, sort_keys, default).decode("utf-8")
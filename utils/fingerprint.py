@@ -0,0 +1,243 @@
+"""Canonical job fingerprints and near-duplicate collapsing
+
+The same posting comes back under different `via` values, with cosmetic
+title differences ("Sr." / "Senior", "- Remote") and tracking-laden apply
+URLs. job_fingerprint() hashes canonical title, company and location into a
+stable job ID; Deduplicator additionally catches near-duplicate titles with
+MinHash over word shingles, one job at a time.
+"""
+import hashlib
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+FINGERPRINT_FIELDS = ("title", "company", "location")
+
+DEDUPE_THRESHOLD = float(os.getenv("SEARCH_DEDUPE_THRESHOLD", "0.7"))
+
+_PUNCTUATION = re.compile(r"[^\w]+")
+_JOB_CODE = re.compile(r"\b(?:req|job|ref|id)?\d{4,}\b")
+
+ABBREVIATIONS = {
+    "sr": "senior",
+    "snr": "senior",
+    "jr": "junior",
+    "mgr": "manager",
+    "eng": "engineer",
+    "engr": "engineer",
+    "dev": "developer",
+    "assoc": "associate",
+    "asst": "assistant",
+    "dir": "director",
+    "vp": "vice president",
+    "swe": "software engineer",
+    "ml": "machine learning",
+    "&": "and",
+}
+# Words that describe the ad rather than the role
+TITLE_NOISE = frozenset(
+    "remote hybrid onsite urgent urgently hiring immediate immediately start new apply now m f d w".split()
+)
+COMPANY_SUFFIXES = frozenset(
+    "inc incorporated llc l l c ltd limited corp corporation co company plc gmbh ag sa bv nv pty lp llp group".split()
+)
+LOCATION_SUFFIXES = ("united states of america", "united states", "usa", "us")
+
+TRACKING_PARAMS = frozenset((
+    "gclid", "fbclid", "msclkid", "yclid", "dclid", "igshid", "mc_cid", "mc_eid", "_hsenc", "_hsmi",
+    "ref", "refid", "referrer", "src", "source", "trk", "trkinfo", "trackingid", "tracking_id", "campaign",
+    "campaignid", "si", "from", "utm", "cmp", "clickid", "click_id", "sid", "jobsource", "feedid",
+))
+
+
+def canonical_text(value):
+    """Accents stripped, casefolded, punctuation to spaces, whitespace collapsed"""
+    text = unicodedata.normalize("NFKD", str(value or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(_PUNCTUATION.sub(" ", text.replace("&", " & ").casefold()).split())
+
+
+@lru_cache(maxsize=65536)
+def canonical_title(title):
+    words = []
+    for word in canonical_text(_JOB_CODE.sub(" ", str(title or "").casefold())).split():
+        word = ABBREVIATIONS.get(word, word)
+        if word not in TITLE_NOISE:
+            words.append(word)
+    return " ".join(words)
+
+
+@lru_cache(maxsize=65536)
+def canonical_company(company):
+    words = canonical_text(company).split()
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+@lru_cache(maxsize=65536)
+def canonical_location(location):
+    text = canonical_text(location)
+    for suffix in LOCATION_SUFFIXES:
+        if text.endswith(" " + suffix):
+            return text[: -len(suffix) - 1]
+    return text
+
+
+def dedupe_key(job):
+    """Jobs with the same canonical title, company and location are one posting whatever their `via`"""
+    return (
+        canonical_title(job.get("title")),
+        canonical_company(job.get("company")),
+        canonical_location(job.get("location")),
+    )
+
+
+def job_fingerprint(job):
+    """Stable ID for a posting, derived from its dedupe key"""
+    return hashlib.sha1("\x1f".join(dedupe_key(job)).encode("utf-8")).hexdigest()
+
+
+def canonical_url(url):
+    """`url` without tracking params, fragment, "www." or a trailing slash; params sorted"""
+    if not url:
+        return None
+    try:
+        parts = urlsplit(str(url).strip())
+    except ValueError:
+        return str(url)
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith("utm_") and name.lower() not in TRACKING_PARAMS
+    )
+    return urlunsplit((parts.scheme.lower(), host, parts.path.rstrip("/") or "/", urlencode(query), ""))
+
+
+def shingles(text):
+    """Hashes of the words and word pairs of `text`"""
+    words = text.split()
+    return {hash(word) for word in words} | {hash(pair) for pair in zip(words, words[1:])}
+
+
+class MinHash:
+    """MinHash signatures using XOR-masked 64-bit hashes as the permutations
+
+    Built on Python's hash(), so signatures are only comparable within one
+    process, which is all in-flight deduplication needs.
+    """
+
+    MASK = (1 << 64) - 1
+
+    def __init__(self, num_perm=24, seed=1):
+        state = seed
+        self.masks = []
+        for _ in range(num_perm):
+            # splitmix64, so the masks are fixed for a given seed
+            state = (state + 0x9E3779B97F4A7C15) & self.MASK
+            z = state
+            z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & self.MASK
+            z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & self.MASK
+            self.masks.append(z ^ (z >> 31))
+
+    def signature(self, hashes):
+        hashes = [h & self.MASK for h in hashes]
+        return tuple(min(map(mask.__xor__, hashes)) for mask in self.masks)
+
+    @staticmethod
+    def similarity(a, b):
+        """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class Deduplicator:
+    """Streaming duplicate filter over job dicts
+
+    A job is a duplicate when its fingerprint or its own canonical apply
+    URL (not a page-level link, see mark_page_url) was seen before, or
+    when a job at the same canonical company and location has a title
+    whose estimated shingle similarity reaches `threshold`. Candidates are
+    found by LSH banding, so each job costs the same however many came
+    before it. Pass `page_urls` to share page-level links with the
+    Deduplicators of sub-searches whose jobs this one filters.
+    """
+
+    def __init__(self, threshold=DEDUPE_THRESHOLD, num_perm=24, bands=6, page_urls=None):
+        self.threshold = threshold
+        self.minhash = MinHash(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ids = {}
+        self.urls = {}
+        self.buckets = {}
+        self.signatures = {}
+        self.title_signatures = {}
+        self.duplicates = 0
+        # Canonical apply links a results page gives every posting that lacks its own
+        # (its related_links); they never identify one posting
+        self.page_urls = page_urls if page_urls is not None else set()
+
+    def mark_page_url(self, url):
+        """Remember `url` as a page-level apply link, so postings are never matched on it"""
+        url = canonical_url(url)
+        if url is not None:
+            self.page_urls.add(url)
+
+    def own_url(self, job):
+        """The job's canonical apply URL, or None when it has none of its own (a page-level link)"""
+        url = canonical_url(job.get("apply_url") or job.get("url"))
+        return None if url in self.page_urls else url
+
+    def check(self, job):
+        """(job ID, ID of the posting it duplicates or None), remembering the job if it's new"""
+        key = dedupe_key(job)
+        job_id = hashlib.sha1("\x1f".join(key).encode("utf-8")).hexdigest()
+        if job_id in self.ids:
+            self.duplicates += 1
+            return job_id, self.ids[job_id]
+
+        url = self.own_url(job)
+        if url is not None and url in self.urls:
+            self.ids[job_id] = self.urls[url]
+            self.duplicates += 1
+            return job_id, self.urls[url]
+
+        title, company, location = key
+        signature = self.title_signatures.get(title)
+        if signature is None:
+            signature = self.title_signatures[title] = self.minhash.signature(shingles(title) or {0})
+        bands = [
+            (company, location, band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)
+        ]
+        for bucket in bands:
+            for other in self.buckets.get(bucket, ()):
+                if MinHash.similarity(signature, self.signatures[other]) >= self.threshold:
+                    self.ids[job_id] = other
+                    if url is not None:
+                        self.urls[url] = other
+                    self.duplicates += 1
+                    return job_id, other
+
+        self.ids[job_id] = job_id
+        if url is not None:
+            self.urls[url] = job_id
+        self.signatures[job_id] = signature
+        for bucket in bands:
+            self.buckets.setdefault(bucket, []).append(job_id)
+        return job_id, None
+
+    def filter(self, jobs):
+        """Yield the jobs that aren't duplicates of earlier ones"""
+        for job in jobs:
+            if self.check(job)[1] is None:
+                yield job
+
+
+def dedupe_jobs(jobs, threshold=DEDUPE_THRESHOLD):
+    """Lazily drop exact and near-duplicate postings from an iterable of job dicts"""
+    return Deduplicator(threshold).filter(jobs)
@@ -0,0 +1,254 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+from utils.errors import UpstreamUnavailable
+from utils.sqlite_store import LocalConnection
+
+load_dotenv()
+
+UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", "5"))
+UPSTREAM_BURST = float(os.getenv("UPSTREAM_BURST", "10"))
+UPSTREAM_MAX_IN_FLIGHT = int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", "10"))
+# Credits per UTC day, 0 for no limit
+UPSTREAM_DAILY_BUDGET = int(os.getenv("UPSTREAM_DAILY_BUDGET", "0"))
+UPSTREAM_CREDITS_PER_CALL = int(os.getenv("UPSTREAM_CREDITS_PER_CALL", "5"))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "10"))
+# SQLite file shared by all workers on the host, empty for a per-process governor
+UPSTREAM_GOVERNOR_PATH = os.getenv("UPSTREAM_GOVERNOR_PATH", "")
+
+# How long a crashed worker's in-flight slot is held before it's reclaimed
+LEASE_SECONDS = 120
+POLL_INTERVAL = 0.05
+
+
+class QuotaExhausted(UpstreamUnavailable):
+    """The daily credit budget is spent"""
+
+
+class QueueTimeout(UpstreamUnavailable):
+    """No upstream slot freed up before the caller's deadline"""
+
+
+def utc_day(now):
+    return datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%d")
+
+
+class MemoryState:
+    """Token bucket, in-flight count and daily spend for this process"""
+
+    # Whether calls wait on I/O, so acquire_async moves them off the event loop
+    blocking = False
+
+    def __init__(self, burst):
+        self.tokens = burst
+        self.updated = time.time()
+        self.day = utc_day(self.updated)
+        self.spent = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, limits, cost):
+        with self._lock:
+            now = time.time()
+            self.tokens = min(limits.burst, self.tokens + (now - self.updated) * limits.rate)
+            self.updated = now
+            if utc_day(now) != self.day:
+                self.day, self.spent = utc_day(now), 0
+
+            if limits.daily_budget and self.spent + cost > limits.daily_budget:
+                raise QuotaExhausted(f"Daily upstream budget of {limits.daily_budget} credits is spent")
+            if self.tokens < 1:
+                return None, (1 - self.tokens) / limits.rate
+            if self.in_flight >= limits.max_in_flight:
+                return None, POLL_INTERVAL
+
+            self.tokens -= 1
+            self.spent += cost
+            self.in_flight += 1
+            return True, 0
+
+    def release(self, lease):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self, limits):
+        with self._lock:
+            tokens = min(limits.burst, self.tokens + (time.time() - self.updated) * limits.rate)
+            spent = self.spent if self.day == utc_day(time.time()) else 0
+            return {"tokens": round(tokens, 2), "in_flight": self.in_flight, "spent_today": spent}
+
+
+class SqliteState:
+    """The same state in a SQLite file, so every worker draws from one bucket and budget"""
+
+    blocking = True
+
+    def __init__(self, path, burst):
+        self._db = LocalConnection(path)
+        with self._db.transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                "id INTEGER PRIMARY KEY CHECK (id = 1), tokens REAL, updated REAL, day TEXT, spent INTEGER)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (id INTEGER PRIMARY KEY AUTOINCREMENT, expires REAL)")
+            now = time.time()
+            conn.execute("INSERT OR IGNORE INTO bucket VALUES (1, ?, ?, ?, 0)", (burst, now, utc_day(now)))
+
+    def try_acquire(self, limits, cost):
+        with self._db.transaction() as conn:
+            now = time.time()
+            tokens, updated, day, spent = conn.execute("SELECT tokens, updated, day, spent FROM bucket").fetchone()
+            tokens = min(limits.burst, tokens + (now - updated) * limits.rate)
+            if utc_day(now) != day:
+                day, spent = utc_day(now), 0
+            conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+            in_flight = conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+
+            if limits.daily_budget and spent + cost > limits.daily_budget:
+                raise QuotaExhausted(f"Daily upstream budget of {limits.daily_budget} credits is spent")
+            if tokens < 1 or in_flight >= limits.max_in_flight:
+                conn.execute("UPDATE bucket SET tokens = ?, updated = ?, day = ?, spent = ?", (tokens, now, day, spent))
+                return None, (1 - tokens) / limits.rate if tokens < 1 else POLL_INTERVAL
+
+            conn.execute("UPDATE bucket SET tokens = ?, updated = ?, day = ?, spent = ?", (tokens - 1, now, day, spent + cost))
+            return conn.execute("INSERT INTO leases (expires) VALUES (?)", (now + LEASE_SECONDS,)).lastrowid, 0
+
+    def release(self, lease):
+        self._db.get().execute("DELETE FROM leases WHERE id = ?", (lease,))
+
+    def snapshot(self, limits):
+        conn = self._db.get()
+        now = time.time()
+        tokens, updated, day, spent = conn.execute("SELECT tokens, updated, day, spent FROM bucket").fetchone()
+        in_flight = conn.execute("SELECT COUNT(*) FROM leases WHERE expires >= ?", (now,)).fetchone()[0]
+        return {
+            "tokens": round(min(limits.burst, tokens + (now - updated) * limits.rate), 2),
+            "in_flight": in_flight,
+            "spent_today": spent if day == utc_day(now) else 0,
+        }
+
+
+class Governor:
+    """Rate, concurrency and daily-credit limits around upstream calls
+
+    Callers queue until a slot is free or their deadline passes
+    (QueueTimeout); once the budget is spent they get QuotaExhausted
+    straight away.
+    """
+
+    def __init__(
+        self,
+        state=None,
+        rate=UPSTREAM_RATE,
+        burst=UPSTREAM_BURST,
+        max_in_flight=UPSTREAM_MAX_IN_FLIGHT,
+        daily_budget=UPSTREAM_DAILY_BUDGET,
+        credits_per_call=UPSTREAM_CREDITS_PER_CALL,
+        queue_timeout=UPSTREAM_QUEUE_TIMEOUT,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.daily_budget = daily_budget
+        self.credits_per_call = credits_per_call
+        self.queue_timeout = queue_timeout
+        self.state = state if state is not None else MemoryState(burst)
+        self.queued = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _enter_queue(self, delta):
+        with self._lock:
+            self.queued += delta
+
+    def _reject(self, error):
+        with self._lock:
+            self.rejected += 1
+        raise error
+
+    def acquire(self, timeout=None):
+        """Block until a call may go upstream; returns a lease for release()"""
+        end = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        self._enter_queue(1)
+        try:
+            while True:
+                try:
+                    lease, wait = self.state.try_acquire(self, self.credits_per_call)
+                except QuotaExhausted as e:
+                    self._reject(e)
+                if lease is not None:
+                    return lease
+                if time.monotonic() + wait > end:
+                    self._reject(QueueTimeout("Timed out waiting for an upstream slot"))
+                time.sleep(wait)
+        finally:
+            self._enter_queue(-1)
+
+    async def acquire_async(self, timeout=None):
+        """acquire() that waits on the event loop instead of blocking it"""
+        end = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        self._enter_queue(1)
+        try:
+            while True:
+                try:
+                    if self.state.blocking:
+                        lease, wait = await asyncio.to_thread(self.state.try_acquire, self, self.credits_per_call)
+                    else:
+                        lease, wait = self.state.try_acquire(self, self.credits_per_call)
+                except QuotaExhausted as e:
+                    self._reject(e)
+                if lease is not None:
+                    return lease
+                if time.monotonic() + wait > end:
+                    self._reject(QueueTimeout("Timed out waiting for an upstream slot"))
+                await asyncio.sleep(wait)
+        finally:
+            self._enter_queue(-1)
+
+    def release(self, lease):
+        self.state.release(lease)
+
+    async def release_async(self, lease):
+        if self.state.blocking:
+            await asyncio.to_thread(self.state.release, lease)
+        else:
+            self.state.release(lease)
+
+    @contextmanager
+    def permit(self, timeout=None):
+        lease = self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release(lease)
+
+    def remaining_budget(self):
+        if not self.daily_budget:
+            return None
+        return max(0, self.daily_budget - self.state.snapshot(self)["spent_today"])
+
+    def stats(self):
+        snapshot = self.state.snapshot(self)
+        with self._lock:
+            queued, rejected = self.queued, self.rejected
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "max_in_flight": self.max_in_flight,
+            "daily_budget": self.daily_budget or None,
+            "remaining_budget": max(0, self.daily_budget - snapshot["spent_today"]) if self.daily_budget else None,
+            "queue_depth": queued,
+            "rejected": rejected,
+            **snapshot,
+        }
+
+
+def create_governor(path=UPSTREAM_GOVERNOR_PATH):
+    """Per-process governor, or one shared through SQLite when UPSTREAM_GOVERNOR_PATH is set"""
+    state = SqliteState(path, UPSTREAM_BURST) if path else None
+    return Governor(state)
@@ -0,0 +1,166 @@
+"""Vectorized post-filtering and BM25 ranking over a batch of job dicts
+
+JobFrame pulls each column out of the batch once, when first used. A
+text column is searched by joining the rows still in play into one
+lowercased string and scanning it with a single regex that starts with a
+literal (so re can jump between candidates instead of trying every
+position); match offsets map back to rows with np.searchsorted. Filters
+narrow the rows as they go, cheap short columns first, and BM25 term
+counts come from np.bincount over the matches of the rows that are left.
+Needs numpy.
+"""
+import re
+import time
+
+import numpy as np
+
+TEXT_COLUMNS = ("title", "company", "location", "description", "platform", "job_type")
+
+# BM25 parameters; title matches count TITLE_WEIGHT times a description match
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 2.0
+
+
+def terms(text):
+    """Lowercased word terms of a keywords string, in order, without repeats"""
+    return list(dict.fromkeys(re.findall(r"\w+", str(text or "").lower())))
+
+
+def any_of(values):
+    """Regex matching any of `values` (lowercased) literally"""
+    return "|".join(re.escape(str(value).lower()) for value in values)
+
+
+def whole_word(word):
+    """Regex matching `word` between word boundaries
+
+    The boundary before it is checked with a lookbehind after the literal,
+    since a leading \\b stops re from searching for the literal.
+    """
+    word = re.escape(word)
+    return rf"{word}(?<!\w{word})\b"
+
+
+class JobFrame:
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._columns = {}
+        self._posted_ts = None
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def everything(self):
+        return np.ones(len(self.jobs), dtype=bool)
+
+    def column(self, name):
+        if name not in self._columns:
+            self._columns[name] = [job.get(name) or "" for job in self.jobs]
+        return self._columns[name]
+
+    @property
+    def posted_ts(self):
+        if self._posted_ts is None:
+            self._posted_ts = np.array(
+                [np.nan if job.get("posted_ts") is None else job["posted_ts"] for job in self.jobs], dtype=float
+            )
+        return self._posted_ts
+
+    def _joined(self, column, rows):
+        """(the rows' values lowercased in one newline-separated string, each row's start offset, each row's length)"""
+        values = self.column(column)
+        texts = [values[i] for i in rows]
+        text = "\n".join(texts).lower()
+        if len(text) != sum(map(len, texts)) + max(len(texts) - 1, 0):
+            # A few characters change length when lowercased; keep offsets right
+            texts = [value.lower() for value in texts]
+            text = "\n".join(texts)
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        starts = np.zeros(len(texts), dtype=np.int64)
+        np.cumsum(lengths[:-1] + 1, out=starts[1:])
+        return text, starts, lengths
+
+    @staticmethod
+    def _rows_of(pattern, text, starts):
+        """Position (into the joined rows) of every match of `pattern` in `text`, one entry per match"""
+        offsets = np.fromiter((match.start() for match in re.finditer(pattern, text)), dtype=np.int64)
+        return np.searchsorted(starts, offsets, side="right") - 1
+
+    def contains(self, column, pattern, mask=None):
+        """`mask` narrowed to rows whose lowercased `column` matches `pattern`"""
+        mask = self.everything() if mask is None else mask.copy()
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return mask
+        text, starts, _ = self._joined(column, rows)
+        hit = np.zeros(len(rows), dtype=bool)
+        hit[self._rows_of(pattern, text, starts)] = True
+        mask[rows[~hit]] = False
+        return mask
+
+    def contains_any(self, column, values, mask=None):
+        """Rows whose `column` contains any of `values` (case-insensitive)"""
+        return self.contains(column, any_of(values), mask)
+
+    def contains_all(self, column, words, mask=None):
+        """Rows whose `column` contains every one of `words` (case-insensitive)"""
+        for word in words:
+            mask = self.contains(column, re.escape(word.lower()), mask)
+        return self.everything() if mask is None else mask
+
+    def posted_within(self, seconds, now=None):
+        """Rows posted at most `seconds` ago; those without a readable date are dropped"""
+        since = (time.time() if now is None else now) - seconds
+        with np.errstate(invalid="ignore"):
+            return self.posted_ts >= since
+
+    def mask(self, platforms=None, description=None, location=None, job_type=None, posted_within_days=None):
+        """The rows passing every given filter (None skips one), the long description scanned last"""
+        mask = self.everything()
+        if posted_within_days is not None:
+            mask &= self.posted_within(float(posted_within_days) * 86400)
+        if platforms:
+            mask = self.contains_any("platform", platforms, mask)
+        if location:
+            mask = self.contains_all("location", [location], mask)
+        if job_type and job_type != "Any":
+            mask = self.contains_all("job_type", [job_type], mask)
+        if description:
+            mask = self.contains_all("description", terms(description), mask)
+        return mask
+
+    def bm25(self, column, rows, words, k1=BM25_K1, b=BM25_B):
+        """BM25 score of each of `rows` for `words`, document frequencies taken over those rows
+
+        Document length is measured in characters, which is proportional
+        to words closely enough for length normalization.
+        """
+        text, starts, lengths = self._joined(column, rows)
+        n = len(rows)
+        norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+        score = np.zeros(n)
+        for word in words:
+            counts = np.bincount(self._rows_of(whole_word(word), text, starts), minlength=n).astype(float)
+            df = np.count_nonzero(counts)
+            idf = np.log1p((n - df + 0.5) / (df + 0.5))
+            score += idf * counts * (k1 + 1) / (counts + norm)
+        return score
+
+    def scores(self, keywords, mask=None):
+        """(row indexes, relevance to `keywords`): title and description BM25 of the masked rows"""
+        rows = np.flatnonzero(self.everything() if mask is None else mask)
+        words = terms(keywords)
+        if not words or not len(rows):
+            return rows, np.zeros(len(rows))
+        return rows, self.bm25("description", rows, words) + TITLE_WEIGHT * self.bm25("title", rows, words)
+
+    def select(self, mask):
+        """The job dicts of the masked rows, in their original order"""
+        return [self.jobs[i] for i in np.flatnonzero(mask)]
+
+    def rank(self, keywords, mask=None):
+        """The job dicts of the masked rows, most relevant first (ties keep their original order)"""
+        rows, score = self.scores(keywords, mask)
+        order = np.argsort(-score, kind="stable")
+        return [self.jobs[i] for i in rows[order]]
@@ -0,0 +1,172 @@
+"""Local persistent index of every job seen from upstream, searchable with SQLite FTS5
+
+Maintenance:  python -m utils.job_index --expire --compact
+"""
+import argparse
+import os
+import re
+import time
+from dotenv import load_dotenv
+
+from utils.fingerprint import job_fingerprint
+from utils.job_parser import parse_posted_at
+from utils.sqlite_store import LocalConnection
+
+load_dotenv()
+
+INDEX_PATH = os.getenv("JOB_INDEX_PATH", "job_index.sqlite3")
+INDEX_TTL = float(os.getenv("JOB_INDEX_TTL", str(14 * 24 * 3600)))
+
+JOB_COLUMNS = ("title", "company", "location", "description", "apply_url", "date_posted", "platform", "job_type")
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    "id INTEGER PRIMARY KEY, fingerprint TEXT UNIQUE NOT NULL, "
+    "title TEXT, company TEXT, location TEXT, description TEXT, apply_url TEXT, "
+    "date_posted TEXT, platform TEXT, job_type TEXT, "
+    "first_seen REAL, last_seen REAL, seen_count INTEGER DEFAULT 1)",
+    "CREATE INDEX IF NOT EXISTS jobs_last_seen ON jobs (last_seen)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5("
+    "title, company, location, description, content='jobs', content_rowid='id')",
+    # Keep the external-content FTS table in step with jobs
+    "CREATE TRIGGER IF NOT EXISTS jobs_ai AFTER INSERT ON jobs BEGIN "
+    "INSERT INTO jobs_fts (rowid, title, company, location, description) "
+    "VALUES (new.id, new.title, new.company, new.location, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS jobs_ad AFTER DELETE ON jobs BEGIN "
+    "INSERT INTO jobs_fts (jobs_fts, rowid, title, company, location, description) "
+    "VALUES ('delete', old.id, old.title, old.company, old.location, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS jobs_au AFTER UPDATE OF title, company, location, description ON jobs BEGIN "
+    "INSERT INTO jobs_fts (jobs_fts, rowid, title, company, location, description) "
+    "VALUES ('delete', old.id, old.title, old.company, old.location, old.description); "
+    "INSERT INTO jobs_fts (rowid, title, company, location, description) "
+    "VALUES (new.id, new.title, new.company, new.location, new.description); END",
+)
+
+UPSERT = (
+    "INSERT INTO jobs (fingerprint, " + ", ".join(JOB_COLUMNS) + ", first_seen, last_seen) "
+    "VALUES (?, " + ", ".join("?" for _ in JOB_COLUMNS) + ", ?, ?) "
+    "ON CONFLICT (fingerprint) DO UPDATE SET "
+    + ", ".join(f"{column} = excluded.{column}" for column in JOB_COLUMNS)
+    + ", last_seen = excluded.last_seen, seen_count = seen_count + 1"
+)
+
+
+def fts_terms(text):
+    """Quote each word so user input can't inject FTS5 query syntax"""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text or ""))
+
+
+def row_to_job(row):
+    *values, last_seen = row
+    job = dict(zip(JOB_COLUMNS, values))
+    # Same shape as the dicts built by parse_jobs; date_posted ("3 days ago") is as of the last sighting
+    job["url"] = job["apply_url"]
+    job["is_real_job"] = True
+    job["posted_ts"] = parse_posted_at(job["date_posted"], last_seen)
+    return job
+
+
+class JobIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._db = LocalConnection(path)
+        with self._db.transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def upsert_many(self, jobs):
+        """Insert new postings and refresh the ones seen before"""
+        now = time.time()
+        rows = [
+            (job_fingerprint(job), *(job.get(column) for column in JOB_COLUMNS), now, now)
+            for job in jobs
+        ]
+        if rows:
+            with self._db.transaction() as conn:
+                conn.executemany(UPSERT, rows)
+
+    def _query(self, keywords=None, location=None, job_type=None, platforms=None):
+        """(SELECT statement, args) for postings matching the filters, best first"""
+        match = []
+        if fts_terms(keywords):
+            match.append(f"{{title description company}} : ({fts_terms(keywords)})")
+        if fts_terms(location):
+            match.append(f"location : ({fts_terms(location)})")
+
+        where = []
+        args = []
+        if match:
+            where.append("jobs_fts MATCH ?")
+            args.append(" AND ".join(match))
+        if job_type and job_type != "Any":
+            where.append("jobs.job_type LIKE ?")
+            args.append(f"%{job_type}%")
+        if platforms:
+            where.append("(" + " OR ".join("jobs.platform LIKE ?" for _ in platforms) + ")")
+            args.extend(f"%{platform}%" for platform in platforms)
+
+        sql = "SELECT " + ", ".join(f"jobs.{column}" for column in JOB_COLUMNS) + ", jobs.last_seen FROM jobs"
+        if match:
+            sql += " JOIN jobs_fts ON jobs_fts.rowid = jobs.id"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY " + ("jobs_fts.rank, " if match else "") + "jobs.last_seen DESC"
+        return sql, args
+
+    def search(self, keywords=None, location=None, job_type=None, platforms=None, limit=10):
+        """Best matching postings for the filters, most recently seen first on ties"""
+        sql, args = self._query(keywords, location, job_type, platforms)
+        return [row_to_job(row) for row in self._db.get().execute(sql + " LIMIT ?", (*args, limit))]
+
+    def iter_jobs(self, keywords=None, location=None, job_type=None, platforms=None, batch=1000):
+        """Every posting matching the filters, in search() order, read `batch` rows at a time"""
+        sql, args = self._query(keywords, location, job_type, platforms)
+        cursor = self._db.get().execute(sql, args)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    return
+                for row in rows:
+                    yield row_to_job(row)
+        finally:
+            cursor.close()
+
+    def expire(self, ttl=INDEX_TTL):
+        """Drop postings not re-sighted within `ttl` seconds; returns how many went"""
+        with self._db.transaction() as conn:
+            return conn.execute("DELETE FROM jobs WHERE last_seen < ?", (time.time() - ttl,)).rowcount
+
+    def compact(self):
+        """Merge FTS segments and reclaim free pages"""
+        conn = self._db.get()
+        conn.execute("INSERT INTO jobs_fts (jobs_fts) VALUES ('optimize')")
+        conn.execute("VACUUM")
+
+    def stats(self):
+        count, oldest, newest = self._db.get().execute(
+            "SELECT COUNT(*), MIN(last_seen), MAX(last_seen) FROM jobs"
+        ).fetchone()
+        return {"jobs": count, "oldest_seen": oldest, "newest_seen": newest}
+
+
+def create_index(path=INDEX_PATH):
+    """The job index at JOB_INDEX_PATH, or None when JOB_INDEX_PATH is empty"""
+    return JobIndex(path) if path else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the local job index")
+    parser.add_argument("--path", default=INDEX_PATH)
+    parser.add_argument("--expire", action="store_true", help="drop postings older than --ttl")
+    parser.add_argument("--ttl", type=float, default=INDEX_TTL, help="seconds since a posting was last seen")
+    parser.add_argument("--compact", action="store_true", help="optimize the FTS index and VACUUM")
+    args = parser.parse_args()
+
+    index = JobIndex(args.path)
+    if args.expire:
+        print(f"Expired {index.expire(args.ttl)} postings")
+    if args.compact:
+        index.compact()
+        print("Compacted index")
+    print(index.stats())
@@ -0,0 +1,200 @@
+"""Schema-driven extraction of google_jobs results
+
+Each result is read once into a tuple of RECORD_FIELDS values; from there
+it becomes a job dict, the shape that is cached, indexed and served.
+Page-level lookups such as the related_links apply link are done once per
+response, not once per job.
+"""
+import re
+import time
+from functools import lru_cache
+
+# What a result is read into, in order
+RECORD_FIELDS = ("title", "company", "location", "description", "apply_url", "date_posted", "platform", "job_type", "posted_ts")
+
+# Keys of a served job dict; url mirrors apply_url and is_real_job is always True
+JOB_FIELDS = (
+    "title", "company", "location", "description", "url", "apply_url", "date_posted", "platform", "job_type",
+    "is_real_job", "posted_ts",
+)
+
+UNIT_SECONDS = {"minute": 60, "min": 60, "hour": 3600, "hr": 3600, "day": 86400, "week": 7 * 86400, "month": 30 * 86400, "year": 365 * 86400}
+POSTED_AGO = re.compile(r"(\d+|an?)\+?\s*(minute|min|hour|hr|day|week|month|year)s?\s+ago")
+
+_EMPTY = {}
+
+
+@lru_cache(maxsize=512)
+def posted_age(text):
+    """Seconds ago for a posted_at string like "3 days ago"; None if it can't be read"""
+    text = (text or "").strip().lower()
+    match = POSTED_AGO.search(text)
+    if match:
+        amount = 1 if match.group(1) in ("a", "an") else int(match.group(1))
+        return amount * UNIT_SECONDS[match.group(2)]
+    if text in ("just posted", "today", "now") or text.startswith("just now"):
+        return 0
+    if text == "yesterday":
+        return 86400
+    return None
+
+
+def parse_posted_at(text, now):
+    """Unix time for a posted_at string relative to `now`, or None"""
+    age = posted_age(text) if isinstance(text, str) or text is None else None
+    return None if age is None else int(now - age)
+
+
+def related_apply_url(data):
+    """The first related link whose text mentions applying, if any"""
+    for link in data.get("related_links") or ():
+        if "apply" in link.get("text", "").lower():
+            return link.get("link")
+    return None
+
+
+def extract(job, related_apply=None, now=None):
+    """RECORD_FIELDS values for one entry of jobs_results, posted_ts relative to `now`"""
+    get = job.get
+    ext = get("detected_extensions") or _EMPTY
+
+    apply_url = None
+    apply_link = get("apply_link")
+    if apply_link:
+        apply_url = apply_link.get("link")
+    if not apply_url:
+        options = get("apply_options")
+        if options:
+            apply_url = options[0].get("link")
+        elif related_apply and "job_id" in job:
+            apply_url = related_apply
+    if not apply_url and "job_id" in job:
+        apply_url = f"https://www.google.com/search?q={job['job_id']}"
+
+    date_posted = ext.get("posted_at", "Recent")
+    return (
+        get("title", "Unknown Title"),
+        get("company_name", "Unknown Company"),
+        get("location", "Unknown Location"),
+        get("description") or get("snippet", "No available description"),
+        apply_url,
+        date_posted,
+        get("via", "unknown"),
+        ext.get("schedule_type") or ext.get("employment_type", "Not Specified"),
+        parse_posted_at(date_posted, time.time() if now is None else now),
+    )
+
+
+def full_job(values):
+    title, company, location, description, apply_url, date_posted, platform, job_type, posted_ts = values
+    return {
+        "title": title,
+        "company": company,
+        "location": location,
+        "description": description,
+        "url": apply_url,
+        "apply_url": apply_url,
+        "date_posted": date_posted,
+        "platform": platform,
+        "job_type": job_type,
+        "is_real_job": True,
+        "posted_ts": posted_ts,
+    }
+
+
+def check_fields(fields):
+    """Raise ValueError unless `fields` is a list of job field names"""
+    if not isinstance(fields, (list, tuple)):
+        raise ValueError("fields must be a list of job field names")
+    unknown = [name for name in fields if name not in JOB_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown job fields: {', '.join(map(str, unknown))}. Choose from {', '.join(JOB_FIELDS)}")
+
+
+@lru_cache(maxsize=64)
+def projector(fields):
+    """values -> dict with only `fields` (a tuple), resolved to tuple positions once"""
+    check_fields(fields)
+    plan = []
+    for name in fields:
+        if name == "is_real_job":
+            plan.append((name, None))
+        else:
+            plan.append((name, RECORD_FIELDS.index("apply_url" if name == "url" else name)))
+
+    def project(values):
+        return {name: True if i is None else values[i] for name, i in plan}
+    return project
+
+
+def parse_jobs(data, fields=None):
+    """Turn a google_jobs response into our job dicts, optionally only `fields` of each"""
+    related_apply = related_apply_url(data)
+    now = time.time()
+    build = full_job if fields is None else projector(tuple(fields))
+    return [build(extract(job, related_apply, now)) for job in data["jobs_results"]]
+
+
+def project_job(job, fields=None):
+    """Cut an already-parsed job dict down to `fields`"""
+    if fields is None:
+        return job
+    return {name: job.get(name) for name in fields}
+
+
+def project_jobs(jobs, fields=None):
+    if fields is None:
+        return jobs
+    return [{name: job.get(name) for name in fields} for job in jobs]
+
+
+RESPONSE_FORMATS = ("json", "compact")
+
+
+def check_format(response_format):
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"Unknown format: {response_format}. Choose from {', '.join(RESPONSE_FORMATS)}")
+
+
+def compact_jobs(jobs):
+    """Job dicts as columns: {"fields", "columns", "strings", "constants", "aliases"}
+
+    A field with the same value for every job goes in constants, a field
+    equal to an earlier one in aliases (url -> apply_url), and a string
+    field with at most half as many distinct values as jobs is interned:
+    its column holds indexes into strings[field]. expand_jobs() undoes it.
+    """
+    fields = list(dict.fromkeys(name for job in jobs for name in job))
+    columns, strings, constants, aliases = {}, {}, {}, {}
+    kept = {}
+    for name in fields:
+        column = [job.get(name) for job in jobs]
+        if all(value == column[0] for value in column):
+            constants[name] = column[0]
+            continue
+        alias = next((other for other, values in kept.items() if values == column), None)
+        if alias is not None:
+            aliases[name] = alias
+            continue
+        kept[name] = column
+        if all(value is None or isinstance(value, str) for value in column):
+            distinct = {}
+            index = [distinct.setdefault(value, len(distinct)) for value in column]
+            if len(distinct) * 2 <= len(column):
+                strings[name] = list(distinct)
+                column = index
+        columns[name] = column
+    return {"fields": fields, "columns": columns, "strings": strings, "constants": constants, "aliases": aliases}
+
+
+def expand_jobs(compact, count):
+    """The `count` job dicts a compact_jobs() result was built from"""
+    columns = {}
+    for name, column in compact["columns"].items():
+        table = compact["strings"].get(name)
+        columns[name] = column if table is None else [table[i] for i in column]
+    for name, value in compact["constants"].items():
+        columns[name] = [value] * count
+    for name, other in compact["aliases"].items():
+        columns[name] = columns[other]
+    return [{name: columns[name][i] for name in compact["fields"]} for i in range(count)]
@@ -0,0 +1,222 @@
+"""Per-stage latency histograms and upstream counters in Prometheus text format
+
+A request opens a Trace; code on the hot path wraps its work in
+`with stage("name"):` and the durations are observed, labelled with the
+request's route, country and outcome, when the trace finishes. Set
+METRICS_ENABLED=0 (or call set_enabled(False)) to turn all of it into
+no-ops.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_enabled = os.getenv("METRICS_ENABLED", "1") != "0"
+_current = ContextVar("metrics_trace", default=None)
+_noop = nullcontext()
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value):
+    global _enabled
+    _enabled = bool(value)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = format_labels(self.labels + ("le",), label_values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labels + ("le",), label_values + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {total}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "jobsearch_stage_seconds", "Time spent in each stage of a request", ("stage", "route", "country", "outcome")
+)
+REQUEST_SECONDS = Histogram(
+    "jobsearch_request_seconds", "End-to-end request latency", ("route", "country", "outcome")
+)
+UPSTREAM_RESPONSES = Counter(
+    "jobsearch_upstream_responses_total", "Upstream responses by HTTP status", ("status",)
+)
+UPSTREAM_BYTES = Histogram(
+    "jobsearch_upstream_response_bytes", "Upstream response payload size", buckets=BYTES_BUCKETS
+)
+
+_metrics = [STAGE_SECONDS, REQUEST_SECONDS, UPSTREAM_RESPONSES, UPSTREAM_BYTES]
+_collectors = []
+
+
+class Trace:
+    """Stage timings collected for one request, possibly across threads"""
+
+    def __init__(self, route, country=""):
+        self.route = route
+        self.country = country
+        self.start = time.perf_counter()
+        self.stages = []
+        self.upstream_error = False
+
+    def finish(self, outcome):
+        elapsed = time.perf_counter() - self.start
+        totals = {}
+        for name, seconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        country = str(self.country).lower()
+        for name, seconds in totals.items():
+            STAGE_SECONDS.observe(seconds, name, self.route, country, outcome)
+        REQUEST_SECONDS.observe(elapsed, self.route, country, outcome)
+
+
+def start_trace(route, country=""):
+    """Open a trace for the current request, or None when metrics are off"""
+    return Trace(route, country) if _enabled else None
+
+
+@contextmanager
+def activate(trace):
+    """Make `trace` the one stage() records into for this thread/task"""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+class _Stage:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.stages.append((self.name, time.perf_counter() - self.start))
+        return False
+
+
+def stage(name):
+    """Time a block into the active trace; free when there is none"""
+    trace = _current.get()
+    if trace is None:
+        return _noop
+    return _Stage(trace, name)
+
+
+def set_country(country):
+    trace = _current.get()
+    if trace is not None:
+        trace.country = country
+
+
+def mark_upstream_error():
+    trace = _current.get()
+    if trace is not None:
+        trace.upstream_error = True
+
+
+def outcome_for(trace, jobs, degraded=False):
+    """ok / upstream_error / empty"""
+    if degraded or (trace is not None and trace.upstream_error):
+        return "upstream_error"
+    return "ok" if jobs else "empty"
+
+
+def record_upstream_response(status, size):
+    if _enabled:
+        UPSTREAM_RESPONSES.inc(str(status))
+        UPSTREAM_BYTES.observe(size)
+
+
+def register_collector(collect):
+    """Add a callable returning extra exposition lines (gauges read at scrape time)"""
+    _collectors.append(collect)
+
+
+def sample_lines(name, help, value, type="gauge"):
+    """Exposition lines for a single unlabelled sample"""
+    if value is None:
+        return []
+    return [f"# HELP {name} {help}", f"# TYPE {name} {type}", f"{name} {value}"]
+
+
+def render():
+    """Everything in Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
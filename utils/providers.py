@@ -0,0 +1,317 @@
+"""Job search providers: a common interface, a registry, and an orchestrator over several of them
+
+A provider is anything with a `name` and an iter_jobs() taking the
+ScrapingDog.iter_jobs arguments and yielding job dicts. ScrapingDog is
+one; FakeProvider answers locally for tests and benchmarks. Providers are
+registered under a name, and SEARCH_PROVIDERS (comma-separated, default
+"scrapingdog") picks the ones searches go to. With more than one, an
+Orchestrator queries them concurrently, each under its own timeout,
+concurrency limit and circuit breaker, and merges their jobs; a slow or
+failing provider is cut off or skipped and the others answer.
+"""
+import contextvars
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from dotenv import load_dotenv
+
+from utils.breaker import CircuitBreaker
+from utils.errors import UpstreamUnavailable
+from utils.fingerprint import Deduplicator
+from utils.job_parser import JOB_FIELDS, parse_posted_at
+from utils.sqlite_store import per_process
+
+load_dotenv()
+
+SEARCH_PROVIDERS = [name.strip() for name in os.getenv("SEARCH_PROVIDERS", "scrapingdog").split(",") if name.strip()]
+# "merge" asks every provider and merges the jobs; "failover" asks them one at a
+# time in SEARCH_PROVIDERS order, moving on when one fails or is slow
+PROVIDER_MODE = os.getenv("SEARCH_PROVIDER_MODE", "merge")
+PROVIDER_TIMEOUT = float(os.getenv("SEARCH_PROVIDER_TIMEOUT", "10"))
+# Concurrent searches one provider is given; more wait up to its timeout
+PROVIDER_CONCURRENCY = int(os.getenv("SEARCH_PROVIDER_CONCURRENCY", "4"))
+# In failover mode, the next provider is started once the current one has taken this long
+FAILOVER_AFTER = float(os.getenv("SEARCH_PROVIDER_FAILOVER_AFTER", "3"))
+
+PROVIDER_MODES = ("merge", "failover")
+
+_registry = {}
+
+
+class SearchProvider:
+    """What a job source implements
+
+    iter_jobs() takes the ScrapingDog.iter_jobs keyword arguments (those a
+    provider can't use it ignores) and yields job dicts with every
+    JOB_FIELDS key; normalize_job() fills in whatever a source leaves out.
+    Reposts are dropped by `dedupe` (a Deduplicator, a new one by default)
+    before they count toward `count`. It should stop by `deadline` seconds
+    and raise UpstreamUnavailable when it can't search at all right now.
+    """
+
+    name = "provider"
+
+    def iter_jobs(self, keywords, location, platform=None, count=10, deadline=None, dedupe=None, **options):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+def register_provider(name, factory):
+    """Make `factory()` (returning a SearchProvider) available as `name` in SEARCH_PROVIDERS"""
+    _registry[name] = factory
+
+
+def provider_names():
+    return sorted(_registry)
+
+
+def create_provider(name):
+    if name not in _registry:
+        raise ValueError(f"Unknown search provider {name!r}. Choose from {', '.join(provider_names())}")
+    return _registry[name]()
+
+
+def normalize_job(job, now=None):
+    """A provider's job dict in the served schema: every JOB_FIELDS key, url mirroring apply_url"""
+    normalized = {name: job.get(name) or "" for name in ("title", "company", "location", "description", "date_posted", "platform", "job_type")}
+    normalized["apply_url"] = job.get("apply_url") or job.get("url") or ""
+    normalized["url"] = normalized["apply_url"]
+    normalized["is_real_job"] = True
+    posted_ts = job.get("posted_ts")
+    if posted_ts is None:
+        posted_ts = parse_posted_at(normalized["date_posted"], time.time() if now is None else now)
+    normalized["posted_ts"] = posted_ts
+    return {name: normalized[name] for name in JOB_FIELDS}
+
+
+class FakeProvider(SearchProvider):
+    """Local, deterministic jobs for a query; optionally slow or failing, for tests and benchmarks"""
+
+    COMPANIES = ("Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises")
+    PLATFORMS = ("LinkedIn", "Indeed", "Glassdoor", "Monster", "ZipRecruiter")
+    JOB_TYPES = ("Full-time", "Part-time", "Contractor", "Internship")
+
+    def __init__(self, name="fake", delay=0.0, fail=False, seed=0):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.seed = seed
+        self.calls = 0
+
+    def iter_jobs(self, keywords, location, platform=None, count=10, deadline=None, dedupe=None, **options):
+        self.calls += 1
+        if self.fail:
+            raise UpstreamUnavailable(f"{self.name} is failing")
+        if self.delay:
+            time.sleep(min(self.delay, deadline) if deadline is not None else self.delay)
+            if deadline is not None and self.delay > deadline:
+                return
+        digest = hashlib.sha1(f"{self.seed}|{keywords}|{location}".lower().encode("utf-8")).digest()
+        rng = random.Random(digest)
+        now = time.time()
+        jobs = (self._job(rng, keywords, location, platform, digest, i, now) for i in range(count * 2))
+        yield from islice((dedupe if dedupe is not None else Deduplicator()).filter(jobs), count)
+
+    def _job(self, rng, keywords, location, platform, digest, i, now):
+        company = rng.choice(self.COMPANIES)
+        return normalize_job({
+            "title": f"{keywords} {rng.choice(('', 'Senior ', 'Lead ', 'Junior '))}{i}".replace("  ", " ").strip(),
+            "company": company,
+            "location": location or "Remote",
+            "description": f"{company} is hiring for {keywords} in {location or 'a remote role'}.",
+            "apply_url": f"https://jobs.example.com/{self.name}/{digest.hex()[:8]}/{i}",
+            "date_posted": f"{rng.randint(1, 30)} days ago",
+            "platform": platform or rng.choice(self.PLATFORMS),
+            "job_type": rng.choice(self.JOB_TYPES),
+        }, now)
+
+
+class Orchestrator(SearchProvider):
+    """Several providers behind the SearchProvider interface
+
+    In "merge" mode every available provider is asked at once and the
+    jobs are yielded, reposts dropped, as each one finishes, up to `count`
+    in all. In "failover" mode the providers are asked in order, the next
+    one starting when the current one fails or is still running after
+    `failover_after` seconds; the first to answer with jobs wins. Each provider call is bounded by
+    `timeout` (and the caller's deadline), waits for one of its
+    `concurrency` slots, and goes through the provider's CircuitBreaker,
+    so a provider that keeps failing or timing out is skipped until its
+    breaker lets a probe through. UpstreamUnavailable is raised only when
+    no provider could answer.
+    """
+
+    name = "orchestrator"
+
+    def __init__(self, providers, mode=PROVIDER_MODE, timeout=PROVIDER_TIMEOUT, concurrency=PROVIDER_CONCURRENCY,
+                 failover_after=FAILOVER_AFTER, breakers=None):
+        if mode not in PROVIDER_MODES:
+            raise ValueError(f"SEARCH_PROVIDER_MODE must be one of: {', '.join(PROVIDER_MODES)}")
+        self.providers = list(providers)
+        self.mode = mode
+        self.timeout = timeout
+        self.failover_after = failover_after
+        # Provider calls are short and few, so judge them on fewer calls than the upstream breaker does
+        self.breakers = breakers or {
+            provider.name: CircuitBreaker(min_calls=5, slow_call=timeout) for provider in self.providers
+        }
+        self._slots = {provider.name: threading.BoundedSemaphore(concurrency) for provider in self.providers}
+        self._counts = {provider.name: {"calls": 0, "failed": 0, "timed_out": 0, "skipped": 0, "jobs": 0} for provider in self.providers}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max(len(self.providers) * concurrency, 1), thread_name_prefix="search-provider")
+
+    @property
+    def index(self):
+        """The local job index of a provider that keeps one (ScrapingDog), for the degraded fallback"""
+        for provider in self.providers:
+            if getattr(provider, "index", None) is not None:
+                return provider.index
+        return None
+
+    def _count(self, provider, **amounts):
+        with self._lock:
+            for key, amount in amounts.items():
+                self._counts[provider.name][key] += amount
+
+    def _call(self, provider, search, deadline, page_urls):
+        """One provider's normalized jobs, within `deadline` seconds; raises UpstreamUnavailable"""
+        breaker = self.breakers[provider.name]
+        probe = breaker.allow()
+        start = time.monotonic()
+        if not self._slots[provider.name].acquire(timeout=deadline):
+            breaker.cancel(probe)
+            self._count(provider, timed_out=1)
+            raise UpstreamUnavailable(f"{provider.name} is busy")
+        try:
+            remaining = max(deadline - (time.monotonic() - start), 0.0)
+            now = time.time()
+            dedupe = Deduplicator(page_urls=page_urls)
+            jobs = [normalize_job(job, now) for job in provider.iter_jobs(**dict(search, deadline=remaining, dedupe=dedupe))]
+        except Exception as e:
+            breaker.record(probe, False, time.monotonic() - start)
+            self._count(provider, calls=1, failed=1)
+            if isinstance(e, UpstreamUnavailable):
+                raise
+            raise UpstreamUnavailable(f"{provider.name} failed: {e}") from e
+        finally:
+            self._slots[provider.name].release()
+        breaker.record(probe, True, time.monotonic() - start)
+        self._count(provider, calls=1, jobs=len(jobs))
+        return jobs
+
+    def _available(self):
+        available = [provider for provider in self.providers if self.breakers[provider.name].available()]
+        for provider in self.providers:
+            if provider not in available:
+                self._count(provider, skipped=1)
+        return available
+
+    def _submit(self, provider, search, deadline, page_urls):
+        return self._pool.submit(contextvars.copy_context().run, self._call, provider, search, deadline, page_urls)
+
+    def iter_jobs(self, keywords, location, platform=None, count=10, deadline=None, dedupe=None, **options):
+        search = dict(options, keywords=keywords, location=location, platform=platform, count=count)
+        # Providers run on the pool and dedupe their own jobs, sharing the page-level links they
+        # find; `dedupe` itself is only used on this thread
+        dedupe = dedupe if dedupe is not None else Deduplicator()
+        deadline = self.timeout if deadline is None else min(deadline, self.timeout)
+        providers = self._available()
+        if not providers:
+            raise UpstreamUnavailable("Every search provider is unavailable")
+        if self.mode == "failover":
+            yield from self._failover(providers, search, deadline, dedupe)
+        else:
+            yield from islice(self._merge(providers, search, deadline, dedupe), count)
+
+    def _merge(self, providers, search, deadline, dedupe):
+        end = time.monotonic() + deadline
+        futures = {self._submit(provider, search, deadline, dedupe.page_urls): provider for provider in providers}
+        errors = []
+        answered = False
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(end - time.monotonic(), 0.0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    jobs = future.result()
+                except UpstreamUnavailable as e:
+                    errors.append(e)
+                    continue
+                answered = True
+                yield from dedupe.filter(jobs)
+        for future in pending:
+            # Still running past the deadline: it stops on its own deadline, its jobs are dropped
+            self._count(futures[future], timed_out=1)
+        if not answered:
+            raise errors[0] if errors else UpstreamUnavailable("No search provider answered in time")
+
+    def _failover(self, providers, search, deadline, dedupe):
+        end = time.monotonic() + deadline
+        waiting = list(providers)
+        running = {}
+        errors = []
+        answered = False
+        next_start = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if waiting and (not running or now >= next_start):
+                provider = waiting.pop(0)
+                running[self._submit(provider, search, max(end - now, 0.0), dedupe.page_urls)] = provider
+                next_start = now + self.failover_after
+                continue
+            if not running or now >= end:
+                break
+            timeout = min(end, next_start) - now if waiting else end - now
+            done, _ = wait(running, timeout=max(timeout, 0.0), return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                try:
+                    jobs = future.result()
+                except UpstreamUnavailable as e:
+                    errors.append(e)
+                    continue
+                answered = True
+                if jobs:
+                    yield from dedupe.filter(jobs)
+                    return
+        for provider in running.values():
+            self._count(provider, timed_out=1)
+        if not answered:
+            raise errors[0] if errors else UpstreamUnavailable("No search provider answered in time")
+
+    def stats(self):
+        with self._lock:
+            counts = {name: dict(values) for name, values in self._counts.items()}
+        for name, breaker in self.breakers.items():
+            counts[name]["breaker"] = breaker.stats()["state"]
+        return {"mode": self.mode, "providers": counts}
+
+
+def _scrapingdog():
+    # Imported here: scrapingdog_api imports this module for SearchProvider
+    from utils.scrapingdog_api import get_client
+    return get_client()
+
+
+register_provider("scrapingdog", _scrapingdog)
+register_provider("fake", FakeProvider)
+
+def _create_search_provider():
+    providers = [create_provider(name) for name in SEARCH_PROVIDERS]
+    return providers[0] if len(providers) == 1 else Orchestrator(providers)
+
+
+_provider = per_process(_create_search_provider)
+
+
+def get_search_provider():
+    """What searches go to: the only SEARCH_PROVIDERS entry, or an Orchestrator over all of them"""
+    return _provider()
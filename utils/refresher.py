@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from utils.cache import search_key
+from utils.governor import UPSTREAM_CREDITS_PER_CALL, utc_day
+
+load_dotenv()
+
+REFRESH_WORKERS = int(os.getenv("SEARCH_REFRESH_WORKERS", "2"))
+# How many of the most requested searches the scheduler keeps warm, 0 to turn it off
+REFRESH_TOP_N = int(os.getenv("SEARCH_REFRESH_TOP_N", "20"))
+REFRESH_INTERVAL = float(os.getenv("SEARCH_REFRESH_INTERVAL", "60"))
+# Re-fetch a hot search once its cache entry is this close to its TTL
+REFRESH_AHEAD = float(os.getenv("SEARCH_REFRESH_AHEAD", "120"))
+# Credits per UTC day background refreshes may spend; when unset, this
+# share of UPSTREAM_DAILY_BUDGET, or DEFAULT_REFRESH_CREDITS without a budget
+REFRESH_DAILY_CREDITS = os.getenv("SEARCH_REFRESH_DAILY_CREDITS", "")
+REFRESH_BUDGET_SHARE = float(os.getenv("SEARCH_REFRESH_BUDGET_SHARE", "0.2"))
+DEFAULT_REFRESH_CREDITS = 1000
+
+# Popularity counts halve every scheduler tick so the top N follows recent traffic
+DECAY = 0.5
+MAX_TRACKED = 1000
+
+
+def popularity_key(params):
+    """What a search is counted under: its query ("<keywords> jobs in <location>") and country"""
+    query = " ".join(str(params.get("query", "")).replace("+", " ").split()).lower()
+    return query, str(params.get("country", "")).lower()
+
+
+class Refresher:
+    """Background re-fetching of cached searches
+
+    refresh() re-fetches a stale entry that was just served; a scheduler
+    thread re-fetches the most requested first pages before they expire.
+    Both stop once the daily refresh credit cap is spent.
+    """
+
+    def __init__(
+        self,
+        client,
+        workers=REFRESH_WORKERS,
+        top_n=REFRESH_TOP_N,
+        interval=REFRESH_INTERVAL,
+        ahead=REFRESH_AHEAD,
+        daily_credits=None,
+    ):
+        self.client = client
+        self.top_n = top_n
+        self.interval = interval
+        self.ahead = ahead
+        self.daily_credits = self._default_cap() if daily_credits is None else daily_credits
+        self.credits_per_call = client.governor.credits_per_call if client.governor is not None else UPSTREAM_CREDITS_PER_CALL
+        self.day = utc_day(time.time())
+        self.spent = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.skipped = 0
+        self._pending = set()
+        self._popular = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="search-refresh")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _default_cap(self):
+        if REFRESH_DAILY_CREDITS:
+            return int(REFRESH_DAILY_CREDITS)
+        governor = self.client.governor
+        if governor is not None and governor.daily_budget:
+            return int(governor.daily_budget * REFRESH_BUDGET_SHARE)
+        return DEFAULT_REFRESH_CREDITS
+
+    def track(self, params):
+        """Count a first-page search towards the top N"""
+        key = popularity_key(params)
+        with self._lock:
+            entry = self._popular.get(key)
+            if entry is None:
+                self._popular[key] = [1.0, params]
+            else:
+                entry[0] += 1
+                entry[1] = params
+
+    def top(self):
+        """The most requested searches as (popularity key, count, params)"""
+        with self._lock:
+            ranked = sorted(self._popular.items(), key=lambda item: item[1][0], reverse=True)
+        return [(key, count, params) for key, (count, params) in ranked[: self.top_n]]
+
+    def _charge(self):
+        """Reserve one call's credits from today's refresh cap; False when it's spent"""
+        with self._lock:
+            today = utc_day(time.time())
+            if today != self.day:
+                self.day, self.spent = today, 0
+            if self.daily_credits and self.spent + self.credits_per_call > self.daily_credits:
+                self.skipped += 1
+                return False
+            self.spent += self.credits_per_call
+            return True
+
+    def refresh(self, key, params):
+        """Re-fetch `key` in the background unless it's already queued or the cap is spent"""
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        if not self._charge():
+            with self._lock:
+                self._pending.discard(key)
+            return False
+        self._pool.submit(self._run, key, params)
+        return True
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def _run(self, key, params):
+        try:
+            page = self.client.flight.do(key, self.client._fetch_and_store, key, params)
+            with self._lock:
+                if page is None:
+                    self.failed += 1
+                else:
+                    self.refreshed += 1
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"Search refresh error: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def run_schedule(self):
+        """One scheduler tick: refresh hot searches close to expiry, then decay the counts
+
+        Searches that have dropped out of the cache are left for the next
+        request to fetch, rather than paid for in the background.
+        """
+        cache = self.client.cache
+        for _, _, params in self.top():
+            key = search_key(params)
+            age = cache.age(key)
+            if age is not None and age >= cache.ttl - self.ahead:
+                self.refresh(key, params)
+
+        with self._lock:
+            for entry in self._popular.values():
+                entry[0] *= DECAY
+            ranked = sorted(self._popular.items(), key=lambda item: item[1][0], reverse=True)
+            self._popular = {key: entry for key, entry in ranked[:MAX_TRACKED] if entry[0] >= 0.1}
+
+    def start(self):
+        """Run the scheduler on a daemon thread (a no-op when top_n is 0)"""
+        if self.top_n <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="search-refresh-scheduler", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_schedule()
+            except Exception as e:
+                print(f"Search refresh error: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "pending": len(self._pending),
+                "refreshed": self.refreshed,
+                "failed": self.failed,
+                "skipped_over_cap": self.skipped,
+                "spent_today": self.spent if self.day == utc_day(time.time()) else 0,
+                "daily_credits": self.daily_credits or None,
+                "tracked": len(self._popular),
+            }
+        stats["top"] = [
+            {"query": query, "country": country, "count": round(count, 2)} for (query, country), count, _ in self.top()
+        ]
+        return stats
+
+
+def cached_page(cache, refresher, key, params):
+    """The cached page for `key`, or None to fetch it now
+
+    Without a refresher only fresh entries count. With one, a stale entry
+    is served as long as a background refresh for it is queued.
+    """
+    if refresher is None:
+        return cache.get(key)
+    return cache.get(key, lambda: refresher.refresh(key, params) or refresher.is_pending(key))
+
+
+def create_refresher(client):
+    """Refresher for a client with a cache, scheduler started; None without a cache"""
+    if client.cache is None:
+        return None
+    refresher = Refresher(client)
+    refresher.start()
+    return refresher
@@ -0,0 +1,136 @@
+"""Finished search results kept server-side so clients can page through them with cursors
+
+A search sent with `limit` stores its whole filtered, merged result list
+here and returns the first page plus an opaque cursor; later requests send
+just the cursor to get the next page, without re-running the search.
+"""
+import base64
+import binascii
+import os
+import secrets
+from dotenv import load_dotenv
+
+from utils import fastjson
+from utils.cache import CACHE_BACKEND, create_cache
+from utils.sqlite_store import per_process
+
+load_dotenv()
+
+RESULT_SET_TTL = float(os.getenv("SEARCH_RESULT_SET_TTL", "900"))
+MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "200"))
+KEY_PREFIX = "results:"
+# SEARCH_CACHE_BACKEND values whose store other processes can read
+SHARED_BACKENDS = ("disk", "redis")
+
+
+class CursorError(ValueError):
+    """A cursor that can't be decoded"""
+
+
+class CursorExpired(CursorError):
+    """The cursor's result set is no longer stored"""
+
+
+def _company_key(job):
+    return (str(job.get("company") or "").casefold(), str(job.get("title") or "").casefold())
+
+
+def _platform_key(job):
+    return (str(job.get("platform") or "").casefold(), str(job.get("title") or "").casefold())
+
+
+def _date_key(job):
+    # Newest first, postings without a readable date last
+    posted = job.get("posted_ts")
+    return (posted is None, -(posted or 0))
+
+
+SORT_KEYS = {"date_posted": _date_key, "company": _company_key, "platform": _platform_key}
+# Orders applied while filtering (api.apply_filters), so sort_jobs leaves them alone
+RANKED_SORTS = ("relevance",)
+
+
+def check_sort(sort):
+    if sort is not None and sort not in SORT_KEYS and sort not in RANKED_SORTS:
+        raise ValueError(f"Unknown sort: {sort}. Choose from {', '.join((*SORT_KEYS, *RANKED_SORTS))}")
+
+
+def sort_jobs(jobs, sort=None):
+    """Jobs in `sort` order (stable, so ties keep their relevance order); as-is for None"""
+    if sort is None or sort in RANKED_SORTS:
+        return jobs
+    return sorted(jobs, key=SORT_KEYS[sort])
+
+
+def encode_cursor(result_set, offset, limit):
+    raw = fastjson.dumps_bytes({"r": result_set, "o": offset, "l": limit})
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(result set id, offset, limit); raises CursorError for anything malformed"""
+    try:
+        cursor = str(cursor)
+        data = fastjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        result_set, offset, limit = str(data["r"]), int(data["o"]), int(data["l"])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise CursorError("Invalid cursor")
+    if offset < 0 or limit < 1:
+        raise CursorError("Invalid cursor")
+    return result_set, offset, limit
+
+
+def check_limit(limit):
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be a whole number from 1 to {MAX_LIMIT}")
+
+
+class ResultSets:
+    """Result lists stored in a search cache backend under their own TTL
+
+    Use the disk or redis cache backend when several workers serve the API,
+    so a cursor works whichever worker it lands on.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def put(self, jobs, fields=None, status=None, response_format=None):
+        """Store a finished, already sorted result list; returns its id"""
+        result_set = secrets.token_urlsafe(12)
+        entry = {"jobs": jobs, "fields": fields, "status": status or {}, "format": response_format}
+        self.cache.set(KEY_PREFIX + result_set, entry)
+        return result_set
+
+    def page(self, cursor, limit=None):
+        """(jobs, total, next cursor or None, stored entry) for the page a cursor points at"""
+        result_set, offset, cursor_limit = decode_cursor(cursor)
+        limit = limit or cursor_limit
+        entry = self.cache.get(KEY_PREFIX + result_set)
+        if entry is None:
+            raise CursorExpired("This cursor has expired, run the search again")
+        jobs = entry["jobs"]
+        end = offset + limit
+        next_cursor = encode_cursor(result_set, end, limit) if end < len(jobs) else None
+        return jobs[offset:end], len(jobs), next_cursor, entry
+
+
+def check_shared(backend=CACHE_BACKEND):
+    """Raise ValueError unless result sets stored by this process can be paged from the API's"""
+    if backend not in SHARED_BACKENDS:
+        raise ValueError(
+            f"SEARCH_CACHE_BACKEND={backend} keeps result sets in this process, so the API can't page its cursors; "
+            f"use one of {', '.join(SHARED_BACKENDS)}"
+        )
+
+
+def _create_result_sets():
+    return ResultSets(create_cache(ttl=RESULT_SET_TTL, stale=0) or create_cache("memory", RESULT_SET_TTL, 0))
+
+
+_result_sets = per_process(_create_result_sets)
+
+
+def get_result_sets():
+    """The process-wide result set store, on the SEARCH_CACHE_BACKEND store (memory if that's none)"""
+    return _result_sets()
@@ -0,0 +1,179 @@
+"""Saved searches and the postings each has already returned, for "new since last check" polling
+
+Each saved search keeps an on-disk seen-set of job fingerprints (their
+first 60 bits, as SQLite integers), so a delta poll returns only postings
+it hasn't returned before and can stop paging once it runs into old ones.
+
+Maintenance:  python -m utils.saved_searches --expire
+"""
+import argparse
+import json
+import os
+import secrets
+import time
+from dotenv import load_dotenv
+
+from utils.fingerprint import job_fingerprint
+from utils.sqlite_store import LocalConnection, per_process
+
+load_dotenv()
+
+SAVED_SEARCH_PATH = os.getenv("SAVED_SEARCH_PATH", "saved_searches.sqlite3")
+# Seen postings are forgotten after this long, so a repost months later counts as new
+SEEN_TTL = float(os.getenv("SAVED_SEARCH_SEEN_TTL", str(30 * 24 * 3600)))
+# A delta poll stops following next_page_token after this many seen postings in a row
+STOP_AFTER_SEEN = int(os.getenv("SAVED_SEARCH_STOP_AFTER_SEEN", "5"))
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS saved_searches ("
+    "id TEXT PRIMARY KEY, body TEXT NOT NULL, created REAL, last_polled REAL, polls INTEGER DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS seen ("
+    "search_id TEXT NOT NULL, job INTEGER NOT NULL, first_seen REAL, "
+    "PRIMARY KEY (search_id, job)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS seen_first_seen ON seen (first_seen)",
+)
+
+
+def seen_key(fingerprint):
+    """The seen-set entry for a job fingerprint: its first 60 bits"""
+    return int(fingerprint[:15], 16)
+
+
+class SavedSearches:
+    def __init__(self, path=SAVED_SEARCH_PATH):
+        self.path = path
+        self._db = LocalConnection(path)
+        with self._db.transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def create(self, body):
+        """Store a search request body; returns the new saved search's id"""
+        search_id = secrets.token_urlsafe(9)
+        with self._db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO saved_searches (id, body, created) VALUES (?, ?, ?)",
+                (search_id, json.dumps(body, sort_keys=True), time.time()),
+            )
+        return search_id
+
+    def get(self, search_id):
+        """{"id", "search", "created", "last_polled", "polls", "seen"} or None"""
+        conn = self._db.get()
+        row = conn.execute(
+            "SELECT body, created, last_polled, polls FROM saved_searches WHERE id = ?", (search_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        body, created, last_polled, polls = row
+        seen = conn.execute("SELECT COUNT(*) FROM seen WHERE search_id = ?", (search_id,)).fetchone()[0]
+        return {
+            "id": search_id,
+            "search": json.loads(body),
+            "created": created,
+            "last_polled": last_polled,
+            "polls": polls,
+            "seen": seen,
+        }
+
+    def delete(self, search_id):
+        """Drop a saved search and its seen-set; False if there was none"""
+        with self._db.transaction() as conn:
+            conn.execute("DELETE FROM seen WHERE search_id = ?", (search_id,))
+            return conn.execute("DELETE FROM saved_searches WHERE id = ?", (search_id,)).rowcount > 0
+
+    def seen(self, search_id, keys):
+        """The subset of `keys` already in the search's seen-set"""
+        keys = list(keys)
+        found = set()
+        conn = self._db.get()
+        # Stay under SQLite's bound parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            found.update(row[0] for row in conn.execute(
+                "SELECT job FROM seen WHERE search_id = ? AND job IN (" + ", ".join("?" for _ in chunk) + ")",
+                (search_id, *chunk),
+            ))
+        return found
+
+    def mark_seen(self, search_id, keys):
+        """Add `keys` to the seen-set and record the poll"""
+        now = time.time()
+        with self._db.transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO seen (search_id, job, first_seen) VALUES (?, ?, ?)",
+                [(search_id, key, now) for key in keys],
+            )
+            conn.execute(
+                "UPDATE saved_searches SET last_polled = ?, polls = polls + 1 WHERE id = ?", (now, search_id)
+            )
+
+    def expire(self, ttl=SEEN_TTL):
+        """Forget postings seen more than `ttl` seconds ago; returns how many went"""
+        with self._db.transaction() as conn:
+            return conn.execute("DELETE FROM seen WHERE first_seen < ?", (time.time() - ttl,)).rowcount
+
+    def stats(self):
+        conn = self._db.get()
+        searches = conn.execute("SELECT COUNT(*) FROM saved_searches").fetchone()[0]
+        seen = conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+        return {"saved_searches": searches, "seen": seen}
+
+
+class DeltaFilter:
+    """Passes on only the jobs a saved search hasn't seen, ending the stream at a run of seen ones
+
+    New postings surface among the leading results, so `stop_after` seen
+    postings in a row mean the rest are old too; ending the stream there
+    stops the pages behind it from being fetched. commit() adds what was passed on to the
+    seen-set once the response is built.
+    """
+
+    def __init__(self, store, search_id, stop_after=STOP_AFTER_SEEN):
+        self.store = store
+        self.search_id = search_id
+        self.stop_after = stop_after
+        self.examined = 0
+        self.stopped_early = False
+        self._new = []
+        self._run = 0
+
+    def filter(self, jobs):
+        for job in jobs:
+            self.examined += 1
+            key = seen_key(job_fingerprint(job))
+            if self.store.seen(self.search_id, [key]):
+                self._run += 1
+                if self._run >= self.stop_after:
+                    self.stopped_early = True
+                    return
+                continue
+            self._run = 0
+            self._new.append(key)
+            yield job
+
+    def commit(self):
+        self.store.mark_seen(self.search_id, self._new)
+
+
+_saved_searches = per_process(lambda: SavedSearches(SAVED_SEARCH_PATH))
+
+
+def get_saved_searches():
+    """The process-wide saved search store at SAVED_SEARCH_PATH; raises ValueError when that's empty"""
+    if not SAVED_SEARCH_PATH:
+        raise ValueError("Saved searches are disabled (SAVED_SEARCH_PATH is empty)")
+    return _saved_searches()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the saved search store")
+    parser.add_argument("--path", default=SAVED_SEARCH_PATH)
+    parser.add_argument("--expire", action="store_true", help="forget postings seen longer ago than --ttl")
+    parser.add_argument("--ttl", type=float, default=SEEN_TTL, help="seconds since a posting was first seen")
+    args = parser.parse_args()
+
+    store = SavedSearches(args.path)
+    if args.expire:
+        print(f"Forgot {store.expire(args.ttl)} seen postings")
+    print(store.stats())
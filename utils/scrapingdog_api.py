@@ -1,18 +1,173 @@
-import json
-import requests
 import os
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
 from dotenv import load_dotenv
 
+from utils import fastjson, metrics
+from utils.breaker import create_breaker, create_hedger
+from utils.cache import create_cache, search_key
+from utils.errors import UpstreamUnavailable
+from utils.governor import create_governor
+from utils.job_index import create_index
+from utils.fingerprint import Deduplicator
+from utils.job_parser import parse_jobs, project_jobs, related_apply_url
+from utils.providers import SearchProvider
+from utils.refresher import cached_page, create_refresher
+from utils.singleflight import SingleFlight
+from utils.sqlite_store import per_process
+
 # Load environment variables from .env file
 load_dotenv()
 
-class ScrapingDog:
-    def __init__(self):
+SCRAPINGDOG_URL = os.getenv("SCRAPINGDOG_URL", "https://api.scrapingdog.com/google_jobs")
+
+# Connection pool, timeout and retry settings
+POOL_SIZE = int(os.getenv("SCRAPINGDOG_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("SCRAPINGDOG_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("SCRAPINGDOG_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("SCRAPINGDOG_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("SCRAPINGDOG_BACKOFF_FACTOR", "0.5"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Multi-page searches
+MAX_PAGES = int(os.getenv("SEARCH_MAX_PAGES", "5"))
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "20"))
+PREFETCH_WORKERS = int(os.getenv("SEARCH_PREFETCH_WORKERS", "8"))
+# Threads fetching searches' first pages, so a search can stop waiting at its deadline;
+# sized well past the governor's in-flight cap so they never queue behind each other
+FIRST_PAGE_WORKERS = int(os.getenv("SEARCH_FIRST_PAGE_WORKERS", "256"))
+
+
+def upstream_ok(status):
+    """Whether a response says the upstream is healthy (4xx other than 429 are the caller's fault)"""
+    return status < 500 and status != 429
+
+
+def retry_delay(retry_after, attempt):
+    """Seconds to wait before retrying a 429/5xx: its Retry-After, else exponential backoff"""
+    return float(retry_after) if retry_after.isdigit() else BACKOFF_FACTOR * (2 ** attempt)
+
+
+def create_session(pool_size=POOL_SIZE, max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR):
+    """Build a keep-alive session with a connection pool and retry/backoff on failed connections
+
+    Only connections that never reached the upstream are retried here; 429/5xx
+    responses are retried by ScrapingDog._fetch_page, through the governor.
+    """
+    # Imported here so importing this module (and the API) doesn't pay for requests until a client is built
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,
+        status=0,
+        backoff_factor=backoff_factor,
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def build_params(
+    keywords,
+    location,
+    days_ago=5,
+    country="us",
+    language="en_us",
+    next_page_token=None,
+    chips=None,
+    lrad=None,
+    ltype=None,
+    uds=None
+):
+    """Build the upstream query params (without the API key)"""
+    keywords = " ".join(str(keywords).split())
+    location = " ".join(str(location).split())
+
+    params = {
+        "query": f"{keywords} jobs in {location}".replace(" ", "+"),
+        "country": country,
+        "language": language,
+        "chips": f"date_posted:{days_ago}d" if not chips else chips,
+        "next_page_token": next_page_token,
+        "lrad": lrad,
+        "ltype": ltype,
+        "uds": uds
+    }
+
+    # Remove None values to avoid invalid params
+    return {k: v for k, v in params.items() if v is not None}
+
+
+def get_next_page_token(data):
+    """Pagination token of a google_jobs response, None on the last page"""
+    pagination = data.get("scrapingdog_pagination") or data.get("pagination") or {}
+    return data.get("next_page_token") or pagination.get("next_page_token")
+
+
+def select_jobs(jobs, count, platform=None):
+    """Keep the first `count` jobs, then drop those not from `platform`"""
+    jobs = jobs[:count]
+    if platform and platform.lower() != "all":
+        jobs = [job for job in jobs if platform.lower() in job["platform"].lower()]
+    return jobs
+
+
+def _create_client():
+    client = ScrapingDog(
+        cache=create_cache(), index=create_index(), governor=create_governor(),
+        breaker=create_breaker(), hedger=create_hedger(),
+    )
+    client.refresher = create_refresher(client)
+    return client
+
+
+_client = per_process(_create_client)
+_pool_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide ScrapingDog client, creating it on first use"""
+    return _client()
+
+
+class ScrapingDog(SearchProvider):
+    name = "scrapingdog"
+
+    def __init__(self, api_key=None, session=None, url=None, timeout=None, cache=None, index=None, governor=None,
+                 max_retries=MAX_RETRIES, breaker=None, hedger=None):
         # Get API key from environment variables
-        self.api_key = os.getenv("SCRAPINGDOG_API_KEY")
+        self.api_key = api_key or os.getenv("SCRAPINGDOG_API_KEY")
         if not self.api_key:
             raise ValueError("SCRAPINGDOG_API_KEY not found in environment variables")
 
+        self.url = url or SCRAPINGDOG_URL
+        self.session = session or create_session()
+        self.timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+        self.cache = cache
+        self.index = index
+        self.governor = governor
+        self.max_retries = max_retries
+        # Optional CircuitBreaker and Hedger around the upstream call
+        self.breaker = breaker
+        self.hedger = hedger
+        self.flight = SingleFlight()
+        # Set to a Refresher to serve stale cache entries while they're re-fetched
+        self.refresher = None
+        self._prefetch_pool = None
+        self._first_page_pool = None
+        self._hedge_pool = None
+
     def search_jobs(
         self,
         keywords,
@@ -26,99 +181,288 @@ class ScrapingDog:
         chips=None,
         lrad=None,
         ltype=None,
-        uds=None
+        uds=None,
+        fields=None
     ):
         try:
-            url = "https://api.scrapingdog.com/google_jobs"
-            
-            params = {
-                "api_key": self.api_key,  # Use the API key from environment
-                "query": f"{keywords} jobs in {location}".replace(" ", "+"),
-                "country": country,
-                "language": language,
-                "chips": f"date_posted:{days_ago}d" if not chips else chips,
-                "next_page_token": next_page_token,
-                "lrad": lrad,
-                "ltype": ltype,
-                "uds": uds
-            }
-
-            # Remove None values to avoid invalid params
-            params = {k: v for k, v in params.items() if v is not None}
-
-            response = requests.get(url, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-            
-            if "error" in data:
-                print(f"ScrapingDog API error: {data['error']}")
-                return []
-
-            jobs = []
-            if "jobs_results" in data:
-                job_results = data["jobs_results"]
-
-                for i, job in enumerate(job_results):
-                    if i >= count:
-                        break
-
-                    title = job.get("title", "Unknown Title")
-                    company = job.get("company_name", "Unknown Company")
-                    location_name = job.get("location", "Unknown Location")
-                    
-                    description = job.get("description") or job.get("snippet", "No available description")
-
-                    # Extract job type
-                    job_type = "Not Specified"
-                    if "detected_extensions" in job:
-                        ext = job["detected_extensions"]
-                        job_type = ext.get("schedule_type") or ext.get("employment_type", job_type)
-            
-
-                    # Apply URL
-                    apply_url = None
-                    if "apply_link" in job and "link" in job["apply_link"]:
-                        apply_url = job["apply_link"]["link"]
-                    elif "apply_options" in job and job["apply_options"]:
-                        apply_url = job["apply_options"][0].get("link")
-                    elif "job_id" in job and "related_links" in data:
-                        for link in data.get("related_links", []):
-                            if "apply" in link.get("text", "").lower():
-                                apply_url = link.get("link")
-                                break
-                    if not apply_url and "job_id" in job:
-                        apply_url = f"https://www.google.com/search?q={job['job_id']}"
-
-                    date_posted = "Recent"
-                    if "detected_extensions" in job and "posted_at" in job["detected_extensions"]:
-                        date_posted = job["detected_extensions"]["posted_at"]
-
-                    job_platform = job.get("via", "unknown")
-
-                    if platform and platform.lower() != "all" and platform.lower() not in job_platform.lower():
-                        continue
-
-                    job_entry = {
-                        "title": title,
-                        "company": company,
-                        "location": location_name,
-                        "description": description,
-                        "url": apply_url,
-                        "apply_url": apply_url,
-                        "date_posted": date_posted,
-                        "platform": job_platform,
-                        "job_type": job_type,
-                        "is_real_job": True
-                    }
-
-                    jobs.append(job_entry)
-
-                return jobs
-            else:
-                print("No job results found in response.")
+            params = build_params(
+                keywords, location, days_ago=days_ago, country=country, language=language,
+                next_page_token=next_page_token, chips=chips, lrad=lrad, ltype=ltype, uds=uds,
+            )
+            page = self.fetch_page(params)
+            if page is None:
                 return []
+            return project_jobs(select_jobs(page["jobs"], count, platform), fields)
 
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             print(f"ScrapingDog API error: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def iter_jobs(
+        self,
+        keywords,
+        location,
+        platform=None,
+        count=5,
+        max_pages=MAX_PAGES,
+        deadline=SEARCH_DEADLINE,
+        days_ago=5,
+        country="us",
+        language="en_us",
+        next_page_token=None,
+        chips=None,
+        lrad=None,
+        ltype=None,
+        uds=None,
+        prefetch=True,
+        dedupe=None
+    ):
+        """Yield up to `count` jobs, following next_page_token across pages
+
+        Jobs are yielded as each page arrives. The next page is requested as
+        soon as its token is known, so it downloads while the current page is
+        parsed and consumed. With prefetch=False it is only requested once
+        the current page has been consumed, so a caller that stops early
+        never pays for it. Stops after `max_pages` pages or once `deadline`
+        seconds have passed. Reposts are dropped by `dedupe` (a Deduplicator,
+        a new one by default) before they count toward `count`.
+        """
+        dedupe = dedupe if dedupe is not None else Deduplicator()
+        end = time.monotonic() + deadline
+        requested = []
+        tokens = set()
+        raw_seen = [0]
+        lock = threading.Lock()
+
+        def request_page(token, first=False):
+            with lock:
+                if len(requested) >= max_pages or token in tokens:
+                    return
+                tokens.add(token)
+                params = build_params(
+                    keywords, location, days_ago=days_ago, country=country, language=language,
+                    next_page_token=token, chips=chips, lrad=lrad, ltype=ltype, uds=uds,
+                )
+                pool = self._get_first_page_pool() if first else self._get_prefetch_pool()
+                # Carry the request's metrics trace into the fetching thread
+                requested.append(pool.submit(contextvars.copy_context().run, self.fetch_page, params, on_page))
+
+        def on_page(token, size):
+            # Prefetch only while the pages seen so far can't cover `count`
+            raw_seen[0] += size
+            if prefetch and token and raw_seen[0] < count:
+                request_page(token)
+
+        # First pages get their own pool, so the prefetch pool never caps how many searches
+        # are upstream at once; either way a page is only waited for until `deadline`
+        request_page(next_page_token, first=True)
+        yielded = 0
+        i = 0
+        while i < len(requested):
+            remaining = end - time.monotonic()
+            try:
+                page = requested[i].result(timeout=max(remaining, 0))
+            except FutureTimeout:
+                if i == 0:
+                    metrics.mark_upstream_error()
+                print(f"Search deadline of {deadline}s reached after {i} page(s)")
+                return
+            except UpstreamUnavailable:
+                raise
+            except Exception as e:
+                metrics.mark_upstream_error()
+                print(f"ScrapingDog API error: {e}")
+                return
+            i += 1
+            if page is None:
+                return
+
+            dedupe.mark_page_url(page.get("page_url"))
+            for job in select_jobs(page["jobs"], len(page["jobs"]), platform):
+                if dedupe.check(job)[1] is not None:
+                    continue
+                yield job
+                yielded += 1
+                if yielded >= count:
+                    return
+
+            # Platform filtering and reposts can leave us short even when the prefetch heuristic skipped the next page
+            if page.get("next_page_token"):
+                request_page(page["next_page_token"])
+
+    def _get_prefetch_pool(self):
+        if self._prefetch_pool is None:
+            with _pool_lock:
+                if self._prefetch_pool is None:
+                    self._prefetch_pool = ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix="page-prefetch")
+        return self._prefetch_pool
+
+    def _get_first_page_pool(self):
+        if self._first_page_pool is None:
+            with _pool_lock:
+                if self._first_page_pool is None:
+                    self._first_page_pool = ThreadPoolExecutor(FIRST_PAGE_WORKERS, thread_name_prefix="first-page")
+        return self._first_page_pool
+
+    def fetch_page(self, params, on_page=None):
+        """Fetch and parse one page of results, serving repeats from the cache
+
+        Concurrent calls for the same params share a single upstream request.
+        With a refresher, an expired entry still within the cache's stale
+        window is returned at once and re-fetched in the background; while
+        the circuit breaker is open such an entry is returned regardless.
+        `on_page(next_page_token, size)` is called as soon as the response
+        arrives, before its jobs are parsed. Returns
+        {"jobs": [...], "next_page_token": ...} or None when the upstream
+        call failed.
+        """
+        key = search_key(params)
+        if self.refresher is not None and "next_page_token" not in params:
+            self.refresher.track(params)
+        if self.cache is not None:
+            page = cached_page(self.cache, self.refresher, key, params)
+            if page is None and self.breaker is not None and not self.breaker.available():
+                page = self.cache.get(key, lambda: True)
+            if page is not None:
+                if on_page is not None:
+                    on_page(page.get("next_page_token"), len(page["jobs"]))
+                return page
+
+        return self.flight.do(key, self._fetch_and_store, key, params, on_page)
+
+    def _fetch_and_store(self, key, params, on_page=None):
+        page = self._fetch_page(params, on_page)
+
+        # Only successful responses are cached, errors are retried next time
+        if page is not None and self.cache is not None:
+            self.cache.set(key, page)
+        if page is not None and self.index is not None:
+            self.index_jobs(page["jobs"])
+        return page
+
+    def index_jobs(self, jobs):
+        """Record fresh upstream jobs in the local job index"""
+        try:
+            self.index.upsert_many(jobs)
+        except Exception as e:
+            print(f"Job index error: {e}")
+
+    def _fetch_page(self, params, on_page=None):
+        # Every attempt asks the circuit breaker, then queues for the rate/concurrency/credit
+        # governor, so a retry is paced and charged like a first call; either raises
+        # UpstreamUnavailable when it says no
+        for attempt in range(self.max_retries + 1):
+            with metrics.stage("queue"):
+                probe = self.breaker.allow() if self.breaker is not None else False
+                try:
+                    lease = self.governor.acquire() if self.governor is not None else None
+                except BaseException:
+                    if self.breaker is not None:
+                        self.breaker.cancel(probe)
+                    raise
+            with metrics.stage("upstream"):
+                response = self._call(params, lease, probe)
+
+            metrics.record_upstream_response(response.status_code, len(response.content))
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                break
+            time.sleep(retry_delay(response.headers.get("Retry-After", ""), attempt))
+
+        if response.status_code != 200:
+            metrics.mark_upstream_error()
+            print(f"ScrapingDog API error: HTTP {response.status_code}")
+            return None
+
+        with metrics.stage("decode"):
+            data = fastjson.loads(response.content)
+
+        if "error" in data:
+            metrics.mark_upstream_error()
+            print(f"ScrapingDog API error: {data['error']}")
+            return None
+
+        if "jobs_results" not in data:
+            print("No job results found in response.")
+            return {"jobs": [], "next_page_token": None}
+
+        token = get_next_page_token(data)
+        if on_page is not None:
+            on_page(token, len(data["jobs_results"]))
+
+        with metrics.stage("extract"):
+            jobs = parse_jobs(data)
+        return {"jobs": jobs, "next_page_token": token, "page_url": related_apply_url(data)}
+
+    def _call(self, params, lease, probe=False):
+        """The upstream GET, hedged when there's a hedger, its outcome reported to the breaker"""
+        start = time.perf_counter()
+        try:
+            # A half-open probe is a single call, so one slow response can't reopen the circuit twice
+            response = self._hedged_send(params, lease) if self.hedger is not None and not probe else self._send(params, lease)
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record(probe, False, time.perf_counter() - start)
+            raise
+        if self.breaker is not None:
+            self.breaker.record(probe, upstream_ok(response.status_code), time.perf_counter() - start)
+        return response
+
+    def _send(self, params, lease=None):
+        """One upstream GET, releasing its governor lease when it's done"""
+        start = time.perf_counter()
+        try:
+            response = self.session.get(self.url, params={**params, "api_key": self.api_key}, timeout=self.timeout)
+        finally:
+            if lease is not None:
+                self.governor.release(lease)
+        if self.hedger is not None and response.status_code == 200:
+            self.hedger.observe(time.perf_counter() - start)
+        return response
+
+    def _hedged_send(self, params, lease):
+        """_send, plus a duplicate call once the first has run past the hedge delay; the first 200 wins
+
+        The duplicate needs a free governor slot right away, else it's skipped.
+        The losing call is left to finish on its own thread.
+        """
+        delay = self.hedger.delay()
+        if delay is None:
+            return self._send(params, lease)
+        pool = self._get_hedge_pool()
+        first = pool.submit(self._send, params, lease)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeout:
+            pass
+
+        try:
+            hedge_lease = self.governor.acquire(timeout=0) if self.governor is not None else None
+        except UpstreamUnavailable:
+            self.hedger.count(skipped=1)
+            return first.result()
+        second = pool.submit(self._send, params, hedge_lease)
+        self.hedger.count(fired=1)
+
+        response = error = None
+        for future in as_completed((first, second)):
+            try:
+                response = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if response.status_code == 200:
+                if future is second:
+                    self.hedger.count(won=1)
+                return response
+        if response is None:
+            raise error
+        return response
+
+    def _get_hedge_pool(self):
+        if self._hedge_pool is None:
+            with _pool_lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(POOL_SIZE * 2, thread_name_prefix="upstream-hedge")
+        return self._hedge_pool
\ No newline at end of file
@@ -0,0 +1,446 @@
+"""Background queue for long-running searches, polled for partial and final results
+
+Tasks live in SQLite at SEARCH_QUEUE_PATH, so every API process and
+standalone worker (python search_worker.py) on the host shares one
+queue. Workers claim the highest-priority task, and among equal
+priorities the one whose tenant has the fewest tasks running, so one
+tenant's backlog can't starve the rest. Jobs are appended as the search
+finds them and the final response body is stored when it's done; both
+expire SEARCH_QUEUE_RESULT_TTL seconds after the task finishes. A task
+whose worker stops heartbeating is handed to another worker.
+
+Maintenance:  python -m utils.search_queue --expire
+"""
+import argparse
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+from dotenv import load_dotenv
+
+from utils import fastjson
+from utils.sqlite_store import LocalConnection, per_process
+
+load_dotenv()
+
+SEARCH_QUEUE_PATH = os.getenv("SEARCH_QUEUE_PATH", "search_queue.sqlite3")
+# Worker threads per API process; 0 leaves the queue to standalone workers
+QUEUE_WORKERS = int(os.getenv("SEARCH_QUEUE_WORKERS", "2"))
+RESULT_TTL = float(os.getenv("SEARCH_QUEUE_RESULT_TTL", "3600"))
+# A running task that hasn't heartbeated for this long is handed to another worker
+LEASE_SECONDS = float(os.getenv("SEARCH_QUEUE_LEASE", "60"))
+MAX_ATTEMPTS = int(os.getenv("SEARCH_QUEUE_MAX_ATTEMPTS", "3"))
+# Queued tasks one tenant may have at a time
+TENANT_MAX_QUEUED = int(os.getenv("SEARCH_QUEUE_TENANT_MAX_QUEUED", "50"))
+# Longest long-poll; keep it under the load balancer's timeout
+MAX_WAIT = float(os.getenv("SEARCH_QUEUE_MAX_WAIT", "25"))
+POLL_INTERVAL = 0.25
+
+MIN_PRIORITY, MAX_PRIORITY, DEFAULT_PRIORITY = 0, 9, 5
+
+# Addresses of the proxies allowed to name the tenant in X-Tenant; anyone else is their own address
+TRUSTED_PROXIES = frozenset(address.strip() for address in os.getenv("SEARCH_TRUSTED_PROXIES", "").split(",") if address.strip())
+# "tenant=priority,..."; a tenant's searches run at most at its priority, DEFAULT_PRIORITY if it isn't listed
+TENANT_PRIORITIES = {
+    tenant.strip(): int(priority)
+    for tenant, _, priority in (entry.partition("=") for entry in os.getenv("SEARCH_QUEUE_TENANT_PRIORITIES", "").split(","))
+    if tenant.strip() and priority.strip()
+}
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS tasks ("
+    "id TEXT PRIMARY KEY, tenant TEXT NOT NULL, priority INTEGER NOT NULL, body TEXT NOT NULL, "
+    "state TEXT NOT NULL, created REAL, started REAL, finished REAL, heartbeat REAL, "
+    "worker TEXT, attempts INTEGER DEFAULT 0, found INTEGER DEFAULT 0, result BLOB, error TEXT)",
+    "CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, priority, created)",
+    "CREATE INDEX IF NOT EXISTS tasks_finished ON tasks (finished)",
+    "CREATE TABLE IF NOT EXISTS task_jobs ("
+    "task_id TEXT NOT NULL, seq INTEGER NOT NULL, job BLOB NOT NULL, "
+    "PRIMARY KEY (task_id, seq)) WITHOUT ROWID",
+)
+
+
+class QueueFull(ValueError):
+    """The tenant already has TENANT_MAX_QUEUED tasks waiting"""
+
+
+def check_priority(priority):
+    if isinstance(priority, bool) or not isinstance(priority, int) or not MIN_PRIORITY <= priority <= MAX_PRIORITY:
+        raise ValueError(f"priority must be an integer from {MIN_PRIORITY} to {MAX_PRIORITY}")
+
+
+def request_tenant(remote_addr, tenant_header=None):
+    """Who a queued search counts against: X-Tenant when a trusted proxy sent it, else the client address"""
+    if tenant_header and remote_addr in TRUSTED_PROXIES:
+        return tenant_header
+    return remote_addr or "anonymous"
+
+
+def tenant_priority(tenant, requested=None):
+    """The priority a tenant's search runs at: its SEARCH_QUEUE_TENANT_PRIORITIES entry, or lower if it asks"""
+    allowed = TENANT_PRIORITIES.get(tenant, DEFAULT_PRIORITY)
+    if requested is None:
+        return allowed
+    check_priority(requested)
+    return min(requested, allowed)
+
+
+class SearchQueue:
+    def __init__(self, path=SEARCH_QUEUE_PATH, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._db = LocalConnection(path)
+        # Wakes long-polls in this process early; other processes' updates are seen every POLL_INTERVAL
+        self._changed = threading.Condition()
+        with self._db.transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def submit(self, body, tenant, priority=DEFAULT_PRIORITY, tenant_max_queued=TENANT_MAX_QUEUED):
+        """Queue a search request body; returns the task id, raises QueueFull"""
+        check_priority(priority)
+        task_id = secrets.token_urlsafe(12)
+        with self._db.transaction() as conn:
+            queued = conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE tenant = ? AND state = ?", (tenant, QUEUED)
+            ).fetchone()[0]
+            if tenant_max_queued and queued >= tenant_max_queued:
+                raise QueueFull(f"{queued} searches already queued for this client, try again once some finish")
+            conn.execute(
+                "INSERT INTO tasks (id, tenant, priority, body, state, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (task_id, tenant, priority, json.dumps(body, sort_keys=True), QUEUED, time.time()),
+            )
+        self._notify()
+        return task_id
+
+    def _recover(self, conn, now):
+        """Requeue (or fail, past max_attempts) running tasks whose worker went quiet"""
+        stale = now - self.lease
+        conn.execute(
+            "UPDATE tasks SET state = ?, finished = ?, error = ? WHERE state = ? AND heartbeat < ? AND attempts >= ?",
+            (FAILED, now, "The search's worker stopped responding", RUNNING, stale, self.max_attempts),
+        )
+        conn.execute(
+            "UPDATE tasks SET state = ?, worker = NULL WHERE state = ? AND heartbeat < ?", (QUEUED, RUNNING, stale)
+        )
+
+    def claim(self, worker):
+        """(task id, request body) of the next task for `worker`, or None when the queue is empty
+
+        A requeued task starts over, so the jobs its last worker found are dropped.
+        """
+        now = time.time()
+        with self._db.transaction() as conn:
+            self._recover(conn, now)
+            row = conn.execute(
+                "SELECT id, body FROM tasks AS t WHERE state = ? ORDER BY priority DESC, "
+                "(SELECT COUNT(*) FROM tasks AS r WHERE r.state = ? AND r.tenant = t.tenant), created LIMIT 1",
+                (QUEUED, RUNNING),
+            ).fetchone()
+            if row is None:
+                return None
+            task_id, body = row
+            conn.execute("DELETE FROM task_jobs WHERE task_id = ?", (task_id,))
+            conn.execute(
+                "UPDATE tasks SET state = ?, worker = ?, started = ?, heartbeat = ?, attempts = attempts + 1, found = 0 "
+                "WHERE id = ?",
+                (RUNNING, worker, now, now, task_id),
+            )
+        self._notify()
+        return task_id, json.loads(body)
+
+    def append(self, task_id, worker, jobs):
+        """Add found jobs to a running task and heartbeat it
+
+        Returns False when the task was cancelled or handed to another
+        worker; the caller should stop searching.
+        """
+        with self._db.transaction() as conn:
+            row = conn.execute("SELECT state, worker, found FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None or row[0] != RUNNING or row[1] != worker:
+                return False
+            found = row[2]
+            conn.executemany(
+                "INSERT INTO task_jobs (task_id, seq, job) VALUES (?, ?, ?)",
+                [(task_id, found + i, fastjson.dumps_bytes(job)) for i, job in enumerate(jobs)],
+            )
+            conn.execute(
+                "UPDATE tasks SET found = ?, heartbeat = ? WHERE id = ?", (found + len(jobs), time.time(), task_id)
+            )
+        if jobs:
+            self._notify()
+        return True
+
+    def heartbeat(self, worker, task_ids):
+        """Renew the lease on `worker`'s running tasks"""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return
+        with self._db.transaction() as conn:
+            conn.executemany(
+                "UPDATE tasks SET heartbeat = ? WHERE id = ? AND state = ? AND worker = ?",
+                [(time.time(), task_id, RUNNING, worker) for task_id in task_ids],
+            )
+
+    def _finish(self, task_id, worker, state, result=None, error=None):
+        with self._db.transaction() as conn:
+            done = conn.execute(
+                "UPDATE tasks SET state = ?, finished = ?, result = ?, error = ? WHERE id = ? AND state = ? AND worker = ?",
+                (state, time.time(), result, error, task_id, RUNNING, worker),
+            ).rowcount > 0
+        self._notify()
+        return done
+
+    def finish(self, task_id, worker, result):
+        """Store a task's final response body"""
+        return self._finish(task_id, worker, DONE, result=fastjson.dumps_bytes(result))
+
+    def fail(self, task_id, worker, error):
+        return self._finish(task_id, worker, FAILED, error=error)
+
+    def cancel(self, task_id):
+        """Cancel a queued or running task; False if there's no such task or it already finished"""
+        with self._db.transaction() as conn:
+            cancelled = conn.execute(
+                "UPDATE tasks SET state = ?, finished = ? WHERE id = ? AND state IN (?, ?)",
+                (CANCELLED, time.time(), task_id, QUEUED, RUNNING),
+            ).rowcount > 0
+        self._notify()
+        return cancelled
+
+    def get(self, task_id, after=0):
+        """The task's state, the jobs found from position `after` on, and its result once done; None if unknown"""
+        conn = self._db.get()
+        row = conn.execute(
+            "SELECT tenant, priority, state, created, started, finished, attempts, found, result, error "
+            "FROM tasks WHERE id = ?",
+            (task_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        tenant, priority, state, created, started, finished, attempts, found, result, error = row
+        jobs = [
+            fastjson.loads(job) for (job,) in conn.execute(
+                "SELECT job FROM task_jobs WHERE task_id = ? AND seq >= ? ORDER BY seq", (task_id, after)
+            )
+        ]
+        task = {
+            "id": task_id,
+            "state": state,
+            "priority": priority,
+            "created": created,
+            "started": started,
+            "finished": finished,
+            "attempts": attempts,
+            "found": found,
+            "jobs": jobs,
+            "next": after + len(jobs),
+        }
+        if state == QUEUED:
+            task["position"] = conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE state = ? AND (priority > ? OR (priority = ? AND created < ?))",
+                (QUEUED, priority, priority, created),
+            ).fetchone()[0]
+        if result is not None:
+            task["result"] = fastjson.loads(result)
+        if error is not None:
+            task["error"] = error
+        return task
+
+    def state(self, task_id):
+        """The task's state, None if there's no such task"""
+        row = self._db.get().execute("SELECT state FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def iter_jobs(self, task_id, batch=1000):
+        """Every job a task has found so far, in order, read `batch` rows at a time"""
+        conn = self._db.get()
+        after = 0
+        while True:
+            rows = conn.execute(
+                "SELECT seq, job FROM task_jobs WHERE task_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (task_id, after, batch),
+            ).fetchall()
+            if not rows:
+                return
+            for _, job in rows:
+                yield fastjson.loads(job)
+            after = rows[-1][0] + 1
+
+    def wait(self, task_id, after=0, timeout=0.0):
+        """get(), but waiting up to `timeout` seconds for jobs past `after` or for the task to finish"""
+        deadline = time.monotonic() + min(timeout, MAX_WAIT)
+        while True:
+            task = self.get(task_id, after)
+            remaining = deadline - time.monotonic()
+            if task is None or task["jobs"] or task["state"] in FINISHED or remaining <= 0:
+                return task
+            with self._changed:
+                self._changed.wait(min(remaining, POLL_INTERVAL))
+
+    def expire(self, ttl=RESULT_TTL):
+        """Drop tasks finished more than `ttl` seconds ago with their jobs; returns how many went"""
+        with self._db.transaction() as conn:
+            cutoff = time.time() - ttl
+            conn.execute(
+                "DELETE FROM task_jobs WHERE task_id IN (SELECT id FROM tasks WHERE finished < ?)", (cutoff,)
+            )
+            return conn.execute("DELETE FROM tasks WHERE finished < ?", (cutoff,)).rowcount
+
+    def stats(self):
+        conn = self._db.get()
+        counts = dict(conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        stats = {state: counts.get(state, 0) for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        stats["tenants_queued"] = conn.execute(
+            "SELECT COUNT(DISTINCT tenant) FROM tasks WHERE state = ?", (QUEUED,)
+        ).fetchone()[0]
+        return stats
+
+
+class SearchWorkers:
+    """Threads that claim queued tasks and run them with `runner(queue, task_id, worker, body)`
+
+    The runner appends jobs as it finds them and finishes or fails the
+    task. Idle workers check the queue every `interval` seconds (sooner
+    when a task is submitted in this process) and expire old results
+    every `expire_interval`; another thread keeps the running tasks'
+    leases fresh.
+    """
+
+    def __init__(self, queue, runner, workers=QUEUE_WORKERS, interval=1.0, expire_interval=60.0):
+        self.queue = queue
+        self.runner = runner
+        self.workers = workers
+        self.interval = interval
+        self.expire_interval = expire_interval
+        self.ran = 0
+        self.failed = 0
+        self._last_expire = 0.0
+        self._running = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return self
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, args=(f"{prefix}:{i}",), name=f"search-queue-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._heartbeat_loop, name="search-queue-heartbeat", daemon=True).start()
+        return self
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.queue.lease / 3):
+            with self._lock:
+                running = list(self._running.items())
+            try:
+                for task_id, worker in running:
+                    self.queue.heartbeat(worker, [task_id])
+            except Exception as e:
+                print(f"Search queue error: {e}")
+
+    def _maybe_expire(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_expire < self.expire_interval:
+                return
+            self._last_expire = now
+        self.queue.expire()
+
+    def _loop(self, worker):
+        while not self._stop.is_set():
+            try:
+                self._maybe_expire()
+                task = self.queue.claim(worker)
+            except Exception as e:
+                print(f"Search queue error: {e}")
+                task = None
+            if task is None:
+                with self.queue._changed:
+                    self.queue._changed.wait(self.interval)
+                continue
+
+            task_id, body = task
+            with self._lock:
+                self._running[task_id] = worker
+            try:
+                self.runner(self.queue, task_id, worker, body)
+                with self._lock:
+                    self.ran += 1
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                print(f"Queued search error: {e}")
+                self.queue.fail(task_id, worker, str(e))
+            finally:
+                with self._lock:
+                    self._running.pop(task_id, None)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def stop(self):
+        self._stop.set()
+        self.queue._notify()
+
+    def stats(self):
+        with self._lock:
+            return {"workers": len(self._threads), "running": len(self._running), "ran": self.ran, "failed": self.failed}
+
+
+def _create_search_queue():
+    global _workers
+    # A forked worker gets a fresh queue and starts its own workers on it
+    _workers = None
+    return SearchQueue(SEARCH_QUEUE_PATH)
+
+
+_search_queue = per_process(_create_search_queue)
+_workers = None
+_workers_lock = threading.Lock()
+
+
+def get_search_queue():
+    """The process-wide search queue at SEARCH_QUEUE_PATH; raises ValueError when that's empty"""
+    if not SEARCH_QUEUE_PATH:
+        raise ValueError("Background searches are disabled (SEARCH_QUEUE_PATH is empty)")
+    return _search_queue()
+
+
+def start_workers(runner, workers=QUEUE_WORKERS):
+    """This process's SearchWorkers over get_search_queue(), started once; None with 0 workers"""
+    global _workers
+    queue = get_search_queue()
+    if workers <= 0:
+        return None
+    with _workers_lock:
+        if _workers is None:
+            _workers = SearchWorkers(queue, runner, workers).start()
+    return _workers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the background search queue")
+    parser.add_argument("--path", default=SEARCH_QUEUE_PATH)
+    parser.add_argument("--expire", action="store_true", help="drop tasks finished longer ago than --ttl")
+    parser.add_argument("--ttl", type=float, default=RESULT_TTL, help="seconds since a task finished")
+    args = parser.parse_args()
+
+    queue = SearchQueue(args.path)
+    if args.expire:
+        print(f"Dropped {queue.expire(args.ttl)} finished searches")
+    print(queue.stats())
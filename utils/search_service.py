@@ -0,0 +1,127 @@
+"""Search options, upstream chips and platform filtering shared by the API and the Streamlit app"""
+import os
+from types import MappingProxyType
+from dotenv import load_dotenv
+
+from utils import metrics
+from utils.errors import UpstreamUnavailable
+from utils.providers import get_search_provider
+from utils.scrapingdog_api import MAX_PAGES, SEARCH_DEADLINE
+
+load_dotenv()
+
+# Result batches at least this big are filtered with the vectorized JobFrame engine
+VECTOR_MIN_JOBS = int(os.getenv("SEARCH_VECTOR_MIN_JOBS", "1000"))
+
+PLATFORMS = ("LinkedIn", "Indeed", "Glassdoor", "Monster", "ZipRecruiter")
+
+# Search options -> upstream chips, built once at import
+DATE_POSTED_CHIPS = MappingProxyType({
+    "Past 24 hours": "date_posted:today",
+    "Past week": "date_posted:week",
+    "Past month": "date_posted:month",
+})
+JOB_TYPE_CHIPS = MappingProxyType({
+    "Full-time": "employment_type:FULLTIME",
+    "Part-time": "employment_type:PARTTIME",
+    "Contract": "employment_type:CONTRACTOR",
+    "Internship": "employment_type:INTERN",
+    "Temporary": "employment_type:TEMPORARY",
+})
+EXPERIENCE_CHIPS = MappingProxyType({
+    "Internship": "experience_level:INTERNSHIP",
+    "Entry level": "experience_level:ENTRY_LEVEL",
+    "Associate": "experience_level:ASSOCIATE",
+    "Mid-Senior level": "experience_level:MID_LEVEL",
+    "Director": "experience_level:DIRECTOR",
+    "Executive": "experience_level:EXECUTIVE",
+})
+
+
+def build_chips(date_posted, job_type, experience_level):
+    chips_parts = []
+
+    # Date posted
+    if date_posted in DATE_POSTED_CHIPS:
+        chips_parts.append(DATE_POSTED_CHIPS[date_posted])
+
+    # Job type
+    if job_type != "Any":
+        chips_parts.append(JOB_TYPE_CHIPS[job_type])
+
+    # Experience level
+    if experience_level != "Any":
+        chips_parts.append(EXPERIENCE_CHIPS[experience_level])
+
+    return ",".join(chips_parts) if chips_parts else None
+
+
+def search_kwargs(
+    keywords,
+    location,
+    count=10,
+    days_ago=7,
+    country="US",
+    remote_only=False,
+    search_radius=10,
+    chips=None,
+    max_pages=MAX_PAGES,
+    deadline=SEARCH_DEADLINE,
+):
+    """ScrapingDog.iter_jobs keyword arguments for a search's options"""
+    return {
+        "keywords": keywords,
+        "location": location,
+        "platform": None,
+        "count": count,
+        "days_ago": days_ago,
+        "country": country,
+        "lrad": str(search_radius) if (search_radius > 0 and not remote_only) else None,
+        "ltype": "1" if remote_only else None,
+        "chips": chips,
+        "max_pages": max_pages,
+        "deadline": deadline,
+    }
+
+
+def normalized_search(kwargs):
+    """A hashable key for search_kwargs: keywords and location case- and whitespace-folded
+
+    Searches differing only in those fold to the same upstream results, so
+    they can share a cache entry.
+    """
+    normalized = dict(kwargs)
+    for name in ("keywords", "location"):
+        normalized[name] = " ".join(str(normalized.get(name) or "").split()).lower()
+    return tuple(sorted(normalized.items()))
+
+
+def fetch_jobs(kwargs, client=None):
+    """The jobs for search_kwargs from `client` (get_search_provider() by default), reposts dropped
+
+    Raises UpstreamUnavailable when nothing came back because the upstream
+    failed, so callers that cache the result never keep an empty one.
+    """
+    client = client if client is not None else get_search_provider()
+    trace = metrics.Trace("fetch_jobs")
+    with metrics.activate(trace):
+        jobs = list(client.iter_jobs(**kwargs))
+    if not jobs and trace.upstream_error:
+        raise UpstreamUnavailable("The job search service failed; try again shortly")
+    return jobs
+
+
+def filter_jobs_by_platform(jobs, platforms, select_all):
+    """Filter jobs to only include selected platforms"""
+    if select_all or not platforms:
+        return jobs
+    if len(jobs) >= VECTOR_MIN_JOBS:
+        try:
+            from utils.job_frame import JobFrame
+        except ImportError:
+            pass
+        else:
+            frame = JobFrame(jobs)
+            return frame.select(frame.contains_any("platform", platforms))
+    wanted = [platform.lower() for platform in platforms]
+    return [job for job in jobs if any(platform in job['platform'].lower() for platform in wanted)]
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.thread = threading.get_ident()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self._in_flight.get(key)
+            if call is None:
+                call = self._in_flight[key] = _Call()
+                leader = True
+                self.executed += 1
+            elif call.thread == threading.get_ident():
+                # A re-entrant call from the leader's own thread would wait on itself
+                call = None
+                leader = False
+                self.executed += 1
+            else:
+                leader = False
+                self.coalesced += 1
+
+        if call is None:
+            return fn(*args, **kwargs)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight),
+            }
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight for tasks on one event loop"""
+
+    def __init__(self):
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self._in_flight = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        self.calls += 1
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield() so one cancelled waiter doesn't cancel the shared fetch
+            return await asyncio.shield(future)
+
+        self.executed += 1
+        future = asyncio.ensure_future(fn(*args, **kwargs))
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import threading
+
+
+def per_process(factory):
+    """A getter returning `factory()`'s result, built on first use in each process
+
+    A forked worker must not reuse its parent's sockets, connections or
+    threads, so it builds its own on its first call.
+    """
+    lock = threading.Lock()
+    built = {}
+
+    def get():
+        pid = os.getpid()
+        if pid not in built:
+            with lock:
+                if pid not in built:
+                    built.clear()
+                    built[pid] = factory()
+        return built[pid]
+
+    return get
+
+
+class LocalConnection:
+    """One SQLite connection per thread per process for a database file
+
+    sqlite3 connections can't be shared across threads or forked workers,
+    so each gets its own, opened in autocommit mode with WAL journaling.
+    """
+
+    def __init__(self, path, timeout=10):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def transaction(self):
+        return _Transaction(self.get())
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False